@@ -1,6 +1,8 @@
 # backend/api/admin.py
 from django.contrib import admin
-from .models import File, Folder, UserStorage
+from .models import (
+    Blob, Change, ChangeLog, DeletionIntent, Derivative, File, Folder, TrashPurge, UserStorage, UploadSession
+)
 
 
 @admin.register(File)
@@ -8,7 +10,7 @@ class FileAdmin(admin.ModelAdmin):
     list_display = ['name', 'owner', 'folder', 'size', 'created_at', 'is_deleted']
     list_filter = ['is_deleted', 'is_shared', 'created_at']
     search_fields = ['name', 'owner__username']
-    readonly_fields = ['created_at', 'updated_at', 'size', 'mime_type']
+    readonly_fields = ['created_at', 'updated_at', 'size', 'mime_type', 'blob']
 
 
 @admin.register(Folder)
@@ -21,9 +23,57 @@ class FolderAdmin(admin.ModelAdmin):
 
 @admin.register(UserStorage)
 class UserStorageAdmin(admin.ModelAdmin):
-    list_display = ['user', 'used_space', 'total_space', 'get_usage_percentage', 'updated_at']
-    readonly_fields = ['used_space', 'updated_at']
+    list_display = ['user', 'used_space', 'reserved_space', 'total_space', 'get_usage_percentage', 'updated_at']
+    readonly_fields = ['used_space', 'reserved_space', 'file_count', 'folder_count', 'updated_at']
     
     def get_usage_percentage(self, obj):
         return f"{obj.get_usage_percentage():.1f}%"
-    get_usage_percentage.short_description = 'Usage %'
\ No newline at end of file
+    get_usage_percentage.short_description = 'Usage %'
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ['name', 'owner', 'size', 'status', 'created_at', 'expires_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['name', 'owner__username']
+    readonly_fields = ['created_at', 'updated_at', 'path', 'file']
+
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ['digest', 'size', 'ref_count', 'created_at']
+    search_fields = ['digest']
+    readonly_fields = ['digest', 'fast_digest', 'size', 'ref_count', 'created_at']
+
+
+@admin.register(Derivative)
+class DerivativeAdmin(admin.ModelAdmin):
+    list_display = ['blob', 'kind', 'status', 'size', 'attempts', 'updated_at']
+    list_filter = ['status', 'kind']
+    search_fields = ['blob__digest']
+    readonly_fields = ['blob', 'kind', 'mime_type', 'size', 'attempts', 'error', 'created_at', 'updated_at']
+
+@admin.register(DeletionIntent)
+class DeletionIntentAdmin(admin.ModelAdmin):
+    list_display = ['digest', 'path', 'created_at']
+    search_fields = ['digest', 'path']
+
+
+@admin.register(TrashPurge)
+class TrashPurgeAdmin(admin.ModelAdmin):
+    list_display = ['owner', 'cutoff', 'created_at']
+
+
+@admin.register(Change)
+class ChangeAdmin(admin.ModelAdmin):
+    list_display = ['owner', 'seq', 'kind', 'object_id', 'action', 'created_at']
+    list_filter = ['kind', 'action']
+    search_fields = ['owner__username']
+    readonly_fields = ['owner', 'seq', 'kind', 'object_id', 'action', 'created_at']
+
+
+@admin.register(ChangeLog)
+class ChangeLogAdmin(admin.ModelAdmin):
+    list_display = ['user', 'last_seq', 'compacted_seq']
+    search_fields = ['user__username']
+    readonly_fields = ['user', 'last_seq', 'compacted_seq']
@@ -1,7 +1,18 @@
 # backend/api/apps.py
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_migrate, post_save
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'api'
\ No newline at end of file
+    name = 'api'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from . import authentication, changefeed, search, sharecache
+        from .models import changes_recorded
+        post_migrate.connect(search.install, sender=self)
+        changes_recorded.connect(changefeed.notifier.notify)
+        changes_recorded.connect(sharecache.shares.changed)
+        post_save.connect(authentication.active_users.forget, sender=User)
+        post_delete.connect(authentication.active_users.forget, sender=User)
\ No newline at end of file
@@ -0,0 +1,95 @@
+# backend/api/archives.py
+"""
+ZIP downloads of folders and file selections.
+
+Entries are planned from the database and a ``stat`` per file; the
+bytes are streamed by :mod:`api.zipstream` as the response is consumed.
+"""
+import logging
+import os
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .zipstream import ZipEntry, ZipStream, is_compressed
+
+logger = logging.getLogger(__name__)
+
+
+def safe_name(name):
+    """A single archive path component that cannot escape its directory."""
+    name = name.replace('/', '_').replace('\\', '_').strip()
+    return '_' if name in ('', '.', '..') else name
+
+
+def unique_name(name, taken):
+    """``name``, or ``name (2)``, ``name (3)``... if already in the archive."""
+    suffix = '/' if name.endswith('/') else ''
+    stem, ext = (name[:-1], '') if suffix else os.path.splitext(name)
+    candidate, counter = name, 1
+    while candidate in taken:
+        counter += 1
+        candidate = f'{stem} ({counter}){ext}{suffix}'
+    taken.add(candidate)
+    return candidate
+
+
+def file_entry(file_obj, name, compress):
+    """ZipEntry for a file, or None if its data is missing on disk."""
+    path = file_obj.file.path
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        logger.warning('Leaving missing file %s (%s) out of archive', file_obj.pk, path)
+        return None
+    return ZipEntry(
+        name, path=path, size=size, modified=timezone.localtime(file_obj.updated_at),
+        compress=compress and not is_compressed(file_obj.mime_type)
+    )
+
+
+def folder_entries(folder, compress=True):
+    """Entries for a folder and everything below it, under the folder's name."""
+    taken, entries, directories = set(), [], {}
+    folders = folder.get_descendants(include_self=True).filter(is_deleted=False).order_by('depth', 'pk')
+    for subfolder in folders.only('pk', 'name', 'parent_id', 'updated_at'):
+        if subfolder.pk == folder.pk:
+            parent = ''
+        elif subfolder.parent_id in directories:
+            parent = directories[subfolder.parent_id]
+        else:
+            continue
+        name = unique_name(f'{parent}{safe_name(subfolder.name)}/', taken)
+        directories[subfolder.pk] = name
+        entries.append(ZipEntry(name, modified=timezone.localtime(subfolder.updated_at)))
+
+    files = folder.get_subtree_files().filter(is_deleted=False).order_by('folder_id', 'name', 'pk')
+    for file_obj in files.iterator():
+        if file_obj.folder_id not in directories:
+            continue
+        name = unique_name(directories[file_obj.folder_id] + safe_name(file_obj.name), taken)
+        entry = file_entry(file_obj, name, compress)
+        if entry:
+            entries.append(entry)
+    return entries
+
+
+def file_entries(files, compress=True):
+    """Entries for a flat selection of files."""
+    taken, entries = set(), []
+    for file_obj in files.order_by('name', 'pk').iterator():
+        entry = file_entry(file_obj, unique_name(safe_name(file_obj.name), taken), compress)
+        if entry:
+            entries.append(entry)
+    return entries
+
+
+def archive_response(entries, filename):
+    """Stream ``entries`` as a ZIP download, with Content-Length when predictable."""
+    stream = ZipStream(entries)
+    length = stream.size()
+    response = StreamingHttpResponse(stream, content_type='application/zip')
+    if length is not None:
+        response['Content-Length'] = length
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
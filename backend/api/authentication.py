@@ -0,0 +1,103 @@
+# backend/api/authentication.py
+"""
+JWT authentication with an optional stateless fast path.
+
+simplejwt's ``JWTAuthentication`` loads the User row on every request.
+With ``JWT_AUTH_MODE = 'stateless'`` the user is built from the token's
+claims instead (``user_id`` and the ``username`` added by
+``tokens_for()``), which is all the API needs: querysets filter on the
+owner's id and permissions compare ``owner_id``. Whether the account is
+still active is kept in a per-process cache for ``JWT_USER_CACHE_TTL``
+seconds. Saving or deleting a user drops their entry at once in the
+process that made the change; other processes notice within the TTL.
+
+Tokens issued without a ``username`` claim, and deployments with
+simplejwt's CHECK_REVOKE_TOKEN, always use the database.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .sharecache import LRUCache
+
+
+def tokens_for(user):
+    """A refresh and access token pair for ``user``, with the claims the stateless mode uses."""
+    refresh = RefreshToken.for_user(user)
+    refresh['username'] = user.username
+    return {'refresh': str(refresh), 'access': str(refresh.access_token)}
+
+
+class ActiveUsers:
+    """Per-process cache of whether user ids belong to active accounts."""
+
+    def __init__(self):
+        self.configured = None
+        self.cache = LRUCache(1, 0)
+
+    def local(self):
+        configured = (settings.JWT_USER_CACHE_SIZE, settings.JWT_USER_CACHE_TTL)
+        if configured != self.configured:
+            self.cache = LRUCache(*configured)
+            self.configured = configured
+        return self.cache
+
+    def is_active(self, user_id):
+        """True or False, or None if there is no such user."""
+        active = self.local().get(user_id)
+        if active is None:
+            active = User.objects.filter(pk=user_id).values_list('is_active', flat=True).first()
+            if active is not None:
+                self.local().set(user_id, active)
+        return active
+
+    def forget(self, sender=None, instance=None, **kwargs):
+        """post_save / post_delete receiver for User."""
+        self.local().pop(instance.pk)
+
+    def clear(self):
+        self.local().clear()
+
+
+# forget() is connected to User's post_save and post_delete in ApiConfig.ready()
+active_users = ActiveUsers()
+
+
+def token_user(user_id, username):
+    """A User with only ``pk`` and ``username`` loaded, standing for the existing row."""
+    user = User(pk=user_id, username=username, is_active=True)
+    user._state.adding = False
+    user._state.db = 'default'
+    user.from_token = True
+    return user
+
+
+def full_user(user):
+    """The User row itself, for the few views that need more than its id."""
+    if getattr(user, 'from_token', False):
+        return User.objects.get(pk=user.pk)
+    return user
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """simplejwt's JWTAuthentication, skipping the User query when JWT_AUTH_MODE is 'stateless'."""
+
+    def get_user(self, validated_token):
+        if (settings.JWT_AUTH_MODE != 'stateless' or 'username' not in validated_token
+                or api_settings.CHECK_REVOKE_TOKEN):
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        active = active_users.is_active(user_id)
+        if active is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if not active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return token_user(user_id, validated_token['username'])
@@ -0,0 +1,272 @@
+# backend/api/blobs.py
+"""
+Content-addressed blob storage helpers.
+
+Uploads are hashed while they stream in and staged under
+``MEDIA_ROOT/blobs/tmp`` so that placing a new blob is a rename rather
+than a second copy of the bytes (unless STORAGE_VOLUMES puts the blob on
+another file system). The SHA-256 (and the optional ``UPLOAD_FAST_HASH``)
+is taken in that same pass, so the file is never read back just to be
+hashed.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+from .models import Blob
+
+HASH_BLOCK_SIZE = 1024 * 1024
+FICLONE = 0x40049409  # linux/fs.h: share the source's extents (btrfs, XFS, ...)
+# UPLOAD_FAST_HASH name -> (module, constructor); the packages are optional
+FAST_HASHES = {
+    'blake3': ('blake3', 'blake3'),
+    'xxh3_128': ('xxhash', 'xxh3_128'),
+}
+
+
+class ChecksumMismatch(ValueError):
+    """The stored bytes do not hash to the checksum the client sent."""
+
+    def __init__(self, expected, actual):
+        super().__init__(f"Checksum mismatch: expected sha256 {expected}, got {actual}.")
+        self.expected = expected
+        self.actual = actual
+
+
+def fast_hasher():
+    """A new hasher for UPLOAD_FAST_HASH, or None when it is not configured."""
+    name = settings.UPLOAD_FAST_HASH
+    if not name:
+        return None
+    try:
+        module, constructor = FAST_HASHES[name]
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"Unknown UPLOAD_FAST_HASH {name!r}; choose one of {', '.join(FAST_HASHES)}."
+        )
+    try:
+        return getattr(__import__(module), constructor)()
+    except ImportError:
+        raise ImproperlyConfigured(f"UPLOAD_FAST_HASH={name!r} needs the {module!r} package.")
+
+
+class Hasher:
+    """SHA-256, plus UPLOAD_FAST_HASH if configured, over one pass of the data."""
+
+    def __init__(self):
+        self.sha256 = hashlib.sha256()
+        self.fast = fast_hasher()
+
+    def update(self, data):
+        self.sha256.update(data)
+        if self.fast is not None:
+            self.fast.update(data)
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+    def fast_digest(self):
+        """The fast hash as ``"<algorithm>:<hex>"``, or '' when not configured."""
+        if self.fast is None:
+            return ''
+        return f'{settings.UPLOAD_FAST_HASH}:{self.fast.hexdigest()}'
+
+
+def staging_dir():
+    """Directory for in-flight uploads, in MEDIA_ROOT."""
+    path = default_storage.path(os.path.join('blobs', 'tmp'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class StagedUploadedFile(TemporaryUploadedFile):
+    """A temporary upload written to the blob staging directory."""
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        _, ext = os.path.splitext(name)
+        file = tempfile.NamedTemporaryFile(suffix='.upload' + ext, dir=staging_dir())
+        super(TemporaryUploadedFile, self).__init__(
+            file, name, content_type, size, charset, content_type_extra
+        )
+        self.sha256 = None
+        self.fast_digest = ''
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """Upload handler that computes the SHA-256 of a file as it streams to disk."""
+
+    def new_file(self, *args, **kwargs):
+        super(TemporaryFileUploadHandler, self).new_file(*args, **kwargs)
+        self.file = StagedUploadedFile(
+            self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+        )
+        self.hasher = Hasher()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.hasher.hexdigest()
+        self.file.fast_digest = self.hasher.fast_digest()
+        return self.file
+
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of a file on disk."""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(HASH_BLOCK_SIZE), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def digest_file(path):
+    """Return a Hasher fed with the contents of a file on disk."""
+    hasher = Hasher()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(HASH_BLOCK_SIZE), b''):
+            hasher.update(block)
+    return hasher
+
+
+def check_digest(expected, actual):
+    if expected and expected.lower() != actual:
+        raise ChecksumMismatch(expected.lower(), actual)
+
+
+def store_upload(upload, sha256=None):
+    """Store an uploaded file as a blob and return the referenced Blob.
+
+    With ``sha256`` the upload is checked against the client's checksum
+    first; ChecksumMismatch leaves nothing stored.
+    """
+    if getattr(upload, 'sha256', None):
+        # Already hashed and staged by HashingUploadHandler; hand the path over
+        check_digest(sha256, upload.sha256)
+        staged_path = upload.temporary_file_path()
+        return Blob.objects.ingest(staged_path, upload.sha256, upload.size, upload.fast_digest)
+
+    hasher = Hasher()
+    size = 0
+    fd, staged_path = tempfile.mkstemp(suffix='.upload', dir=staging_dir())
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            for chunk in upload.chunks():
+                hasher.update(chunk)
+                fh.write(chunk)
+                size += len(chunk)
+        check_digest(sha256, hasher.hexdigest())
+        return Blob.objects.ingest(staged_path, hasher.hexdigest(), size, hasher.fast_digest())
+    except Exception:
+        if os.path.exists(staged_path):
+            os.remove(staged_path)
+        raise
+
+
+def store_path(path, sha256=None):
+    """Store a file already on disk as a blob; the file is moved or removed.
+
+    On ChecksumMismatch against ``sha256`` the file is left in place.
+    """
+    hasher = digest_file(path)
+    check_digest(sha256, hasher.hexdigest())
+    return Blob.objects.ingest(path, hasher.hexdigest(), os.path.getsize(path), hasher.fast_digest())
+
+
+def copy_contents(src, dst, size):
+    """Copy ``size`` bytes between open files inside the kernel; returns the method used."""
+    if hasattr(os, 'copy_file_range'):
+        try:
+            copied = 0
+            while copied < size:
+                sent = os.copy_file_range(src.fileno(), dst.fileno(), size - copied)
+                if not sent:
+                    break
+                copied += sent
+            return 'copy_file_range'
+        except OSError:
+            # Not supported here (e.g. across filesystems on older kernels)
+            src.seek(0)
+            dst.seek(0)
+            dst.truncate()
+    if hasattr(os, 'sendfile'):
+        try:
+            offset = 0
+            while offset < size:
+                sent = os.sendfile(dst.fileno(), src.fileno(), offset, size - offset)
+                if not sent:
+                    break
+                offset += sent
+            dst.seek(offset)
+            return 'sendfile'
+        except OSError:
+            src.seek(0)
+            dst.seek(0)
+            dst.truncate()
+    shutil.copyfileobj(src, dst, HASH_BLOCK_SIZE)
+    return 'copy'
+
+
+def clone_file(source, target):
+    """Create ``target`` with the contents of ``source`` as cheaply as possible.
+
+    Stored files are never modified in place, so a hard link is a safe
+    copy; then a reflink (not on Windows), then an in-kernel copy.
+    Returns the method used.
+    """
+    try:
+        os.link(source, target)
+        return 'link'
+    except OSError:
+        pass
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return 'reflink'
+            except OSError:
+                pass
+        return copy_contents(src, dst, os.fstat(src.fileno()).st_size)
+
+
+def store_copy(path):
+    """Store a copy of a file on disk as a blob, leaving the file in place."""
+    staged_path = os.path.join(staging_dir(), f'{uuid.uuid4().hex}.upload')
+    try:
+        clone_file(path, staged_path)
+        return store_path(staged_path)
+    except Exception:
+        if os.path.exists(staged_path):
+            os.remove(staged_path)
+        raise
+
+
+def find_blob(user, digest, size):
+    """The stored Blob with ``digest`` and ``size`` that ``user`` may reuse, or None.
+
+    Unless UPLOAD_DEDUP_SCOPE is 'global', only content the user already
+    has a file for qualifies, so knowing a hash is not enough to obtain
+    somebody else's file.
+    """
+    blobs = Blob.objects.filter(digest=digest.lower(), size=size, ref_count__gt=0)
+    if settings.UPLOAD_DEDUP_SCOPE != 'global':
+        blobs = blobs.filter(files__owner=user)
+    blob = blobs.first()
+    if blob is None or not default_storage.exists(blob.name):
+        return None
+    return blob
@@ -0,0 +1,198 @@
+# backend/api/bulk.py
+"""
+Batch operations on files and folders.
+
+Each operation takes lists of file and folder ids, runs in a single
+transaction with set-based UPDATEs, and adjusts ``UserStorage`` once for
+the whole batch. Outcomes are reported per item, so an id that does not
+exist or cannot be moved does not fail the rest of the batch.
+"""
+import uuid
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Change, ChangeLog, File, Folder, UserStorage
+
+NOT_FOUND = 'Not found.'
+
+
+class InsufficientStorage(Exception):
+    """Restoring the batch would exceed the user's quota."""
+
+    def __init__(self, available):
+        self.available = available
+        super().__init__(f"Not enough storage space. You have {available} bytes available.")
+
+
+class BulkResult:
+    """Per-item outcomes; every requested id starts out as not found."""
+
+    def __init__(self, file_ids, folder_ids):
+        self.items = {
+            'files': {pk: {'id': pk, 'status': 'error', 'error': NOT_FOUND} for pk in file_ids},
+            'folders': {pk: {'id': pk, 'status': 'error', 'error': NOT_FOUND} for pk in folder_ids},
+        }
+
+    def succeed(self, kind, pks, status, **extra):
+        for pk in pks:
+            self.items[kind][pk] = {'id': pk, 'status': status, **extra}
+
+    def fail(self, kind, pk, error):
+        self.items[kind][pk] = {'id': pk, 'status': 'error', 'error': error}
+
+    def as_dict(self):
+        return {kind: list(items.values()) for kind, items in self.items.items()}
+
+
+def ancestor_ids(folder):
+    return {int(pk) for pk in folder.tree_path.strip('/').split('/') if pk}
+
+
+def move(user, file_ids, folder_ids, destination):
+    """Move files and folders into ``destination`` (None for the top level)."""
+    result = BulkResult(file_ids, folder_ids)
+    destination_id = destination.pk if destination else None
+    with transaction.atomic():
+        files = File.objects.filter(owner=user, is_deleted=False, pk__in=file_ids)
+        moved = list(files.values_list('pk', flat=True))
+        File.objects.filter(pk__in=moved).update(folder=destination, updated_at=timezone.now())
+        ChangeLog.record(user.pk, Change.FILE, moved, Change.UPDATE)
+        result.succeed('files', moved, 'moved')
+
+        # Folder names are unique per parent, trashed folders included
+        taken = set(Folder.objects.filter(owner=user, parent=destination).values_list('name', flat=True))
+        blocked = ancestor_ids(destination) | {destination_id} if destination else set()
+        # Deepest first, so moving a folder never invalidates the paths of the ones left
+        folders = Folder.objects.filter(owner=user, is_deleted=False, pk__in=folder_ids).order_by('-depth')
+        for folder in folders:
+            if folder.pk in blocked:
+                result.fail('folders', folder.pk, 'Cannot move a folder into itself.')
+            elif folder.parent_id == destination_id:
+                result.succeed('folders', [folder.pk], 'moved')
+            elif folder.name in taken:
+                result.fail('folders', folder.pk, 'A folder with this name already exists there.')
+            else:
+                folder.parent = destination
+                folder.save()
+                taken.add(folder.name)
+                result.succeed('folders', [folder.pk], 'moved')
+    return result
+
+
+def trash(user, file_ids, folder_ids):
+    """Move files and folders (with their contents) to the trash."""
+    result = BulkResult(file_ids, folder_ids)
+    folder_count = file_count = size = 0
+    now = timezone.now()
+    with transaction.atomic():
+        live_files = list(
+            File.objects.filter(owner=user, is_deleted=False, pk__in=file_ids).values_list('pk', flat=True)
+        )
+
+        trashed = set()
+        folders = Folder.objects.filter(owner=user, is_deleted=False, pk__in=folder_ids).order_by('depth')
+        for folder in folders:
+            # Already trashed along with an ancestor earlier in the batch
+            if not ancestor_ids(folder) & trashed:
+                folders_trashed, files_trashed, bytes_trashed = folder.trash_subtree()
+                folder_count += folders_trashed
+                file_count += files_trashed
+                size += bytes_trashed
+            trashed.add(folder.pk)
+        result.succeed('folders', trashed, 'trashed')
+
+        remaining = File.objects.filter(pk__in=live_files, is_deleted=False)
+        remaining_ids = list(remaining.values_list('pk', flat=True))
+        file_count += remaining.update(is_deleted=True, deleted_at=now)
+        ChangeLog.record(user.pk, Change.FILE, remaining_ids, Change.TRASH)
+        size += File.objects.filter(pk__in=live_files, deleted_at=now).aggregate(
+            total=Sum('size')
+        )['total'] or 0
+        result.succeed('files', live_files, 'trashed')
+
+        UserStorage.adjust(user, space=-size, files=-file_count, folders=-folder_count)
+    return result
+
+
+def restore(user, file_ids, folder_ids):
+    """Restore files and folders from the trash.
+
+    Quota for the whole batch is reserved up front; raises
+    InsufficientStorage if it does not fit.
+    """
+    result = BulkResult(file_ids, folder_ids)
+    files = File.objects.filter(owner=user, is_deleted=True, pk__in=file_ids)
+    ids = list(files.values_list('pk', flat=True))
+    folders = list(Folder.objects.filter(owner=user, is_deleted=True, pk__in=folder_ids).order_by('depth'))
+
+    # Upper bound: a file can be counted twice when nested folders are restored together
+    needed = File.objects.filter(pk__in=ids).aggregate(total=Sum('size'))['total'] or 0
+    for folder in folders:
+        needed += folder.get_trashed_with()[1].aggregate(total=Sum('size'))['total'] or 0
+
+    storage, created = UserStorage.objects.get_or_create(user=user)
+    if not storage.reserve(needed):
+        raise InsufficientStorage(storage.available_space())
+
+    folder_count = file_count = size = 0
+    try:
+        with transaction.atomic():
+            restoring = {folder.pk for folder in folders}
+            for folder in folders:
+                parent_id = folder.parent_id
+                if parent_id and parent_id not in restoring and Folder.objects.filter(
+                    pk=parent_id, is_deleted=True
+                ).exists():
+                    # The parent stays in the trash, so bring the folder back at the top level
+                    folder.parent = None
+                    folder.save()
+                size += folder.get_trashed_with()[1].aggregate(total=Sum('size'))['total'] or 0
+                folders_restored, files_restored = folder.restore_subtree()
+                folder_count += folders_restored
+                file_count += files_restored
+            result.succeed('folders', restoring, 'restored')
+
+            now = timezone.now()
+            trashed = File.objects.filter(pk__in=ids, is_deleted=True)
+            trashed_ids = list(trashed.values_list('pk', flat=True))
+            file_count += trashed.update(is_deleted=False, deleted_at=None, updated_at=now)
+            ChangeLog.record(user.pk, Change.FILE, trashed_ids, Change.RESTORE)
+            size += File.objects.filter(pk__in=ids, updated_at=now).aggregate(
+                total=Sum('size')
+            )['total'] or 0
+            result.succeed('files', ids, 'restored')
+
+            UserStorage.adjust(user, space=size, files=file_count, folders=folder_count, reserved=-needed)
+    except Exception:
+        storage.release(needed)
+        raise
+    return result
+
+
+def share(user, file_ids, shared=True):
+    """Enable or disable share links for files."""
+    result = BulkResult(file_ids, [])
+    now = timezone.now()
+    with transaction.atomic():
+        files = list(File.objects.filter(owner=user, is_deleted=False, pk__in=file_ids))
+        if shared:
+            changed = []
+            for file_obj in files:
+                if not file_obj.share_token or not file_obj.is_shared:
+                    file_obj.share_token = file_obj.share_token or str(uuid.uuid4())
+                    file_obj.is_shared = True
+                    file_obj.updated_at = now
+                    changed.append(file_obj)
+            File.objects.bulk_update(changed, ['share_token', 'is_shared', 'updated_at'])
+            ChangeLog.record(user.pk, Change.FILE, [f.pk for f in changed], Change.UPDATE)
+            for file_obj in files:
+                result.succeed('files', [file_obj.pk], 'shared', share_token=file_obj.share_token)
+        else:
+            File.objects.filter(pk__in=[f.pk for f in files]).update(
+                is_shared=False, share_token=None, updated_at=now
+            )
+            ChangeLog.record(user.pk, Change.FILE, [f.pk for f in files], Change.UPDATE)
+            result.succeed('files', [f.pk for f in files], 'unshared')
+    return result
@@ -0,0 +1,220 @@
+# backend/api/changefeed.py
+"""
+Delta sync over the per-user change journal.
+
+Every create, rename, move, share, trash, restore and permanent delete
+of a File or Folder appends a ``Change`` in the same transaction (see
+``ChangeLog.record``). A client takes a cursor from ``GET
+/api/changes/``, lists the tree once, and from then on asks for
+``changes/?since=<cursor>``: each batch holds the current state of every
+file and folder changed after the cursor, once per object, plus the
+cursor to ask from next. With ``wait`` the request blocks until there is
+something to return.
+
+``compact()`` (``manage.py compact_changes``) drops entries superseded
+by a later change to the same object, which never changes what a
+client receives, and entries older than CHANGE_JOURNAL_RETENTION.
+Cursors from before the latter get 410 and have to resync.
+"""
+import asyncio
+import collections
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+
+from .models import Change, ChangeLog, File, Folder
+from .serializers import FileSerializer, FolderSerializer
+
+PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+MAX_WAIT = 60
+
+
+class CursorExpired(Exception):
+    """The changes after a cursor are no longer all in the journal."""
+
+    def __init__(self, cursor):
+        super().__init__('Cursor expired; list everything again and continue from the new cursor.')
+        self.cursor = cursor
+
+
+def parse_params(params):
+    """(since, limit, wait) from query parameters; raises ValueError if malformed.
+
+    ``since`` is None when the client only wants the current cursor.
+    """
+    try:
+        since = int(params['since']) if params.get('since', '') != '' else None
+        limit = min(max(int(params.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        wait = float(params.get('wait', 0))
+    except ValueError:
+        raise ValueError('since and limit must be integers and wait a number of seconds.')
+    if not math.isfinite(wait):
+        raise ValueError('wait must be a finite number of seconds.')
+    wait = min(max(wait, 0), MAX_WAIT)
+    if since is not None and since < 0:
+        raise ValueError('since must not be negative.')
+    return since, limit, wait
+
+
+def current_cursor(user):
+    """The cursor just past the user's newest change."""
+    return ChangeLog.objects.filter(user=user).values_list('last_seq', flat=True).first() or 0
+
+
+def get_changes(request, user, since, limit):
+    """The next batch of changes after ``since``.
+
+    Returns ``{'cursor', 'has_more', 'changes'}``. Each object appears
+    once, with the action and sequence number of its latest change and
+    its current state as ``data`` (None once it is permanently
+    deleted). Folders come before files, so a batch can be applied as a
+    whole. Raises CursorExpired if changes after ``since`` were dropped.
+    """
+    log = ChangeLog.objects.filter(user=user).values('last_seq', 'compacted_seq').first()
+    last_seq, compacted_seq = (log['last_seq'], log['compacted_seq']) if log else (0, 0)
+    if since < compacted_seq or since > last_seq:
+        raise CursorExpired(last_seq)
+
+    rows = list(
+        Change.objects.filter(owner=user, seq__gt=since).order_by('seq')
+        .values_list('seq', 'kind', 'object_id', 'action')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for seq, kind, object_id, action in rows:
+        latest[kind, object_id] = (seq, action)
+    ids = collections.defaultdict(list)
+    for kind, object_id in latest:
+        ids[kind].append(object_id)
+    found = {
+        Change.FOLDER: Folder.objects.filter(owner=user).for_listing().in_bulk(ids[Change.FOLDER]),
+        Change.FILE: File.objects.filter(owner=user).for_listing().in_bulk(ids[Change.FILE]),
+    }
+    serializers = {Change.FOLDER: FolderSerializer, Change.FILE: FileSerializer}
+
+    changes = []
+    for (kind, object_id), (seq, action) in sorted(
+        latest.items(), key=lambda item: (item[0][0] != Change.FOLDER, item[1][0])
+    ):
+        obj = found[kind].get(object_id)
+        changes.append({
+            'seq': seq,
+            'type': kind,
+            'id': object_id,
+            'action': action if obj is not None else Change.DELETE,
+            'data': serializers[kind](obj, context={'request': request}).data if obj is not None else None,
+        })
+    return {'cursor': rows[-1][0] if rows else since, 'has_more': has_more, 'changes': changes}
+
+
+class Notifier:
+    """Wakes the requests in this process that wait on a user's changes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiters = collections.defaultdict(set)
+
+    def subscribe(self, owner_id, wake):
+        with self.lock:
+            self.waiters[owner_id].add(wake)
+
+    def unsubscribe(self, owner_id, wake):
+        with self.lock:
+            waiters = self.waiters.get(owner_id)
+            if waiters is not None:
+                waiters.discard(wake)
+                if not waiters:
+                    del self.waiters[owner_id]
+
+    def notify(self, sender=None, owner_id=None, **kwargs):
+        with self.lock:
+            waiters = list(self.waiters.get(owner_id, ()))
+        for wake in waiters:
+            wake()
+
+
+# Connected to changes_recorded in ApiConfig.ready()
+notifier = Notifier()
+
+
+def wait_for_changes(user, since, timeout):
+    """Block until the user has changes after ``since``, or for ``timeout`` seconds.
+
+    Commits in this process wake the wait straight away; those made by
+    other processes are noticed within CHANGES_POLL_INTERVAL. A cursor
+    past the user's newest change returns at once, for get_changes() to
+    reject. Returns whether there are changes.
+    """
+    deadline = time.monotonic() + timeout
+    event = threading.Event()
+    notifier.subscribe(user.pk, event.set)
+    try:
+        while (cursor := current_cursor(user)) == since:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            event.wait(min(remaining, settings.CHANGES_POLL_INTERVAL))
+            event.clear()
+        return cursor > since
+    finally:
+        notifier.unsubscribe(user.pk, event.set)
+
+
+async def await_changes(user, since, timeout):
+    """wait_for_changes() for async views; holds no thread while waiting."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    event = asyncio.Event()
+
+    def wake():
+        loop.call_soon_threadsafe(event.set)
+
+    last_seq = ChangeLog.objects.filter(user=user).values_list('last_seq', flat=True)
+    notifier.subscribe(user.pk, wake)
+    try:
+        while (cursor := await last_seq.afirst() or 0) == since:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(event.wait(), min(remaining, settings.CHANGES_POLL_INTERVAL))
+            except asyncio.TimeoutError:
+                pass
+            event.clear()
+        return cursor > since
+    finally:
+        notifier.unsubscribe(user.pk, wake)
+
+
+def compact(retention=None, batch_size=None):
+    """Drop superseded entries, then entries older than ``retention``.
+
+    Returns (superseded, expired) entries dropped.
+    """
+    retention = retention if retention is not None else settings.CHANGE_JOURNAL_RETENTION
+    batch_size = batch_size or settings.CHANGE_COMPACT_BATCH_SIZE
+
+    newer = Change.objects.filter(
+        owner=OuterRef('owner'), kind=OuterRef('kind'), object_id=OuterRef('object_id'), seq__gt=OuterRef('seq')
+    )
+    superseded = Change.objects.filter(Exists(newer)).order_by('pk')
+    dropped, last = 0, 0
+    while ids := list(superseded.filter(pk__gt=last).values_list('pk', flat=True)[:batch_size]):
+        dropped += Change.objects.filter(pk__in=ids).delete()[0]
+        last = ids[-1]
+
+    expired = 0
+    old = Change.objects.filter(created_at__lt=timezone.now() - retention)
+    for owner_id, floor in old.values('owner').annotate(floor=Max('seq')).values_list('owner', 'floor'):
+        with transaction.atomic():
+            ChangeLog.objects.filter(user_id=owner_id, compacted_seq__lt=floor).update(compacted_seq=floor)
+            expired += Change.objects.filter(owner_id=owner_id, seq__lte=floor).delete()[0]
+    return dropped, expired
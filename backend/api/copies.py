@@ -0,0 +1,173 @@
+# backend/api/copies.py
+"""
+Server-side copies of files and folders.
+
+A blob-backed file is copied by inserting a File row that takes another
+reference on the same blob, so no bytes are read or written. Files
+stored before the blob store are cloned into it first (see
+``blobs.store_copy``: hard link, reflink, then an in-kernel copy).
+
+Folder copies recreate the subtree one level at a time with bulk
+inserts, copy files in batches, and charge the user's quota once for
+the whole copy.
+"""
+import itertools
+
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+
+from .blobs import store_copy
+from .bulk import InsufficientStorage
+from .models import Blob, Change, ChangeLog, File, Folder, UserStorage
+
+BATCH_SIZE = 1000
+# Copy names tried before giving up when concurrent copies keep taking them
+NAME_ATTEMPTS = 10
+
+
+class NameTaken(Exception):
+    """The destination already has a folder with the requested name."""
+
+    def __init__(self, name):
+        super().__init__(f"A folder named {name!r} already exists there.")
+        self.name = name
+
+
+def copy_name(user, parent, name, also_taken=()):
+    """``name``, or "<name> (copy)", "<name> (copy 2)"... if it is taken under ``parent``."""
+    taken = set(Folder.objects.filter(owner=user, parent=parent).values_list('name', flat=True))
+    taken.update(also_taken)
+    if name not in taken:
+        return name
+    for n in itertools.count(1):
+        candidate = f'{name} (copy)' if n == 1 else f'{name} (copy {n})'
+        if candidate not in taken:
+            return candidate
+
+
+def create_root(user, parent, name, exact):
+    """Insert the top folder of a copy, named ``name`` or, unless ``exact``, a free copy name.
+
+    A concurrent copy into ``parent`` can take the chosen name between
+    the check and the insert; the unique constraint turns that into
+    NameTaken, or into another try with the next free name.
+    """
+    failed = set()
+    for attempt in range(NAME_ATTEMPTS):
+        candidate = name if exact else copy_name(user, parent, name, failed)
+        if exact and Folder.objects.filter(owner=user, parent=parent, name=name).exists():
+            raise NameTaken(name)
+        try:
+            with transaction.atomic():
+                root = Folder(name=candidate, owner=user, parent=parent)
+                root.save()
+            return root
+        except IntegrityError:
+            if exact:
+                raise NameTaken(name)
+            failed.add(candidate)
+    raise NameTaken(candidate)
+
+
+def clone_files(user, files, folder_id_for, name=None):
+    """Insert copies of ``files`` (locked by the caller); returns them.
+
+    ``folder_id_for`` maps a source file to the folder id of its copy.
+    """
+    copies = []
+    shared = []
+    for file_obj in files:
+        if file_obj.blob_id:
+            blob_id, stored_name = file_obj.blob_id, file_obj.file.name
+            shared.append(blob_id)
+        else:
+            # Pre-blob file: clone it into the blob store, which takes its own reference
+            blob = store_copy(file_obj.file.path)
+            blob_id, stored_name = blob.pk, blob.name
+        copies.append(File(
+            name=name or file_obj.name,
+            file=stored_name,
+            blob_id=blob_id,
+            owner=user,
+            folder_id=folder_id_for(file_obj),
+            size=file_obj.size,
+            mime_type=file_obj.mime_type,
+        ))
+    Blob.objects.retain(shared)
+    File.objects.bulk_create(copies)
+    ChangeLog.record(user.pk, Change.FILE, [copy.pk for copy in copies], Change.CREATE)
+    return copies
+
+
+def reserve(user, size):
+    storage, created = UserStorage.objects.get_or_create(user=user)
+    if not storage.reserve(size):
+        raise InsufficientStorage(storage.available_space())
+    return storage
+
+
+def copy_file(user, file_obj, folder, name=None):
+    """Copy a file into ``folder`` (None for the top level); returns the copy.
+
+    Raises File.DoesNotExist if the file was deleted meanwhile.
+    """
+    storage = reserve(user, file_obj.size)
+    try:
+        with transaction.atomic():
+            # Locked, so the source's blob reference cannot be purged mid-copy
+            source = File.objects.select_for_update().get(pk=file_obj.pk, owner=user, is_deleted=False)
+            [copy] = clone_files(user, [source], lambda f: folder.pk if folder else None, name)
+            UserStorage.adjust(user, space=copy.size, files=1, reserved=-file_obj.size)
+    except Exception:
+        storage.release(file_obj.size)
+        raise
+    return copy
+
+
+def copy_folder(user, folder, parent, name=None):
+    """Copy a folder with everything in it under ``parent`` (None for the top level).
+
+    Without ``name`` the copy gets a free "<name> (copy)" name; raises
+    NameTaken if an explicit ``name`` is in use. Returns the new folder.
+    """
+    subtree = list(folder.get_descendants(include_self=True).filter(is_deleted=False).order_by('depth', 'pk'))
+    files = File.objects.filter(folder__in=[f.pk for f in subtree], is_deleted=False)
+    needed = files.aggregate(total=Sum('size'))['total'] or 0
+
+    storage = reserve(user, needed)
+    try:
+        with transaction.atomic():
+            root = create_root(user, parent, folder.name if name is None else name, exact=name is not None)
+
+            # Parents are inserted a level before their children, so their paths are known
+            copies = {folder.pk: root}
+            for _, level in itertools.groupby(subtree[1:], key=lambda f: f.depth):
+                level = list(level)
+                created = []
+                for source in level:
+                    new_parent = copies[source.parent_id]
+                    created.append(Folder(
+                        name=source.name,
+                        owner=user,
+                        parent=new_parent,
+                        tree_path=new_parent.descendant_prefix,
+                        full_path=f'{new_parent.full_path}/{source.name}',
+                        depth=new_parent.depth + 1,
+                    ))
+                Folder.objects.bulk_create(created)
+                copies.update(zip((source.pk for source in level), created))
+                ChangeLog.record(user.pk, Change.FOLDER, [f.pk for f in created], Change.CREATE)
+
+            size = count = 0
+            last = 0
+            while batch := list(files.filter(pk__gt=last).select_for_update().order_by('pk')[:BATCH_SIZE]):
+                clone_files(user, batch, lambda f: copies[f.folder_id].pk)
+                size += sum(f.size for f in batch)
+                count += len(batch)
+                last = batch[-1].pk
+
+            UserStorage.adjust(user, space=size, files=count, folders=len(subtree), reserved=-needed)
+    except Exception:
+        storage.release(needed)
+        raise
+    return root
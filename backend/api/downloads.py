@@ -0,0 +1,329 @@
+# backend/api/downloads.py
+"""
+Shared download path for owner downloads and public share links.
+
+Handles validators (ETag / Last-Modified), checksums (Digest /
+Repr-Digest from the stored SHA-256), conditional requests that
+short-circuit to 304/412 before the file is touched, and single or
+multi-range requests (RFC 9110). The bytes themselves are delivered by
+the backend named in ``settings.FILE_DELIVERY_BACKEND``: streamed by
+Django, or handed to nginx (X-Accel-Redirect) or Apache/lighttpd
+(X-Sendfile) once authorization and headers are done. Under ASGI,
+streamed bodies are read in worker threads so no thread waits on the
+client (see :mod:`api.transfers`).
+"""
+import base64
+import hashlib
+import os
+import re
+import uuid
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from . import sharecache
+from .metrics import storage_io
+
+STREAM_BLOCK_SIZE = 64 * 1024
+MAX_RANGES = 16
+# Renditions of a blob never change, so clients may keep them indefinitely
+DERIVATIVE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+RANGE_RE = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+def file_etag(file_obj):
+    """Strong ETag derived from stored metadata, never from reading the file."""
+    if file_obj.blob_id:
+        return quote_etag(file_obj.blob.digest)
+    name_hash = hashlib.sha1(file_obj.file.name.encode()).hexdigest()[:16]
+    return quote_etag(f'{name_hash}-{file_obj.size}')
+
+
+def digest_headers(file_obj):
+    """``Digest`` (RFC 3230) and ``Repr-Digest`` (RFC 9530) for the whole file."""
+    if not file_obj.blob_id:
+        return {}
+    value = base64.b64encode(bytes.fromhex(file_obj.blob.digest)).decode()
+    return {'Digest': f'sha-256={value}', 'Repr-Digest': f'sha-256=:{value}:'}
+
+
+def file_last_modified(file_obj):
+    """Last-Modified as a Unix timestamp."""
+    return int(file_obj.updated_at.timestamp())
+
+
+def parse_range(header, size):
+    """Parse a ``Range`` header into a list of inclusive (start, end) pairs.
+
+    Returns None when the header should be ignored (malformed, not
+    bytes, or too many ranges) and an empty list when it is valid but
+    no range can be satisfied.
+    """
+    units, _, spec = header.partition('=')
+    if units.strip().lower() != 'bytes' or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(','):
+        match = RANGE_RE.match(part)
+        if not match or match.groups() == ('', ''):
+            return None
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if last and int(last) < start:
+                return None
+        else:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length == 0:
+                continue
+            start = max(size - length, 0)
+            end = size - 1
+        if start < size:
+            ranges.append((start, end))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    # Coalesce overlapping or adjacent ranges so clients cannot amplify reads
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def if_range_matches(request, etag, last_modified):
+    """Evaluate ``If-Range``; a mismatch means the full file must be sent."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    if if_range.startswith('W/'):
+        return False
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def read_range(path, start, end):
+    """Yield the bytes in [start, end] from ``path`` in blocks."""
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            with storage_io():
+                block = fh.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+def multipart_ranges(path, ranges, size, content_type, boundary):
+    """Build the parts of a multipart/byteranges body.
+
+    Returns (length, iterator) so Content-Length is known up front.
+    """
+    headers = [
+        (
+            f'\r\n--{boundary}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+        ).encode()
+        for start, end in ranges
+    ]
+    closing = f'\r\n--{boundary}--\r\n'.encode()
+    length = sum(len(h) for h in headers) + len(closing)
+    length += sum(end - start + 1 for start, end in ranges)
+
+    def body():
+        for header, (start, end) in zip(headers, ranges):
+            yield header
+            yield from read_range(path, start, end)
+        yield closing
+
+    return length, body()
+
+
+def take(iterator, size):
+    """Join blocks from ``iterator`` until there are ``size`` bytes; b'' once exhausted."""
+    blocks, length = [], 0
+    for block in iterator:
+        blocks.append(block)
+        length += len(block)
+        if length >= size:
+            break
+    return b''.join(blocks)
+
+
+async def iterate_in_threads(iterator):
+    """Async iterator over a blocking one, pulling each block in a worker thread.
+
+    The next block is only read once the previous one has been sent, so
+    a slow client holds no thread and no more than one block of memory.
+    """
+    iterator = iter(iterator)
+    while block := await sync_to_async(take, thread_sensitive=False)(iterator, STREAM_BLOCK_SIZE):
+        yield block
+
+
+def stream_response(request, file_obj, path, etag, last_modified):
+    """Deliver the file from this process, honouring Range headers."""
+    size = file_obj.size
+    content_type = file_obj.mime_type or 'application/octet-stream'
+    range_header = request.META.get('HTTP_RANGE')
+    ranges = None
+    if range_header and if_range_matches(request, etag, last_modified):
+        ranges = parse_range(range_header, size)
+
+    if ranges is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    elif not ranges:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(
+            read_range(path, start, end), status=206, content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    else:
+        boundary = uuid.uuid4().hex
+        length, body = multipart_ranges(path, ranges, size, content_type, boundary)
+        response = StreamingHttpResponse(
+            body, status=206, content_type=f'multipart/byteranges; boundary={boundary}'
+        )
+        response['Content-Length'] = length
+    return response
+
+
+def memory_response(request, file_obj, content, etag, last_modified):
+    """Deliver bytes already in memory, honouring Range headers."""
+    size = file_obj.size
+    content_type = file_obj.mime_type or 'application/octet-stream'
+    range_header = request.META.get('HTTP_RANGE')
+    ranges = None
+    if range_header and if_range_matches(request, etag, last_modified):
+        ranges = parse_range(range_header, size)
+
+    if ranges is None:
+        return HttpResponse(content, content_type=content_type)
+    if len(ranges) > 1:
+        # Rare enough to build from the file
+        return stream_response(request, file_obj, file_obj.file.path, etag, last_modified)
+    if not ranges:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    start, end = ranges[0]
+    response = HttpResponse(content[start:end + 1], status=206, content_type=content_type)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def accel_redirect_response(request, file_obj, path, etag, last_modified):
+    """Hand the transfer to nginx via an internal location."""
+    response = HttpResponse(content_type=file_obj.mime_type or 'application/octet-stream')
+    prefix = settings.FILE_DELIVERY_INTERNAL_PREFIX.rstrip('/')
+    response['X-Accel-Redirect'] = f'{prefix}/{quote(default_storage.served_name(file_obj.file.name, path))}'
+    return response
+
+
+def sendfile_response(request, file_obj, path, etag, last_modified):
+    """Hand the transfer to Apache mod_xsendfile or lighttpd."""
+    response = HttpResponse(content_type=file_obj.mime_type or 'application/octet-stream')
+    response['X-Sendfile'] = path
+    return response
+
+
+DELIVERY_BACKENDS = {
+    'stream': stream_response,
+    'x-accel-redirect': accel_redirect_response,
+    'x-sendfile': sendfile_response,
+}
+
+
+def get_delivery_backend():
+    """Return the response builder selected by FILE_DELIVERY_BACKEND."""
+    name = settings.FILE_DELIVERY_BACKEND
+    try:
+        return DELIVERY_BACKENDS[name]
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"Unknown FILE_DELIVERY_BACKEND {name!r}; "
+            f"choose one of {', '.join(DELIVERY_BACKENDS)}."
+        )
+
+
+def serve_file(request, file_obj, asynchronous=False, cache_content=False):
+    """Return the response for downloading ``file_obj``.
+
+    With ``asynchronous`` a streamed body is an async iterator, for
+    views served under ASGI. With ``cache_content`` small files are
+    served from (and kept in) the hot content cache when Django streams
+    the bytes itself.
+    """
+    etag = file_etag(file_obj)
+    last_modified = file_last_modified(file_obj)
+
+    # Conditional requests are answered from metadata alone
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        if conditional.status_code == 304:
+            conditional['ETag'] = etag
+            conditional['Last-Modified'] = http_date(last_modified)
+        conditional['Accept-Ranges'] = 'bytes'
+        return conditional
+
+    content = None
+    if cache_content and settings.FILE_DELIVERY_BACKEND == 'stream':
+        try:
+            content = sharecache.contents.get(file_obj)
+        except FileNotFoundError:
+            raise Http404("File not found")
+
+    if content is not None:
+        response = memory_response(request, file_obj, content, etag, last_modified)
+    else:
+        path = file_obj.file.path
+        if not os.path.exists(path):
+            raise Http404("File not found")
+        response = get_delivery_backend()(request, file_obj, path, etag, last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Content-Disposition'] = f'attachment; filename="{file_obj.name}"'
+    if response.status_code in (200, 206):
+        # Describes the full representation, so range responses carry it too
+        for header, value in digest_headers(file_obj).items():
+            response[header] = value
+    if asynchronous and response.streaming:
+        response.streaming_content = iterate_in_threads(response.streaming_content)
+    return response
+
+
+def serve_derivative(request, derivative):
+    """Return the response for a thumbnail or preview."""
+    etag = quote_etag(f'{derivative.blob.digest}-{derivative.kind}')
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        path = default_storage.path(derivative.name)
+        if not os.path.exists(path):
+            raise Http404("Thumbnail not found")
+        response = FileResponse(open(path, 'rb'), content_type='image/jpeg')
+    response['ETag'] = etag
+    response['Cache-Control'] = DERIVATIVE_CACHE_CONTROL
+    return response
@@ -0,0 +1,110 @@
+# backend/api/imaging.py
+"""
+Image rendering for thumbnails and previews.
+
+Plain file-to-file functions with no Django imports, so they can run in
+worker processes started with ``spawn``. PDFs are rasterized with
+poppler's ``pdftoppm`` when it is installed.
+"""
+import functools
+import os
+import shutil
+import subprocess
+import tempfile
+
+from PIL import Image, ImageOps
+
+PREVIEW = 'preview'
+PREVIEW_SIZE = 1600
+JPEG_QUALITY = 85
+PDF_TIMEOUT = 60
+
+IMAGE_TYPES = {
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp',
+    'image/bmp', 'image/x-ms-bmp', 'image/tiff',
+}
+PDF_TYPES = {'application/pdf'}
+
+
+@functools.lru_cache(maxsize=None)
+def pdf_renderer():
+    return shutil.which('pdftoppm')
+
+
+def bounding_size(kind):
+    """Longest edge in pixels for a derivative kind (``thumb-128``, ``preview``)."""
+    if kind == PREVIEW:
+        return PREVIEW_SIZE
+    return int(kind.rpartition('-')[2])
+
+
+def open_source(source_path, mime_type, size):
+    """Open the image to scale down; PDFs are rasterized at ``size`` first."""
+    if mime_type not in PDF_TYPES:
+        image = Image.open(source_path)
+        # JPEG can decode at 1/2, 1/4 or 1/8 scale, which is far cheaper than a full decode
+        image.draft('RGB', (size, size))
+        return image
+
+    renderer = pdf_renderer()
+    if not renderer:
+        raise RuntimeError('pdftoppm is not installed')
+    with tempfile.TemporaryDirectory() as tmp:
+        prefix = os.path.join(tmp, 'page')
+        subprocess.run(
+            [renderer, '-f', '1', '-l', '1', '-singlefile', '-scale-to', str(size),
+             '-jpeg', source_path, prefix],
+            check=True, capture_output=True, timeout=PDF_TIMEOUT,
+        )
+        with Image.open(prefix + '.jpg') as page:
+            page.load()
+            return page.copy()
+
+
+def flatten(image):
+    """RGB image with any transparency composited onto white."""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB') if image.mode != 'RGB' else image
+
+
+def save_jpeg(image, target_path):
+    """Write atomically so readers never see a partial file."""
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(target_path))
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            image.save(fh, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+        os.replace(tmp_path, target_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return os.path.getsize(target_path)
+
+
+def render_all(source_path, mime_type, targets):
+    """Render every ``(kind, target_path)`` from one decode of the source.
+
+    Returns {kind: size in bytes, or an error message}. Kinds are
+    rendered largest first, each scaled down from the previous one.
+    """
+    targets = sorted(targets, key=lambda target: bounding_size(target[0]), reverse=True)
+    try:
+        with open_source(source_path, mime_type, bounding_size(targets[0][0])) as source:
+            image = flatten(ImageOps.exif_transpose(source))
+    except Exception as exc:
+        return {kind: f'{type(exc).__name__}: {exc}' for kind, _ in targets}
+
+    results = {}
+    for kind, target_path in targets:
+        try:
+            size = bounding_size(kind)
+            image.thumbnail((size, size), Image.LANCZOS, reducing_gap=3.0)
+            results[kind] = save_jpeg(image, target_path)
+        except Exception as exc:
+            results[kind] = f'{type(exc).__name__}: {exc}'
+    return results
@@ -0,0 +1 @@
+# backend/api/management/__init__.py
\ No newline at end of file
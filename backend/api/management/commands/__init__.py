@@ -0,0 +1 @@
+# backend/api/management/commands/__init__.py
\ No newline at end of file
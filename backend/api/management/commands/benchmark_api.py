@@ -0,0 +1,305 @@
+# backend/api/management/commands/benchmark_api.py
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import uuid
+
+import django
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.utils import timezone
+from api import sharecache
+from api.authentication import tokens_for
+from api.blobs import staging_dir, store_path
+from api.models import Blob, File, Folder, UserStorage
+
+SCENARIOS = ('upload', 'download', 'list', 'contents', 'search', 'storage', 'trash', 'shared')
+WORDS = [
+    'annual', 'report', 'invoice', 'budget', 'design', 'draft', 'final', 'meeting',
+    'notes', 'photo', 'holiday', 'contract', 'scan', 'backup', 'release', 'summary',
+]
+EXTENSIONS = [
+    ('pdf', 'application/pdf'), ('jpg', 'image/jpeg'), ('png', 'image/png'),
+    ('txt', 'text/plain'), ('zip', 'application/zip'),
+]
+# Compared against the baseline; the rest of each result is informational
+COMPARED = ('p50_ms', 'p95_ms', 'queries_per_request')
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed synthetic users and time the API hot paths (upload, download, listings, search, '
+        'storage, trash and share links) through the full request stack. Prints JSON with --json '
+        'or --output, and fails if --baseline shows a regression. Run it against a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=3)
+        parser.add_argument('--files', type=int, default=2000, help='Files per user.')
+        parser.add_argument('--folders', type=int, default=100, help='Folders per user.')
+        parser.add_argument('--depth', type=int, default=4, help='Deepest folder level.')
+        parser.add_argument('--blobs', type=int, default=32, help='Distinct contents per user.')
+        parser.add_argument('--size', type=int, default=16 * 1024, help='Bytes per file.')
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed requests per scenario.')
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                            help=f"Comma-separated subset of {', '.join(SCENARIOS)}.")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+        parser.add_argument('--output', help='Also write the JSON results to this file (e.g. a new baseline).')
+        parser.add_argument('--baseline', help='Compare against results saved earlier with --output.')
+        parser.add_argument('--tolerance', type=float, default=25,
+                            help='Percent slower than the baseline that counts as a regression.')
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as fh:
+                baseline = json.load(fh)
+
+        rng = random.Random(options['seed'])
+        media_root = tempfile.mkdtemp()
+        run = uuid.uuid4().hex[:8]
+        users = []
+        try:
+            # Share links stay cached for the whole run, so hits do not depend on timing
+            with override_settings(MEDIA_ROOT=media_root, STORAGE_VOLUMES=[], ALLOWED_HOSTS=['*'],
+                                   FILE_DELIVERY_BACKEND='stream', THUMBNAIL_BACKEND='inline',
+                                   SHARE_CACHE_TTL=3600):
+                started = time.perf_counter()
+                for index in range(options['users']):
+                    user = User.objects.create_user(username=f'bench-api-{run}-{index}')
+                    users.append(user)
+                    self.seed(user, rng, options)
+                seed_seconds = time.perf_counter() - started
+
+                fixtures = self.fixtures(users)
+                results = {
+                    'backend': connection.vendor,
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'config': {key: options[key] for key in (
+                        'users', 'files', 'folders', 'depth', 'blobs', 'size', 'requests', 'seed'
+                    )},
+                    'seed_seconds': round(seed_seconds, 2),
+                    'scenarios': {
+                        name: self.measure(name, fixtures, rng, options) for name in scenarios
+                    },
+                }
+        finally:
+            self.cleanup(users)
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        regressions = []
+        if baseline is not None:
+            results['comparison'], regressions = self.compare(results, baseline, options['tolerance'])
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+                fh.write('\n')
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.report(results)
+        if regressions:
+            raise CommandError(f"Slower than the baseline: {', '.join(regressions)}")
+
+    def seed(self, user, rng, options):
+        folders = []
+        for index in range(options['folders']):
+            shallow = [folder for folder in folders if folder.depth < options['depth']]
+            parent = rng.choice(shallow) if shallow and rng.random() < 0.8 else None
+            folders.append(Folder.objects.create(name=f'{rng.choice(WORDS)}-{index}', owner=user, parent=parent))
+
+        blobs = []
+        for _ in range(max(options['blobs'], 1)):
+            staged = os.path.join(staging_dir(), f'bench-{uuid.uuid4().hex}.upload')
+            with open(staged, 'wb') as fh:
+                fh.write(rng.randbytes(options['size']))
+            blobs.append(store_path(staged))
+
+        now = timezone.now()
+        rows = []
+        for index in range(options['files']):
+            ext, mime = rng.choice(EXTENSIONS)
+            blob = rng.choice(blobs)
+            trashed = rng.random() < 0.1
+            shared = not trashed and rng.random() < 0.05
+            rows.append(File(
+                name=f'{rng.choice(WORDS)}_{rng.choice(WORDS)}_{index}.{ext}', owner=user,
+                folder=rng.choice(folders) if folders and rng.random() < 0.9 else None,
+                file=blob.name, blob=blob, size=blob.size, mime_type=mime,
+                is_deleted=trashed, deleted_at=now if trashed else None,
+                is_shared=shared, share_token=uuid.uuid4().hex if shared else None,
+            ))
+        with transaction.atomic():
+            File.objects.bulk_create(rows, batch_size=1000)
+            Blob.objects.retain(row.blob_id for row in rows)
+        storage, _ = UserStorage.objects.get_or_create(user=user)
+        storage.update_usage()
+
+    def fixtures(self, users):
+        """What the scenarios pick from, per user."""
+        fixtures = []
+        for user in users:
+            files = File.objects.filter(owner=user, is_deleted=False)
+            fixtures.append({
+                'client': Client(HTTP_AUTHORIZATION=f"Bearer {tokens_for(user)['access']}"),
+                'anonymous': Client(),
+                'files': list(files.values_list('pk', flat=True)),
+                'folders': list(Folder.objects.filter(owner=user).values_list('pk', flat=True)),
+                'tokens': list(files.filter(is_shared=True).values_list('share_token', flat=True)),
+            })
+        return fixtures
+
+    def request(self, name, fixture, rng, size):
+        """Send one request of scenario ``name``; returns the response with its body read."""
+        client = fixture['client']
+        if name == 'upload':
+            upload = SimpleUploadedFile(f'upload-{uuid.uuid4().hex[:8]}.bin', rng.randbytes(size))
+            data = {'name': upload.name, 'file': upload}
+            if fixture['folders']:
+                data['folder'] = rng.choice(fixture['folders'])
+            return client.post('/api/files/', data)
+        if name == 'download':
+            response = client.get(f"/api/files/{rng.choice(fixture['files'])}/download/")
+        elif name == 'list':
+            response = client.get('/api/files/')
+        elif name == 'contents':
+            response = client.get(f"/api/folders/{rng.choice(fixture['folders'])}/contents/")
+        elif name == 'search':
+            response = client.get('/api/search/', {'q': rng.choice(WORDS)[:rng.randint(3, 6)]})
+        elif name == 'storage':
+            response = client.get('/api/storage/')
+        elif name == 'trash':
+            response = client.get('/api/files/trash/')
+        else:
+            response = fixture['anonymous'].get(f"/api/files/shared/{rng.choice(fixture['tokens'])}/", {'download': 'true'})
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def measure(self, name, fixtures, rng, options):
+        if name == 'contents':
+            fixtures = [fixture for fixture in fixtures if fixture['folders']]
+        elif name == 'shared':
+            fixtures = [fixture for fixture in fixtures if fixture['tokens']]
+        elif name == 'download':
+            fixtures = [fixture for fixture in fixtures if fixture['files']]
+        if not fixtures:
+            return {'skipped': 'nothing seeded to request'}
+        sharecache.shares.clear()
+        sharecache.contents.clear()
+        expected = 201 if name == 'upload' else 200
+
+        for _ in range(options['warmup']):
+            self.request(name, rng.choice(fixtures), rng, options['size'])
+
+        timings, count = [], [0]
+
+        def count_query(execute, sql, params, many, context):
+            count[0] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            started = time.perf_counter()
+            for _ in range(options['requests']):
+                request_started = time.perf_counter()
+                response = self.request(name, rng.choice(fixtures), rng, options['size'])
+                timings.append((time.perf_counter() - request_started) * 1000)
+                if response.status_code != expected:
+                    raise CommandError(f'{name}: {response.status_code}')
+            elapsed = time.perf_counter() - started
+        return {
+            'requests': len(timings),
+            'requests_per_second': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'queries_per_request': round(count[0] / len(timings), 3),
+        }
+
+    def compare(self, results, baseline, tolerance):
+        """Per-scenario changes against ``baseline`` and the names of those that regressed.
+
+        The median regresses when more than ``tolerance`` percent slower
+        (p95 is reported but too noisy to fail on); query counts do not
+        depend on the machine, so any increase is a regression.
+        """
+        comparison, regressions = {}, []
+        for name, current in results['scenarios'].items():
+            previous = baseline.get('scenarios', {}).get(name)
+            if not previous or 'skipped' in current or 'skipped' in previous:
+                continue
+            changes = {}
+            for metric in COMPARED:
+                if metric not in previous:
+                    continue
+                before, after = previous[metric], current[metric]
+                changes[metric] = {
+                    'baseline': before,
+                    'current': after,
+                    'change_pct': round((after - before) / before * 100, 1) if before else None,
+                }
+            latency, queries = changes.get('p50_ms'), changes.get('queries_per_request')
+            changes['regressed'] = bool(
+                (latency and latency['current'] > latency['baseline'] * (1 + tolerance / 100))
+                or (queries and queries['current'] > queries['baseline'])
+            )
+            comparison[name] = changes
+            if changes['regressed']:
+                regressions.append(name)
+        if baseline.get('config') != results['config'] or baseline.get('backend') != results['backend']:
+            self.stderr.write('The baseline was recorded with different settings; the comparison may mislead.')
+        return comparison, regressions
+
+    def report(self, results):
+        config = results['config']
+        self.stdout.write(
+            f"{results['backend']}: {config['users']} users x {config['files']} files, {config['folders']} "
+            f"folders (depth {config['depth']}), seeded in {results['seed_seconds']}s"
+        )
+        comparison = results.get('comparison', {})
+        for name, stats in results['scenarios'].items():
+            if 'skipped' in stats:
+                self.stdout.write(f"  {name:<9} skipped: {stats['skipped']}")
+                continue
+            line = (
+                f"  {name:<9} {stats['requests_per_second']:8.1f} req/s  p50 {stats['p50_ms']:.2f} ms  "
+                f"p95 {stats['p95_ms']:.2f} ms  p99 {stats['p99_ms']:.2f} ms  "
+                f"{stats['queries_per_request']:.2f} queries/request"
+            )
+            change = comparison.get(name, {}).get('p50_ms')
+            if change and change['change_pct'] is not None:
+                line += f"  p50 {change['change_pct']:+.1f}%"
+            if comparison.get(name, {}).get('regressed'):
+                line += '  REGRESSED'
+            self.stdout.write(line)
+
+    def cleanup(self, users):
+        # The bytes go with the temporary MEDIA_ROOT
+        for user in users:
+            blob_ids = set(File.objects.filter(owner=user).values_list('blob_id', flat=True))
+            File.objects.filter(owner=user).delete()
+            Folder.objects.filter(owner=user).delete()
+            Blob.objects.filter(pk__in=blob_ids).delete()
+            user.delete()
@@ -0,0 +1,100 @@
+# backend/api/management/commands/benchmark_auth.py
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from api.authentication import active_users, tokens_for
+from api.blobs import staging_dir, store_path
+from api.models import Blob, File
+
+MODES = ('database', 'stateless')
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Count the database queries and time of an authenticated download with each '
+        'JWT_AUTH_MODE. Run it against a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--size', type=int, default=4096, help='Bytes in the downloaded file.')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+
+    def handle(self, *args, **options):
+        media_root = tempfile.mkdtemp()
+        user = User.objects.create_user(username=f'bench-auth-{uuid.uuid4().hex[:8]}')
+        try:
+            with override_settings(MEDIA_ROOT=media_root, STORAGE_VOLUMES=[], ALLOWED_HOSTS=['*'],
+                                   FILE_DELIVERY_BACKEND='stream'):
+                file_obj = self.seed(user, options['size'])
+                access = tokens_for(user)['access']
+                results = {'backend': connection.vendor, 'requests': options['requests']}
+                for mode in MODES:
+                    results[mode] = self.measure(file_obj, access, mode, options['requests'])
+        finally:
+            self.cleanup(user)
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{results['backend']}: {results['requests']} downloads per mode")
+        for mode in MODES:
+            stats = results[mode]
+            self.stdout.write(
+                f"  {mode:<9} {stats['queries_per_request']:.2f} queries/request  "
+                f"p50 {stats['p50_ms']:.2f} ms  p99 {stats['p99_ms']:.2f} ms"
+            )
+
+    def seed(self, user, size):
+        staged = os.path.join(staging_dir(), f'bench-{uuid.uuid4().hex}.upload')
+        with open(staged, 'wb') as fh:
+            fh.write(os.urandom(size))
+        blob = store_path(staged)
+        return File.objects.create(name='report.bin', owner=user, file=blob.name, blob=blob, size=blob.size)
+
+    def measure(self, file_obj, access, mode, requests):
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {access}')
+        url = f'/api/files/{file_obj.pk}/download/'
+        timings, count = [], [0]
+
+        def count_query(execute, sql, params, many, context):
+            count[0] += 1
+            return execute(sql, params, many, context)
+
+        active_users.clear()
+        with override_settings(JWT_AUTH_MODE=mode), connection.execute_wrapper(count_query):
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = client.get(url)
+                if response.status_code != 200:
+                    raise RuntimeError(f'{mode}: {response.status_code}')
+                b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - started) * 1000)
+        return {
+            'queries_per_request': round(count[0] / requests, 3),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+        }
+
+    def cleanup(self, user):
+        # The bytes go with the temporary MEDIA_ROOT
+        blob_ids = list(File.objects.filter(owner=user).values_list('blob_id', flat=True))
+        File.objects.filter(owner=user).delete()
+        Blob.objects.filter(pk__in=blob_ids).delete()
+        user.delete()
@@ -0,0 +1,142 @@
+# backend/api/management/commands/benchmark_search.py
+import json
+import random
+import statistics
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from api import search
+from api.models import File, Folder
+
+WORDS = [
+    'annual', 'report', 'invoice', 'budget', 'design', 'draft', 'final', 'meeting',
+    'notes', 'photo', 'holiday', 'contract', 'scan', 'backup', 'installer', 'release',
+    'roadmap', 'summary', 'review', 'presentation', 'spec', 'diagram', 'export', 'receipt',
+]
+EXTENSIONS = [
+    ('pdf', 'application/pdf'), ('docx', 'application/msword'), ('jpg', 'image/jpeg'),
+    ('png', 'image/png'), ('txt', 'text/plain'), ('zip', 'application/zip'),
+]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway user with synthetic files and report search latency '
+        '(p50/p99). Run it against a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=1000000)
+        parser.add_argument('--folders', type=int, default=2000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--compare-legacy', action='store_true',
+                            help='Also time the old icontains scan.')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded rows.')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        user = User.objects.create_user(username=f'bench-search-{uuid.uuid4().hex[:8]}')
+        try:
+            started = time.perf_counter()
+            self.seed(user, rng, options)
+            seed_seconds = time.perf_counter() - started
+
+            queries = [self.random_query(rng) for _ in range(options['queries'])]
+            results = {
+                'backend': connection.vendor,
+                'files': options['files'],
+                'seed_seconds': round(seed_seconds, 2),
+                'indexed': self.measure(queries, lambda q: search.search(
+                    user.id, q, limit=options['page_size']
+                )),
+            }
+            if options['compare_legacy']:
+                results['legacy_icontains'] = self.measure(queries, lambda q: list(
+                    File.objects.filter(
+                        Q(name__icontains=q) | Q(mime_type__icontains=q),
+                        owner=user, is_deleted=False
+                    )
+                ))
+        finally:
+            if not options['keep']:
+                self.cleanup(user)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{results['backend']}: {results['files']} files seeded in {results['seed_seconds']}s")
+        for name in ('indexed', 'legacy_icontains'):
+            if name in results:
+                stats = results[name]
+                self.stdout.write(
+                    f"  {name:<17} p50 {stats['p50_ms']:.2f} ms  p99 {stats['p99_ms']:.2f} ms  "
+                    f"mean {stats['mean_ms']:.2f} ms over {stats['queries']} queries"
+                )
+
+    def seed(self, user, rng, options):
+        folders = []
+        for index in range(options['folders']):
+            parent = rng.choice(folders) if folders and rng.random() < 0.7 else None
+            folder = Folder.objects.create(
+                name=f'{rng.choice(WORDS)}-{index}', owner=user, parent=parent
+            )
+            folders.append(folder)
+
+        batch = []
+        for index in range(options['files']):
+            ext, mime = rng.choice(EXTENSIONS)
+            name = f'{rng.choice(WORDS)}_{rng.choice(WORDS)}_{index}.{ext}'
+            batch.append(File(
+                name=name, owner=user, folder=rng.choice(folders) if folders else None,
+                file=f'bench/{index}.{ext}', size=rng.randint(1, 50 * 1024 * 1024),
+                mime_type=mime,
+            ))
+            if len(batch) >= options['batch_size']:
+                with transaction.atomic():
+                    File.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            with transaction.atomic():
+                File.objects.bulk_create(batch)
+
+    def random_query(self, rng):
+        word = rng.choice(WORDS)
+        shape = rng.random()
+        if shape < 0.4:
+            return word[:rng.randint(3, len(word))]
+        if shape < 0.8:
+            return f'{word} {rng.choice(WORDS)}'
+        return f'{word} {rng.choice(EXTENSIONS)[0]}'
+
+    def measure(self, queries, run):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            run(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        return {
+            'queries': len(timings),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+        }
+
+    def cleanup(self, user):
+        # Raw deletes: the ORM collector would load every seeded row first
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {File._meta.db_table} WHERE owner_id = %s', [user.pk])
+            cursor.execute(f'DELETE FROM {Folder._meta.db_table} WHERE owner_id = %s', [user.pk])
+        user.delete()
@@ -0,0 +1,148 @@
+# backend/api/management/commands/benchmark_shares.py
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from api import sharecache
+from api.blobs import staging_dir, store_path
+from api.models import Blob, File
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate a viral share link: many concurrent downloads of a few shared files, '
+        'with and without the share caches. Run it against a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--links', type=int, default=10, help='Shared files; a few get most requests.')
+        parser.add_argument('--size', type=int, default=64 * 1024, help='Bytes per file.')
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        media_root = tempfile.mkdtemp()
+        user = User.objects.create_user(username=f'bench-shares-{uuid.uuid4().hex[:8]}')
+        try:
+            with override_settings(MEDIA_ROOT=media_root, STORAGE_VOLUMES=[], ALLOWED_HOSTS=['*'],
+                                   FILE_DELIVERY_BACKEND='stream'):
+                tokens = self.seed(user, rng, options)
+                # Zipf-like: link n is requested about 1/n as often as the first
+                urls = [
+                    f'/api/files/shared/{token}/?download=true'
+                    for token in rng.choices(tokens, weights=[1 / n for n in range(1, len(tokens) + 1)],
+                                             k=options['requests'])
+                ]
+                results = {
+                    'backend': connection.vendor,
+                    'links': options['links'],
+                    'size': options['size'],
+                    'threads': options['threads'],
+                    'uncached': self.measure(urls, options['threads'], SHARE_CACHE_TTL=0,
+                                             SHARE_CONTENT_CACHE_BYTES=0),
+                    'cached': self.measure(urls, options['threads']),
+                }
+        finally:
+            self.cleanup(user)
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            f"{results['backend']}: {results['links']} links of {results['size']} bytes, "
+            f"{results['threads']} threads"
+        )
+        for name in ('uncached', 'cached'):
+            stats = results[name]
+            self.stdout.write(
+                f"  {name:<9} {stats['requests_per_second']:9.1f} req/s  p50 {stats['p50_ms']:.2f} ms  "
+                f"p99 {stats['p99_ms']:.2f} ms  {stats['queries']} queries"
+            )
+
+    def seed(self, user, rng, options):
+        tokens = []
+        for index in range(options['links']):
+            staged = os.path.join(staging_dir(), f'bench-{uuid.uuid4().hex}.upload')
+            with open(staged, 'wb') as fh:
+                fh.write(rng.randbytes(options['size']))
+            blob = store_path(staged)
+            file_obj = File.objects.create(
+                name=f'viral-{index}.bin', owner=user, file=blob.name, blob=blob,
+                size=blob.size, is_shared=True, share_token=str(uuid.uuid4()),
+            )
+            tokens.append(file_obj.share_token)
+        return tokens
+
+    def measure(self, urls, threads, **overrides):
+        sharecache.shares.clear()
+        sharecache.contents.clear()
+        timings = []
+        queries = []
+        lock = threading.Lock()
+
+        def run(part):
+            client = Client()
+            local, count = [], [0]
+
+            def count_query(execute, sql, params, many, context):
+                count[0] += 1
+                return execute(sql, params, many, context)
+
+            try:
+                with connection.execute_wrapper(count_query):
+                    for url in part:
+                        started = time.perf_counter()
+                        response = client.get(url)
+                        if response.status_code != 200:
+                            raise RuntimeError(f'{url}: {response.status_code}')
+                        if response.streaming:
+                            b''.join(response.streaming_content)
+                        local.append((time.perf_counter() - started) * 1000)
+            finally:
+                connection.close()
+            with lock:
+                timings.extend(local)
+                queries.append(count[0])
+
+        with override_settings(**overrides):
+            workers = [threading.Thread(target=run, args=(urls[n::threads],)) for n in range(threads)]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - started
+        return {
+            'requests': len(timings),
+            'requests_per_second': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'queries': sum(queries),
+        }
+
+    def cleanup(self, user):
+        # The bytes go with the temporary MEDIA_ROOT
+        blob_ids = list(File.objects.filter(owner=user).values_list('blob_id', flat=True))
+        File.objects.filter(owner=user).delete()
+        Blob.objects.filter(pk__in=blob_ids).delete()
+        user.delete()
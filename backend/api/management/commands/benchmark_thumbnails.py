@@ -0,0 +1,84 @@
+# backend/api/management/commands/benchmark_thumbnails.py
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image
+from api import imaging, thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Measure thumbnail rendering throughput per worker process on synthetic photos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=48)
+        parser.add_argument('--width', type=int, default=4000)
+        parser.add_argument('--height', type=int, default=3000)
+        parser.add_argument('--workers', default=f'1,{os.cpu_count() or 1}',
+                            help='Comma-separated worker counts to compare.')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+
+    def handle(self, *args, **options):
+        counts = sorted({int(count) for count in options['workers'].split(',')})
+        tmp = tempfile.mkdtemp()
+        try:
+            sources = self.make_sources(tmp, options)
+            results = [self.measure(tmp, sources, workers) for workers in counts]
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{options['images']} images of {options['width']}x{options['height']}, "
+                          f"sizes {', '.join(map(str, settings.THUMBNAIL_SIZES))}")
+        for result in results:
+            self.stdout.write(
+                f"  {result['workers']:>3} worker(s): {result['images_per_second']:8.2f} images/s, "
+                f"{result['per_worker']:6.2f} per worker"
+            )
+
+    def make_sources(self, tmp, options):
+        """A photo-like JPEG (noise over a gradient), copied once per image."""
+        size = (options['width'], options['height'])
+        noise = Image.effect_noise(size, 48)
+        gradient = Image.linear_gradient('L').resize(size)
+        photo = Image.merge('RGB', [noise, gradient, noise.transpose(Image.Transpose.FLIP_LEFT_RIGHT)])
+        first = os.path.join(tmp, 'source-0.jpg')
+        photo.save(first, 'JPEG', quality=90)
+        sources = [first]
+        for index in range(1, options['images']):
+            path = os.path.join(tmp, f'source-{index}.jpg')
+            shutil.copyfile(first, path)
+            sources.append(path)
+        return sources
+
+    def measure(self, tmp, sources, workers):
+        kinds = [thumbnails.thumbnail_kind(size) for size in settings.THUMBNAIL_SIZES]
+        with thumbnails.spawn_pool(workers) as pool:
+            # Start every worker before the clock does
+            list(pool.map(imaging.bounding_size, kinds * workers))
+            started = time.perf_counter()
+            futures = [
+                pool.submit(imaging.render_all, source, 'image/jpeg', [
+                    (kind, os.path.join(tmp, 'out', f'{index}.{kind}.jpg')) for kind in kinds
+                ])
+                for index, source in enumerate(sources)
+            ]
+            for future in futures:
+                results = future.result()
+                errors = [outcome for outcome in results.values() if not isinstance(outcome, int)]
+                if errors:
+                    raise RuntimeError(errors[0])
+            elapsed = time.perf_counter() - started
+        rate = len(sources) / elapsed
+        return {
+            'workers': workers,
+            'seconds': round(elapsed, 3),
+            'images_per_second': round(rate, 2),
+            'per_worker': round(rate / workers, 2),
+        }
@@ -0,0 +1,26 @@
+# backend/api/management/commands/compact_changes.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api import changefeed
+
+
+class Command(BaseCommand):
+    help = (
+        'Compact the delta sync journal: drop entries superseded by a later change to the '
+        'same object, and entries older than CHANGE_JOURNAL_RETENTION.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help='Override CHANGE_JOURNAL_RETENTION.')
+        parser.add_argument('--batch-size', type=int, default=settings.CHANGE_COMPACT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        retention = options['retention_days']
+        retention = timedelta(days=retention) if retention is not None else None
+        superseded, expired = changefeed.compact(retention, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Dropped {superseded} superseded and {expired} expired journal entries.'
+        ))
@@ -0,0 +1,29 @@
+# backend/api/management/commands/expire_upload_sessions.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = 'Expire stale upload sessions, freeing their disk space and quota reservations.'
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        stale = UploadSession.objects.filter(
+            status=UploadSession.STATUS_ACTIVE,
+            expires_at__lte=now
+        )
+        expired = sum(1 for session in stale.iterator() if session.expire())
+
+        # Finished sessions are only kept around for one TTL so clients can poll them
+        _, deleted = UploadSession.objects.exclude(
+            status=UploadSession.STATUS_ACTIVE
+        ).filter(
+            updated_at__lte=now - settings.UPLOAD_SESSION_TTL
+        ).delete()
+        deleted = deleted.get(UploadSession._meta.label, 0)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Expired {expired} upload session(s), removed {deleted} old record(s).'
+        ))
@@ -0,0 +1,168 @@
+# backend/api/management/commands/loadtest_transfers.py
+import asyncio
+import json
+import resource
+import socket
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+SOCKET_BUFFER = 4096
+CONNECT_CONCURRENCY = 256
+TICK = 0.1
+
+
+class Stats:
+    def __init__(self):
+        self.connected = 0
+        self.responses = 0
+        self.completed = 0
+        self.errors = 0
+        self.transferred = 0
+        self.first_byte = []
+
+
+class Command(BaseCommand):
+    help = (
+        'Hold many slow clients open against running servers (e.g. a WSGI thread pool and '
+        'the ASGI app) and report how many are served concurrently.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('targets', nargs='+',
+                            help='name=base URL pairs, e.g. wsgi=http://127.0.0.1:8000 asgi=http://127.0.0.1:8001')
+        parser.add_argument('--path', required=True,
+                            help='Download URL path, or an upload chunk path with --method PUT.')
+        parser.add_argument('--token', default='', help='JWT access token.')
+        parser.add_argument('--method', choices=['GET', 'PUT'], default='GET')
+        parser.add_argument('--body-size', type=int, default=1024 * 1024, help='PUT body length in bytes.')
+        parser.add_argument('--clients', default='1000,10000', help='Comma-separated client counts.')
+        parser.add_argument('--rate', type=int, default=8192, help='Bytes per second per client.')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds to hold each run.')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['targets']:
+            name, sep, url = target.partition('=')
+            parts = urlsplit(url)
+            if not sep or parts.scheme != 'http' or not parts.hostname:
+                raise CommandError(f'Expected name=http://host:port, got {target!r}')
+            targets.append((name, parts.hostname, parts.port or 80))
+        counts = sorted({int(count) for count in options['clients'].split(',')})
+        self.raise_file_limit(max(counts))
+
+        results = []
+        for name, host, port in targets:
+            for count in counts:
+                results.append(asyncio.run(self.run(name, host, port, count, options)))
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{options['method']} {options['path']}, {options['rate']} B/s per client, "
+                          f"{options['duration']:g}s per run")
+        for result in results:
+            self.stdout.write(
+                f"  {result['target']:>6} {result['clients']:>6} clients: "
+                f"{result['connected']:>6} connected, {result['responses']:>6} answered, "
+                f"{result['completed']:>6} completed, {result['errors']:>5} errors, "
+                f"first byte p50 {result['first_byte_p50_ms']} ms / p99 {result['first_byte_p99_ms']} ms, "
+                f"{result['mib_per_second']:.2f} MiB/s"
+            )
+
+    def raise_file_limit(self, clients):
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = clients + 256
+        if soft < wanted:
+            limit = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+            if limit < wanted:
+                self.stderr.write(f'Open file limit is {limit}; some of the {clients} clients will fail.')
+
+    def request_head(self, host, port, options):
+        lines = [f"{options['method']} {options['path']} HTTP/1.1", f'Host: {host}:{port}', 'Connection: close']
+        if options['token']:
+            lines.append(f"Authorization: Bearer {options['token']}")
+        if options['method'] == 'PUT':
+            lines += ['Content-Type: application/octet-stream', f"Content-Length: {options['body_size']}"]
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode()
+
+    async def run(self, name, host, port, count, options):
+        stats = Stats()
+        head = self.request_head(host, port, options)
+        connecting = asyncio.Semaphore(CONNECT_CONCURRENCY)
+        started = time.perf_counter()
+        deadline = asyncio.get_running_loop().time() + options['duration']
+        await asyncio.gather(*(
+            self.client(host, port, head, options, deadline, connecting, stats) for _ in range(count)
+        ))
+        elapsed = time.perf_counter() - started
+        first_byte = sorted(stats.first_byte)
+        return {
+            'target': name,
+            'clients': count,
+            'connected': stats.connected,
+            'responses': stats.responses,
+            'completed': stats.completed,
+            'errors': stats.errors,
+            'first_byte_p50_ms': round(statistics.median(first_byte) * 1000) if first_byte else None,
+            'first_byte_p99_ms': round(first_byte[int(len(first_byte) * 0.99)] * 1000) if first_byte else None,
+            'mib_per_second': round(stats.transferred / elapsed / 2 ** 20, 3),
+        }
+
+    async def client(self, host, port, head, options, deadline, connecting, stats):
+        """One slow client: trickles its body and reads its response at ``--rate``."""
+        loop = asyncio.get_running_loop()
+        step = max(1, int(options['rate'] * TICK))
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Small buffers, so a slow client pushes back on the server instead of the kernel absorbing it
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+        sock.setblocking(False)
+        writer = None
+        try:
+            async with connecting:
+                await asyncio.wait_for(loop.sock_connect(sock, (host, port)), max(deadline - loop.time(), 0.1))
+            reader, writer = await asyncio.open_connection(sock=sock)
+            stats.connected += 1
+            sent_at = loop.time()
+            writer.write(head)
+
+            remaining = options['body_size'] if options['method'] == 'PUT' else 0
+            while remaining and loop.time() < deadline:
+                block = min(step, remaining)
+                writer.write(b'\0' * block)
+                await asyncio.wait_for(writer.drain(), max(deadline - loop.time(), 0.1))
+                stats.transferred += block
+                remaining -= block
+                await asyncio.sleep(TICK)
+            if remaining:
+                return
+
+            status_line = await asyncio.wait_for(reader.readline(), max(deadline - loop.time(), 0.1))
+            if not status_line:
+                stats.errors += 1
+                return
+            stats.responses += 1
+            stats.first_byte.append(loop.time() - sent_at)
+            while loop.time() < deadline:
+                data = await asyncio.wait_for(reader.read(step), max(deadline - loop.time(), 0.1))
+                if not data:
+                    stats.completed += 1
+                    return
+                if options['method'] == 'GET':
+                    stats.transferred += len(data)
+                await asyncio.sleep(TICK)
+        except asyncio.TimeoutError:
+            # Still waiting when the run ended: not served in time
+            pass
+        except OSError:
+            stats.errors += 1
+        finally:
+            if writer is not None:
+                writer.close()
+            else:
+                sock.close()
@@ -0,0 +1,61 @@
+# backend/api/management/commands/process_thumbnails.py
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api import imaging, thumbnails
+from api.models import Derivative
+
+
+class Command(BaseCommand):
+    help = 'Render pending thumbnails and previews; the worker for THUMBNAIL_BACKEND=queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.THUMBNAIL_WORKERS)
+        parser.add_argument('--poll-interval', type=float, default=5.0)
+        parser.add_argument('--once', action='store_true', help='Exit once nothing is due.')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        # Enough queued work to keep every worker busy, and no more
+        limit = workers * 2
+        in_flight = {}
+        rendered = failed = 0
+
+        with thumbnails.spawn_pool(workers) as pool:
+            while True:
+                if len(in_flight) < limit:
+                    busy = {derivatives[0].blob_id for derivatives in in_flight.values()}
+                    for blob_id in self.due_blobs(busy, limit - len(in_flight)):
+                        derivatives = thumbnails.claim(blob_id)
+                        if derivatives:
+                            job = thumbnails.job_for(derivatives)
+                            in_flight[pool.submit(imaging.render_all, *job)] = derivatives
+
+                if not in_flight:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    derivatives = in_flight.pop(future)
+                    results = thumbnails.future_results(derivatives, future)
+                    thumbnails.record(derivatives, results)
+                    ok = sum(isinstance(outcome, int) for outcome in results.values())
+                    rendered += ok
+                    failed += len(derivatives) - ok
+
+        self.stdout.write(self.style.SUCCESS(f'Rendered {rendered} derivative(s), {failed} failed.'))
+
+    def due_blobs(self, busy, count):
+        return list(
+            Derivative.objects.filter(thumbnails.due_q(timezone.now()))
+            .exclude(blob_id__in=busy)
+            .order_by('blob_id')
+            .values_list('blob_id', flat=True)
+            .distinct()[:count]
+        )
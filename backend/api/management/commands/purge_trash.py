@@ -0,0 +1,39 @@
+# backend/api/management/commands/purge_trash.py
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api import purge
+
+
+class Command(BaseCommand):
+    help = (
+        'Permanently delete trash older than TRASH_RETENTION, carry out pending empty-trash '
+        'requests and finish deletions an interrupted run left behind.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help='Override TRASH_RETENTION.')
+        parser.add_argument('--batch-size', type=int, default=settings.TRASH_PURGE_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=settings.TRASH_PURGE_WORKERS)
+        parser.add_argument('--every', type=float, default=None,
+                            help='Keep running, purging every this many seconds.')
+
+    def handle(self, *args, **options):
+        retention = options['retention_days']
+        retention = timedelta(days=retention) if retention is not None else None
+        batch_size, workers = options['batch_size'], options['workers']
+
+        while True:
+            finished = purge.finish_intents(batch_size, workers)
+            requested = purge.run_requests(batch_size, workers)
+            expired = purge.purge_expired(retention, batch_size, workers)
+            self.stdout.write(self.style.SUCCESS(
+                f'Purged {requested[0] + expired[0]} file(s) and {requested[1] + expired[1]} folder(s); '
+                f'finished {finished} interrupted deletion(s).'
+            ))
+            if options['every'] is None:
+                break
+            time.sleep(options['every'])
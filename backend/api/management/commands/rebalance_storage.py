@@ -0,0 +1,31 @@
+# backend/api/management/commands/rebalance_storage.py
+from django.core.management.base import BaseCommand
+from api import rebalance
+
+
+class Command(BaseCommand):
+    help = (
+        'Move blobs to the volume STORAGE_VOLUMES places them on; optionally move files '
+        'stored before the blob store into it first. Safe to run while serving.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--legacy', action='store_true',
+                            help='Also move pre-blob files (users/<id>/...) into the blob store.')
+        parser.add_argument('--dry-run', action='store_true', help='Only list what would be moved.')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--quiet', action='store_true', help='Only print the summary.')
+
+    def handle(self, *args, **options):
+        if options['legacy'] and not options['dry_run']:
+            migrated = rebalance.migrate_legacy(options['batch_size'], options['workers'])
+            self.stdout.write(f'Moved {migrated} pre-blob files into the blob store.')
+
+        def report(name, root):
+            if not options['quiet']:
+                self.stdout.write(f'{root}\t{name}')
+
+        files, size = rebalance.rebalance(options['workers'], options['dry_run'], report)
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {files} files ({size} bytes).'))
@@ -0,0 +1,45 @@
+# backend/api/management/commands/rebuild_folder_paths.py
+from django.core.management.base import BaseCommand
+from api.models import Folder
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized tree_path/full_path/depth of every folder.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = ['id', 'name', 'parent_id', 'tree_path', 'full_path', 'depth']
+        rebuilt = 0
+
+        # Walk the hierarchy level by level so parents are always fixed first
+        level = {}
+        rebuilt += self.rebuild(Folder.objects.filter(parent__isnull=True).only(*fields), level, {})
+        while level:
+            parents, level = level, {}
+            parent_ids = list(parents)
+            for start in range(0, len(parent_ids), batch_size):
+                children = Folder.objects.filter(
+                    parent_id__in=parent_ids[start:start + batch_size]
+                ).only(*fields)
+                rebuilt += self.rebuild(children, level, parents)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt paths for {rebuilt} folder(s).'))
+
+    def rebuild(self, folders, level, parents):
+        """Fix one batch of folders and record their paths for the next level."""
+        changed = []
+        for folder in folders.iterator():
+            if folder.parent_id is None:
+                values = ('/', folder.name, 0)
+            else:
+                tree_path, full_path, depth = parents[folder.parent_id]
+                values = (f'{tree_path}{folder.parent_id}/', f'{full_path}/{folder.name}', depth + 1)
+            if values != (folder.tree_path, folder.full_path, folder.depth):
+                folder.tree_path, folder.full_path, folder.depth = values
+                changed.append(folder)
+            level[folder.pk] = values
+        Folder.objects.bulk_update(changed, ['tree_path', 'full_path', 'depth'])
+        return len(changed)
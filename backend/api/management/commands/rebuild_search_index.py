@@ -0,0 +1,15 @@
+# backend/api/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+from api import search
+
+
+class Command(BaseCommand):
+    help = 'Create the file search index if needed and rebuild it from the File table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        search.install(options['database'])
+        search.rebuild(options['database'])
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
@@ -0,0 +1,31 @@
+# backend/api/management/commands/reconcile_storage.py
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from api.models import UserStorage
+
+
+class Command(BaseCommand):
+    help = 'Recompute storage counters from the File and Folder tables and fix any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only reconcile this username.')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(username=options['user'])
+
+        checked = fixed = 0
+        for user in users.iterator():
+            storage, created = UserStorage.objects.get_or_create(user=user)
+            if storage.update_usage():
+                fixed += 1
+                self.stdout.write(
+                    f'{user.username}: {storage.used_space} bytes, '
+                    f'{storage.file_count} files, {storage.folder_count} folders'
+                )
+            checked += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} user(s), fixed drift for {fixed}.'
+        ))
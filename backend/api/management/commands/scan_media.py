@@ -0,0 +1,39 @@
+# backend/api/management/commands/scan_media.py
+from django.core.management.base import BaseCommand
+from api.scanner import Scanner
+
+
+class Command(BaseCommand):
+    help = (
+        'Find stored files with no database row and rows whose files are missing; '
+        'optionally fix them and verify blob checksums.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Remove orphaned files, delete rows whose files are gone and '
+                                 're-queue missing thumbnails.')
+        parser.add_argument('--verify', action='store_true', help='Re-hash every blob (reads all data).')
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help='Ignore files modified in the last this many seconds.')
+        parser.add_argument('--checkpoint', help='Save progress to this file and resume from it.')
+        parser.add_argument('--quiet', action='store_true', help='Only print the summary.')
+
+    def handle(self, *args, **options):
+        def report(kind, path, detail):
+            if not options['quiet']:
+                self.stdout.write(f'{kind}\t{path}' + (f'\t{detail}' if detail else ''))
+
+        scanner = Scanner(
+            report, fix=options['fix'], verify=options['verify'], workers=options['workers'],
+            batch_size=options['batch_size'], min_age=options['min_age'], checkpoint=options['checkpoint'],
+        )
+        if scanner.load_checkpoint():
+            self.stdout.write(f"Resuming {scanner.state['phase']} scan after {scanner.state['after']}.")
+        counts = scanner.run()
+
+        summary = ', '.join(f'{count} {kind}' for kind, count in sorted(counts.items())) or 'no issues'
+        action = 'fixed where possible' if options['fix'] else 'not fixed'
+        self.stdout.write(self.style.SUCCESS(f'Scan complete: {summary} ({action}).'))
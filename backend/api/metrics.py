@@ -0,0 +1,372 @@
+# backend/api/metrics.py
+"""
+Opt-in request profiling.
+
+With ``PROFILING_ENABLED`` the ``ProfilingMiddleware`` is installed and
+records, per request: the view, SQL query count and time, time spent
+building serializer data, bytes sent, and time spent reading or writing
+stored files. The totals are exported in the Prometheus text format at
+``/api/metrics/`` to the addresses in ``PROFILING_METRICS_IPS``. Each
+process keeps its own metrics, so scrape every worker.
+
+With ``PROFILING_TRACE_DIR`` a ``PROFILING_TRACE_SAMPLE_RATE`` share of
+synchronous requests is profiled (cProfile, or pyinstrument if
+installed and chosen), and the trace of any that took longer than
+``PROFILING_TRACE_THRESHOLD_MS`` is written there.
+
+When profiling is disabled nothing is installed. ``storage_io()``,
+called on the storage hot paths, costs a context variable lookup.
+"""
+import bisect
+import collections
+import contextlib
+import contextvars
+import cProfile
+import importlib
+import os
+import random
+import re
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import FileResponse, Http404, HttpResponse
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# name -> (type, help)
+METRICS = {
+    'opendrive_requests_total': ('counter', 'Requests served, by view, method and status.'),
+    'opendrive_request_duration_seconds': ('histogram', 'Time until the response was returned.'),
+    'opendrive_db_queries_total': ('counter', 'SQL queries run.'),
+    'opendrive_db_query_seconds_total': ('counter', 'Time spent running SQL queries.'),
+    'opendrive_serializer_seconds_total': ('counter', 'Time spent building serializer data.'),
+    'opendrive_response_bytes_total': ('counter', 'Response body bytes sent.'),
+    'opendrive_storage_io_seconds_total': ('counter', 'Time spent reading and writing stored files.'),
+}
+
+# The RequestStats of the request being served, if it is being profiled
+current = contextvars.ContextVar('opendrive_request_stats', default=None)
+
+
+class Registry:
+    """Counters and histograms keyed by metric name and label values."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = collections.defaultdict(float)
+        self.histograms = {}
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            self.values[name, labels] += value
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[name, labels] = [[0] * len(BUCKETS), 0, 0.0]
+            buckets = histogram[0]
+            for index in range(bisect.bisect_left(BUCKETS, value), len(BUCKETS)):
+                buckets[index] += 1
+            histogram[1] += 1
+            histogram[2] += value
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+            self.histograms.clear()
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        with self.lock:
+            values = sorted(self.values.items())
+            histograms = sorted((key, (list(h[0]), h[1], h[2])) for key, h in self.histograms.items())
+        by_name = collections.defaultdict(list)
+        for (name, labels), value in values:
+            by_name[name].append(f'{name}{format_labels(labels)} {value:g}')
+        for (name, labels), (buckets, count, total) in histograms:
+            lines = by_name[name]
+            for bound, cumulative in zip(BUCKETS, buckets):
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", f"{bound:g}"),))} {cumulative}')
+            lines.append(f'{name}_bucket{format_labels(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{name}_count{format_labels(labels)} {count}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total:g}')
+        out = []
+        for name, (kind, help_text) in METRICS.items():
+            out += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', *by_name.get(name, [])]
+        return '\n'.join(out) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+registry = Registry()
+
+
+class RequestStats:
+    __slots__ = ('queries', 'query_seconds', 'serializer_seconds', 'storage_seconds', 'serializing')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.storage_seconds = 0.0
+        self.serializing = False
+
+
+@contextlib.contextmanager
+def storage_io():
+    """Count the time in the block as storage I/O of the current request."""
+    stats = current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.storage_seconds += time.perf_counter() - started
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper, installed on every connection while profiling."""
+    stats = current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_seconds += time.perf_counter() - started
+
+
+def add_query_wrapper(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install():
+    """Hook query and serializer timing in; called when the middleware loads."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        connection_created.connect(add_query_wrapper)
+        for connection in connections.all(initialized_only=True):
+            add_query_wrapper(connection)
+
+        from rest_framework import serializers
+
+        data = serializers.BaseSerializer.data
+
+        def timed_data(serializer):
+            stats = current.get()
+            if stats is None or stats.serializing:
+                return data.fget(serializer)
+            stats.serializing = True
+            started = time.perf_counter()
+            try:
+                return data.fget(serializer)
+            finally:
+                stats.serializing = False
+                stats.serializer_seconds += time.perf_counter() - started
+
+        # Serializer and ListSerializer .data both build on BaseSerializer.data
+        serializers.BaseSerializer.data = property(timed_data)
+        _installed = True
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match._func_path
+
+
+def count_stream(response, labels):
+    """Wrap a streaming body to count its bytes and the storage reads made for it.
+
+    The body is produced after the middleware has returned, so the
+    request's stats are made current again around each block for the
+    ``storage_io()`` calls at the read sites. Time spent generating a
+    body (compressing a ZIP, say) is not storage I/O and is not counted.
+    A FileResponse's blocks are bare file reads, so fetching each one is
+    timed whole (under ASGI that includes handing it to a worker thread).
+    """
+    content = response.streaming_content
+    stats = RequestStats()
+    fetch = storage_io if isinstance(response, FileResponse) else contextlib.nullcontext
+
+    def done(sent):
+        registry.inc('opendrive_response_bytes_total', labels, sent)
+        registry.inc('opendrive_storage_io_seconds_total', labels, stats.storage_seconds)
+
+    if response.is_async:
+        async def counted():
+            sent = 0
+            iterator = aiter(content)
+            try:
+                while True:
+                    token = current.set(stats)
+                    try:
+                        with fetch():
+                            block = await anext(iterator)
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        current.reset(token)
+                    sent += len(block)
+                    yield block
+            finally:
+                done(sent)
+    else:
+        def counted():
+            sent = 0
+            iterator = iter(content)
+            try:
+                while True:
+                    token = current.set(stats)
+                    try:
+                        with fetch():
+                            block = next(iterator)
+                    except StopIteration:
+                        break
+                    finally:
+                        current.reset(token)
+                    sent += len(block)
+                    yield block
+            finally:
+                done(sent)
+
+    response.streaming_content = counted()
+
+
+def record(request, response, stats, elapsed):
+    view = view_label(request)
+    labels = (('view', view),)
+    registry.inc('opendrive_requests_total', labels + (
+        ('method', request.method), ('status', str(response.status_code)),
+    ))
+    registry.observe('opendrive_request_duration_seconds', labels, elapsed)
+    registry.inc('opendrive_db_queries_total', labels, stats.queries)
+    registry.inc('opendrive_db_query_seconds_total', labels, stats.query_seconds)
+    registry.inc('opendrive_serializer_seconds_total', labels, stats.serializer_seconds)
+    registry.inc('opendrive_storage_io_seconds_total', labels, stats.storage_seconds)
+    if response.streaming:
+        count_stream(response, labels)
+    else:
+        registry.inc('opendrive_response_bytes_total', labels, len(response.content))
+    return view
+
+
+class Tracer:
+    """Profiles a request; saves the trace if it turns out slow."""
+
+    def __init__(self):
+        self.backend = settings.PROFILING_TRACE_BACKEND
+        if self.backend == 'pyinstrument':
+            try:
+                self.profiler = importlib.import_module('pyinstrument').Profiler()
+            except ImportError:
+                raise ImproperlyConfigured(
+                    "PROFILING_TRACE_BACKEND 'pyinstrument' needs the pyinstrument package."
+                )
+        elif self.backend == 'cprofile':
+            self.profiler = cProfile.Profile()
+        else:
+            raise ImproperlyConfigured(
+                f"Unknown PROFILING_TRACE_BACKEND {self.backend!r}; choose cprofile or pyinstrument."
+            )
+
+    def start(self):
+        (self.profiler.start if self.backend == 'pyinstrument' else self.profiler.enable)()
+
+    def stop(self):
+        (self.profiler.stop if self.backend == 'pyinstrument' else self.profiler.disable)()
+
+    def save(self, view, elapsed):
+        directory = settings.PROFILING_TRACE_DIR
+        os.makedirs(directory, exist_ok=True)
+        name = re.sub(r'[^\w.-]+', '_', view)
+        stem = os.path.join(directory, f'{time.strftime("%Y%m%dT%H%M%S")}-{name}-{elapsed * 1000:.0f}ms')
+        if self.backend == 'pyinstrument':
+            path = stem + '.html'
+            with open(path, 'w') as fh:
+                fh.write(self.profiler.output_html())
+        else:
+            path = stem + '.prof'
+            self.profiler.dump_stats(path)
+        return path
+
+
+def sample_trace():
+    if settings.PROFILING_TRACE_DIR and random.random() < settings.PROFILING_TRACE_SAMPLE_RATE:
+        return Tracer()
+    return None
+
+
+class ProfilingMiddleware:
+    """Records per-request metrics (see the module docstring)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        install()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current.set(stats)
+        tracer = sample_trace()
+        started = time.perf_counter()
+        if tracer:
+            tracer.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            if tracer:
+                tracer.stop()
+            current.reset(token)
+        elapsed = time.perf_counter() - started
+        view = record(request, response, stats, elapsed)
+        if tracer and elapsed * 1000 >= settings.PROFILING_TRACE_THRESHOLD_MS:
+            tracer.save(view, elapsed)
+        return response
+
+    async def __acall__(self, request):
+        # Not traced: a profiler would see the whole event loop
+        stats = RequestStats()
+        token = current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        record(request, response, stats, time.perf_counter() - started)
+        return response
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint (``/api/metrics/``), for PROFILING_METRICS_IPS only."""
+    if not settings.PROFILING_ENABLED or request.META.get('REMOTE_ADDR') not in settings.PROFILING_METRICS_IPS:
+        raise Http404()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
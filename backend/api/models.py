@@ -1,10 +1,26 @@
 # backend/api/models.py
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth.models import User
+from django.dispatch import Signal
+from django.core.files.storage import default_storage
 from django.core.validators import FileExtensionValidator
+from django.utils import timezone
+from concurrent.futures import ThreadPoolExecutor
+import collections
+import glob
+import logging
 import os
 import uuid
 
+from .metrics import storage_io
+
+logger = logging.getLogger(__name__)
+
+# Sent with ``owner_id``, ``kind`` and ``ids`` once changes to a user's files or folders commit
+changes_recorded = Signal()
+
 
 def user_directory_path(instance, filename):
     """Generate file path for user uploads."""
@@ -13,34 +29,380 @@ def user_directory_path(instance, filename):
     return os.path.join('users', str(instance.owner.id), filename)
 
 
+def blob_path(digest):
+    """Generate the content-addressed storage path for a digest."""
+    return os.path.join('blobs', digest[:2], digest[2:4], digest)
+
+
+class BlobManager(models.Manager):
+    """Reference-counted access to content-addressed blobs."""
+
+    def ingest(self, staged_path, digest, size, fast_digest=''):
+        """Take a reference on the blob for ``digest``.
+
+        ``staged_path`` holds the uploaded bytes in MEDIA_ROOT. It is
+        moved onto the blob's volume if the blob is new and removed if
+        an identical blob already exists.
+        """
+        name = blob_path(digest)
+        while True:
+            if self.filter(digest=digest).update(ref_count=models.F('ref_count') + 1):
+                blob = self.get(digest=digest)
+                if os.path.exists(default_storage.path(name)):
+                    os.remove(staged_path)
+                else:
+                    # Heal a blob whose bytes went missing from disk
+                    default_storage.place(staged_path, name)
+                return blob
+            try:
+                # Claim the digest before placing the bytes so a concurrent
+                # release() of the same digest will not unlink them.
+                with transaction.atomic():
+                    blob = self.create(digest=digest, size=size, ref_count=1, fast_digest=fast_digest)
+                    default_storage.place(staged_path, name)
+                return blob
+            except IntegrityError:
+                continue
+
+    def acquire(self, blob):
+        """Take another reference on an existing ``blob``.
+
+        Returns False if its last reference went away meanwhile, in
+        which case its bytes may already be gone.
+        """
+        return bool(self.filter(pk=blob.pk, ref_count__gt=0).update(ref_count=models.F('ref_count') + 1))
+
+    def retain(self, blob_ids):
+        """Take one more reference per id in ``blob_ids`` (ids may repeat).
+
+        The caller must hold references to these blobs already, e.g.
+        through locked File rows, so none can be released meanwhile.
+        """
+        by_count = collections.defaultdict(list)
+        for blob_id, count in collections.Counter(blob_ids).items():
+            by_count[count].append(blob_id)
+        for count, ids in by_count.items():
+            self.filter(pk__in=ids).update(ref_count=models.F('ref_count') + count)
+
+    def release(self, blob_ids):
+        """Drop one reference per id in ``blob_ids`` (ids may repeat).
+
+        Blobs left without references are deleted. Returns the
+        DeletionIntents recorded for their bytes, which the caller
+        unlinks once its transaction commits.
+        """
+        counts = collections.Counter(blob_ids)
+        by_count = collections.defaultdict(list)
+        for blob_id, count in counts.items():
+            by_count[count].append(blob_id)
+        for count, ids in by_count.items():
+            self.filter(pk__in=ids).update(ref_count=models.F('ref_count') - count)
+
+        orphans = list(self.filter(pk__in=counts, ref_count__lte=0).values_list('pk', 'digest'))
+        if not orphans:
+            return []
+        self.filter(pk__in=[pk for pk, _ in orphans], ref_count__lte=0).delete()
+        return DeletionIntent.objects.bulk_create([DeletionIntent(digest=digest) for _, digest in orphans])
+
+
+class Blob(models.Model):
+    """Model for content-addressed file data shared between File rows."""
+    digest = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    # Optional UPLOAD_FAST_HASH of the bytes, as "<algorithm>:<hex>"
+    fast_digest = models.CharField(max_length=80, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = BlobManager()
+
+    def __str__(self):
+        return f"{self.digest} ({self.ref_count} refs)"
+
+    @property
+    def name(self):
+        """Storage-relative path of the blob's bytes."""
+        return blob_path(self.digest)
+
+
+class DeletionIntentManager(models.Manager):
+    def unlink(self, intents, workers=1):
+        """Remove the bytes behind ``intents``, then the intents themselves.
+
+        Blobs whose digest was re-ingested meanwhile keep their bytes.
+        Intents that fail are kept for a later run; returns how many
+        were carried out.
+        """
+        intents = list(intents)
+        if not intents:
+            return 0
+        live = set(Blob.objects.filter(
+            digest__in={intent.digest for intent in intents if intent.digest}
+        ).values_list('digest', flat=True))
+        pending = [intent for intent in intents if intent.digest not in live]
+        if workers > 1 and len(pending) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                removed = list(pool.map(DeletionIntent.remove, pending))
+        else:
+            removed = [intent.remove() for intent in pending]
+
+        done = [intent.pk for intent in intents if intent.digest in live]
+        done += [intent.pk for intent, ok in zip(pending, removed) if ok]
+        self.filter(pk__in=done).delete()
+        return len(done)
+
+
+class DeletionIntent(models.Model):
+    """Stored bytes to remove once the rows referring to them are gone.
+
+    Recorded in the transaction that deletes the rows and removed only
+    after the bytes are, so a crash in between leaves a record for
+    ``purge_trash`` to finish instead of an orphaned file.
+    """
+    digest = models.CharField(max_length=64, blank=True)
+    # Storage-relative path of a file stored before blobs existed
+    path = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = DeletionIntentManager()
+
+    def __str__(self):
+        return self.digest or self.path
+
+    def paths(self):
+        if not self.digest:
+            return default_storage.locations(self.path)
+        paths = []
+        # On every volume, in case a rebalance left a copy behind
+        for full_path in default_storage.locations(blob_path(self.digest)):
+            # Thumbnails and previews are stored next to the blob
+            paths += [full_path] + glob.glob(glob.escape(full_path) + '.*')
+        return paths
+
+    def remove(self):
+        """Remove the bytes from disk; False if that failed."""
+        try:
+            for path in self.paths():
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        except OSError as exc:
+            logger.warning('Could not remove %s: %s', self, exc)
+            return False
+        return True
+
+
+class Derivative(models.Model):
+    """A thumbnail or preview rendered from a blob and stored next to it."""
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_READY = 'ready'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_READY, 'Ready'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    blob = models.ForeignKey(Blob, on_delete=models.CASCADE, related_name='derivatives')
+    kind = models.CharField(max_length=32)
+    mime_type = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    size = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['blob', 'kind']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='derivative_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.blob.digest[:12]}/{self.kind} ({self.status})"
+
+    @property
+    def name(self):
+        """Storage-relative path of the rendered image."""
+        return f"{blob_path(self.blob.digest)}.{self.kind}.jpg"
+
+
+class FolderQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Prefetch everything FolderSerializer reads, in the same query."""
+        return self.select_related('owner', 'parent').annotate(
+            active_file_count=models.Count('files', filter=models.Q(files__is_deleted=False))
+        )
+
+
+class FileQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Prefetch everything FileSerializer reads, in the same query."""
+        return self.select_related('owner', 'folder', 'blob')
+
+
 class Folder(models.Model):
-    """Model for organizing files into folders."""
+    """Model for organizing files into folders.
+
+    The hierarchy is materialized on each row: ``tree_path`` holds the
+    ids of all ancestors (``/1/5/`` for a folder under 5 under 1) and
+    ``full_path`` the rendered name path, so paths render without
+    walking parents and a whole subtree is one prefix query.
+    """
     name = models.CharField(max_length=255)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='folders')
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='subfolders')
+    tree_path = models.CharField(max_length=1024, default='/', db_index=True)
+    full_path = models.TextField(blank=True)
+    depth = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    objects = FolderQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         unique_together = ['name', 'owner', 'parent']
+        indexes = [
+            # Keyset pagination of listings on (created_at, id)
+            models.Index(fields=['owner', 'is_deleted', 'created_at', 'id'], name='folder_owner_created_idx'),
+            # Subfolders in a folder's contents, newest first
+            models.Index(fields=['parent', 'is_deleted', 'created_at'], name='folder_parent_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.owner.username}/{self.name}"
 
     def get_path(self):
         """Get full folder path."""
-        if self.parent:
-            return f"{self.parent.get_path()}/{self.name}"
-        return self.name
+        return self.full_path or self.name
+
+    @property
+    def descendant_prefix(self):
+        """``tree_path`` prefix shared by every folder below this one."""
+        return f"{self.tree_path}{self.pk}/"
+
+    def get_descendants(self, include_self=False):
+        """All folders below this one, fetched with a single query."""
+        subtree = models.Q(tree_path__startswith=self.descendant_prefix)
+        if include_self:
+            subtree |= models.Q(pk=self.pk)
+        return Folder.objects.filter(subtree, owner_id=self.owner_id)
+
+    def is_ancestor_of(self, folder):
+        return folder.tree_path.startswith(self.descendant_prefix)
+
+    def get_subtree_files(self):
+        """Files in this folder or any folder below it."""
+        return File.objects.filter(
+            folder__in=self.get_descendants(include_self=True).values('pk')
+        )
+
+    def trash_subtree(self):
+        """Soft-delete this folder with all descendants and their files.
+
+        Everything trashed together shares one ``deleted_at`` so it can
+        be restored together. Returns (folders, files, bytes) trashed.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            files = self.get_subtree_files()
+            file_count = files.filter(is_deleted=False).update(is_deleted=True, deleted_at=now)
+            size = files.filter(is_deleted=True, deleted_at=now).aggregate(
+                total=models.Sum('size')
+            )['total'] or 0
+            folders = self.get_descendants(include_self=True).filter(is_deleted=False)
+            folder_ids = list(folders.values_list('pk', flat=True))
+            folder_count = folders.update(is_deleted=True, deleted_at=now)
+            ChangeLog.record(self.owner_id, Change.FOLDER, folder_ids, Change.TRASH)
+            ChangeLog.record(self.owner_id, Change.FILE, files.filter(
+                is_deleted=True, deleted_at=now
+            ).values_list('pk', flat=True), Change.TRASH)
+        self.is_deleted = True
+        self.deleted_at = now
+        return folder_count, file_count, size
+
+    def get_trashed_with(self):
+        """(folders, files) querysets trashed together with this folder."""
+        folders = self.get_descendants(include_self=True).filter(
+            is_deleted=True, deleted_at=self.deleted_at
+        )
+        files = self.get_subtree_files().filter(is_deleted=True, deleted_at=self.deleted_at)
+        return folders, files
+
+    def restore_subtree(self):
+        """Undo trash_subtree(); returns (folders, files) restored."""
+        with transaction.atomic():
+            folders, files = self.get_trashed_with()
+            folder_ids = list(folders.values_list('pk', flat=True))
+            file_ids = list(files.values_list('pk', flat=True))
+            file_count = files.update(is_deleted=False, deleted_at=None)
+            folder_count = folders.update(is_deleted=False, deleted_at=None)
+            ChangeLog.record(self.owner_id, Change.FOLDER, folder_ids, Change.RESTORE)
+            ChangeLog.record(self.owner_id, Change.FILE, file_ids, Change.RESTORE)
+        self.is_deleted = False
+        self.deleted_at = None
+        return folder_count, file_count
+
+    def save(self, *args, **kwargs):
+        """Override save to keep materialized paths in sync.
+
+        Renames and moves rewrite the paths of the whole subtree with a
+        single UPDATE.
+        """
+        with transaction.atomic():
+            action = Change.UPDATE if self.pk else Change.CREATE
+            previous = None
+            if self.pk:
+                previous = Folder.objects.filter(pk=self.pk).values(
+                    'tree_path', 'full_path', 'depth'
+                ).first()
+
+            if self.parent_id:
+                parent = Folder.objects.values('tree_path', 'full_path', 'depth').get(pk=self.parent_id)
+                self.tree_path = f"{parent['tree_path']}{self.parent_id}/"
+                self.full_path = f"{parent['full_path']}/{self.name}"
+                self.depth = parent['depth'] + 1
+            else:
+                self.tree_path = '/'
+                self.full_path = self.name
+                self.depth = 0
+
+            super().save(*args, **kwargs)
+
+            if previous and (previous['tree_path'], previous['full_path']) != (self.tree_path, self.full_path):
+                old_prefix = f"{previous['tree_path']}{self.pk}/"
+                Folder.objects.filter(
+                    owner_id=self.owner_id,
+                    tree_path__startswith=old_prefix
+                ).update(
+                    tree_path=Concat(
+                        models.Value(self.descendant_prefix),
+                        Substr('tree_path', len(old_prefix) + 1),
+                        output_field=models.CharField()
+                    ),
+                    full_path=Concat(
+                        models.Value(self.full_path),
+                        Substr('full_path', len(previous['full_path']) + 1),
+                        output_field=models.TextField()
+                    ),
+                    depth=models.F('depth') + (self.depth - previous['depth']),
+                )
+            ChangeLog.record(self.owner_id, Change.FOLDER, [self.pk], action)
 
 
 class File(models.Model):
     """Model for storing file metadata."""
     name = models.CharField(max_length=255)
     file = models.FileField(upload_to=user_directory_path)
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True, related_name='files')
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='files')
     folder = models.ForeignKey(Folder, on_delete=models.CASCADE, null=True, blank=True, related_name='files')
     size = models.BigIntegerField(default=0)
@@ -52,8 +414,16 @@ class File(models.Model):
     share_token = models.CharField(max_length=100, blank=True, null=True, unique=True)
     is_shared = models.BooleanField(default=False)
 
+    objects = FileQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination: listings on (created_at, id), the trash on (deleted_at, id)
+            models.Index(fields=['owner', 'is_deleted', 'created_at', 'id'], name='file_owner_created_idx'),
+            models.Index(fields=['owner', 'is_deleted', 'deleted_at', 'id'], name='file_owner_deleted_idx'),
+            models.Index(fields=['folder', 'is_deleted', 'created_at', 'id'], name='file_folder_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.owner.username}/{self.name}"
@@ -61,9 +431,12 @@ class File(models.Model):
     def save(self, *args, **kwargs):
         """Override save to set file size and mime type."""
         if self.file:
-            self.size = self.file.size
+            # Blob-backed files get their size at ingest and have no extension on disk
+            if self.blob_id is None:
+                self.size = self.file.size
             # Set mime type based on extension
-            ext = os.path.splitext(self.file.name)[1].lower()
+            source = self.name if self.blob_id else self.file.name
+            ext = os.path.splitext(source)[1].lower()
             mime_types = {
                 '.pdf': 'application/pdf',
                 '.doc': 'application/msword',
@@ -81,14 +454,26 @@ class File(models.Model):
                 '.rar': 'application/x-rar-compressed',
             }
             self.mime_type = mime_types.get(ext, 'application/octet-stream')
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            action = Change.UPDATE if self.pk else Change.CREATE
+            super().save(*args, **kwargs)
+            ChangeLog.record(self.owner_id, Change.FILE, [self.pk], action)
 
     def delete(self, *args, **kwargs):
-        """Override delete to remove file from storage."""
-        if self.file:
-            if os.path.isfile(self.file.path):
-                os.remove(self.file.path)
-        super().delete(*args, **kwargs)
+        """Override delete to drop the blob reference or remove the file from storage."""
+        with transaction.atomic():
+            pk = self.pk
+            result = super().delete(*args, **kwargs)
+            ChangeLog.record(self.owner_id, Change.FILE, [pk], Change.DELETE)
+            if self.blob_id:
+                intents = Blob.objects.release([self.blob_id])
+            elif self.file:
+                intents = [DeletionIntent.objects.create(path=self.file.name)]
+            else:
+                intents = []
+            if intents:
+                transaction.on_commit(lambda: DeletionIntent.objects.unlink(intents))
+        return result
 
     def generate_share_token(self):
         """Generate a unique share token for this file."""
@@ -100,30 +485,325 @@ class File(models.Model):
 
 
 class UserStorage(models.Model):
-    """Model for tracking user storage usage."""
+    """Model for tracking user storage usage.
+
+    Counters are maintained incrementally by adjust() in the same
+    transaction as each mutation; update_usage() recomputes them from
+    scratch and is only used for reconciliation.
+    """
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='storage')
     used_space = models.BigIntegerField(default=0)
+    reserved_space = models.BigIntegerField(default=0)
     total_space = models.BigIntegerField(default=1073741824)  # 1GB default
+    file_count = models.IntegerField(default=0)
+    folder_count = models.IntegerField(default=0)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.username} - {self.used_space}/{self.total_space}"
 
+    @classmethod
+    def adjust(cls, user, space=0, files=0, folders=0, reserved=0):
+        """Apply deltas to a user's counters with a single UPDATE."""
+        deltas = {
+            'used_space': space,
+            'file_count': files,
+            'folder_count': folders,
+            'reserved_space': reserved,
+        }
+        changes = {
+            field: models.F(field) + delta
+            for field, delta in deltas.items() if delta
+        }
+        if not changes:
+            return
+        changes['updated_at'] = timezone.now()
+        if not cls.objects.filter(user=user).update(**changes):
+            # No counters yet: build them from the rows, which already
+            # include the change being recorded.
+            storage, created = cls.objects.get_or_create(user=user)
+            storage.update_usage()
+
     def update_usage(self):
-        """Calculate and update storage usage."""
-        total = File.objects.filter(
-            owner=self.user,
-            is_deleted=False
-        ).aggregate(total=models.Sum('size'))['total'] or 0
-        self.used_space = total
-        self.save()
+        """Recalculate all counters from the File and Folder tables.
+
+        Returns True if the stored counters had drifted.
+        """
+        with transaction.atomic():
+            # Lock the row so concurrent adjust() calls queue behind the recount
+            UserStorage.objects.select_for_update().filter(pk=self.pk).first()
+            files = File.objects.filter(owner=self.user, is_deleted=False).aggregate(
+                total=models.Sum('size'), count=models.Count('id')
+            )
+            folder_count = Folder.objects.filter(owner=self.user, is_deleted=False).count()
+            self.refresh_from_db(fields=['used_space', 'file_count', 'folder_count'])
+            actual = (files['total'] or 0, files['count'], folder_count)
+            drifted = actual != (self.used_space, self.file_count, self.folder_count)
+            self.used_space, self.file_count, self.folder_count = actual
+            self.save(update_fields=['used_space', 'file_count', 'folder_count', 'updated_at'])
+        return drifted
 
     def has_space_for(self, file_size):
-        """Check if user has enough space for a new file."""
-        return (self.used_space + file_size) <= self.total_space
+        """Check if user has enough space for a new file.
+
+        Advisory only; use reserve() to actually claim the space.
+        """
+        return (self.used_space + self.reserved_space + file_size) <= self.total_space
+
+    def available_space(self):
+        """Bytes neither used nor reserved."""
+        return max(self.total_space - self.used_space - self.reserved_space, 0)
+
+    def reserve(self, nbytes):
+        """Atomically reserve space for a pending upload.
+
+        The quota check and the claim are one conditional UPDATE, so
+        concurrent uploads cannot overshoot the quota between them.
+        Commit the claim with adjust(space=n, reserved=-n) in the
+        transaction that records the file, or release() it on failure.
+        Returns False if the reservation would exceed the user's quota.
+        """
+        reserved = UserStorage.objects.filter(pk=self.pk).alias(
+            committed=models.F('used_space') + models.F('reserved_space')
+        ).filter(
+            committed__lte=models.F('total_space') - nbytes
+        ).update(reserved_space=models.F('reserved_space') + nbytes)
+        self.refresh_from_db(fields=['used_space', 'reserved_space'])
+        return bool(reserved)
+
+    def release(self, nbytes):
+        """Release space previously claimed with reserve()."""
+        UserStorage.objects.filter(pk=self.pk).update(
+            reserved_space=models.F('reserved_space') - nbytes
+        )
+        self.refresh_from_db(fields=['used_space', 'reserved_space'])
 
     def get_usage_percentage(self):
         """Get storage usage as percentage."""
         if self.total_space == 0:
             return 0
-        return (self.used_space / self.total_space) * 100
\ No newline at end of file
+        return (self.used_space / self.total_space) * 100
+
+
+class UploadSession(models.Model):
+    """Model for resumable, chunked uploads.
+
+    Chunks are written straight into a preallocated file at the final
+    storage path; committing the session creates the File row.
+    """
+    STATUS_ACTIVE = 'active'
+    STATUS_COMPLETE = 'complete'
+    STATUS_EXPIRED = 'expired'
+    STATUS_CHOICES = [
+        (STATUS_ACTIVE, 'Active'),
+        (STATUS_COMPLETE, 'Complete'),
+        (STATUS_EXPIRED, 'Expired'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    folder = models.ForeignKey(Folder, on_delete=models.CASCADE, null=True, blank=True, related_name='upload_sessions')
+    name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    chunk_size = models.IntegerField()
+    path = models.CharField(max_length=255)
+    # Checksum the client expects; committing fails if the chunks do not match it
+    sha256 = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_ACTIVE)
+    file = models.ForeignKey('File', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.owner.username}/{self.name} ({self.status})"
+
+    @property
+    def total_chunks(self):
+        """Number of chunks needed to cover the whole file."""
+        return -(-self.size // self.chunk_size)
+
+    def chunk_length(self, index):
+        """Expected byte length of the chunk at ``index``."""
+        start = index * self.chunk_size
+        return min(self.chunk_size, self.size - start)
+
+    def is_expired(self):
+        return self.status == self.STATUS_EXPIRED or self.expires_at <= timezone.now()
+
+    def allocate(self):
+        """Create the target file on disk at its full size."""
+        full_path = default_storage.path(self.path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as fh:
+            fh.truncate(self.size)
+
+    def write_chunk(self, index, stream, block_size=64 * 1024):
+        """Copy a chunk from ``stream`` into place; returns bytes written."""
+        remaining = self.chunk_length(index)
+        written = 0
+        with open(default_storage.path(self.path), 'r+b') as fh:
+            fh.seek(index * self.chunk_size)
+            while remaining > 0:
+                block = stream.read(min(block_size, remaining))
+                if not block:
+                    break
+                with storage_io():
+                    fh.write(block)
+                written += len(block)
+                remaining -= len(block)
+        return written
+
+    def record_chunk(self, index, size):
+        """Mark a chunk as received and extend the session's TTL."""
+        UploadChunk.objects.get_or_create(session=self, index=index, defaults={'size': size})
+        UploadSession.objects.filter(pk=self.pk).update(
+            expires_at=timezone.now() + settings.UPLOAD_SESSION_TTL
+        )
+
+    def discard(self):
+        """Remove the partially uploaded file from storage."""
+        full_path = default_storage.path(self.path)
+        if os.path.isfile(full_path):
+            os.remove(full_path)
+
+    def transition(self, status):
+        """Move an active session to ``status``; False if it was no longer active."""
+        moved = UploadSession.objects.filter(
+            pk=self.pk, status=self.STATUS_ACTIVE
+        ).update(status=status, updated_at=timezone.now())
+        if moved:
+            self.status = status
+        return bool(moved)
+
+    def expire(self):
+        """Mark the session expired, free its disk space and quota reservation."""
+        if not self.transition(self.STATUS_EXPIRED):
+            return False
+        self.discard()
+        UserStorage.objects.filter(user_id=self.owner_id).update(
+            reserved_space=models.F('reserved_space') - self.size
+        )
+        return True
+
+
+class UploadChunk(models.Model):
+    """Model for recording chunks received by an upload session."""
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='chunks')
+    index = models.IntegerField()
+    size = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['index']
+        unique_together = ['session', 'index']
+
+    def __str__(self):
+        return f"{self.session_id}#{self.index}"
+
+
+class TrashPurge(models.Model):
+    """A request to empty a user's trash, carried out in the background.
+
+    Everything the user had trashed by ``cutoff`` is purged; until then
+    it is hidden from the trash listing.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='trash_purges')
+    cutoff = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.owner} up to {self.cutoff}"
+
+
+class Change(models.Model):
+    """One entry in a user's append-only change journal, for delta sync.
+
+    ``seq`` increases by one per change for each user; ``object_id`` is
+    the File or Folder that changed. Rows are written by
+    ChangeLog.record() in the same transaction as the change itself.
+    """
+    FILE = 'file'
+    FOLDER = 'folder'
+    KIND_CHOICES = [(FILE, 'File'), (FOLDER, 'Folder')]
+
+    CREATE = 'create'
+    UPDATE = 'update'
+    TRASH = 'trash'
+    RESTORE = 'restore'
+    DELETE = 'delete'
+    ACTION_CHOICES = [
+        (CREATE, 'Created'),
+        (UPDATE, 'Renamed, moved or shared'),
+        (TRASH, 'Moved to trash'),
+        (RESTORE, 'Restored'),
+        (DELETE, 'Permanently deleted'),
+    ]
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='changes')
+    seq = models.BigIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['seq']
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'seq'], name='change_owner_seq_uniq'),
+        ]
+        indexes = [
+            # Compaction finds superseded entries per object
+            models.Index(fields=['owner', 'kind', 'object_id', 'seq'], name='change_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_id}#{self.seq} {self.action} {self.kind} {self.object_id}"
+
+
+class ChangeLog(models.Model):
+    """A user's change journal counters.
+
+    ``last_seq`` is the newest change; changes at or below
+    ``compacted_seq`` may have been dropped, so cursors older than it
+    have to resync from a full listing.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='change_log')
+    last_seq = models.BigIntegerField(default=0)
+    compacted_seq = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} at {self.last_seq}"
+
+    @classmethod
+    def record(cls, owner_id, kind, ids, action):
+        """Append one Change per id in ``ids`` to the owner's journal.
+
+        Numbering them is an UPDATE on the owner's row, which stays
+        locked until the transaction commits; so a user's changes
+        become visible in ``seq`` order and a cursor never skips past
+        one that commits late.
+        """
+        ids = list(ids)
+        if not ids:
+            return
+        with transaction.atomic():
+            advance = {'last_seq': models.F('last_seq') + len(ids)}
+            if not cls.objects.filter(user_id=owner_id).update(**advance):
+                cls.objects.get_or_create(user_id=owner_id)
+                cls.objects.filter(user_id=owner_id).update(**advance)
+            last_seq = cls.objects.values_list('last_seq', flat=True).get(user_id=owner_id)
+            first = last_seq - len(ids) + 1
+            Change.objects.bulk_create([
+                Change(owner_id=owner_id, seq=first + offset, kind=kind, object_id=pk, action=action)
+                for offset, pk in enumerate(ids)
+            ])
+            transaction.on_commit(
+                lambda: changes_recorded.send(sender=cls, owner_id=owner_id, kind=kind, ids=ids)
+            )
@@ -0,0 +1,100 @@
+# backend/api/pagination.py
+"""
+Keyset pagination for list endpoints.
+
+Pages are selected with ``WHERE (key, id) < (last key, last id)`` rather
+than ``OFFSET``, so deep pages cost the same as the first one, no
+``COUNT(*)`` is issued, and rows inserted while a client is paging do
+not shift or repeat results.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination on a (datetime, id) key, newest first."""
+    ordering = ('-created_at', '-id')
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE') or 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def encode_cursor(self, value, pk):
+        payload = json.dumps([value.isoformat() if value else None, pk]).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            value, pk = json.loads(base64.urlsafe_b64decode(padded))
+            position = parse_datetime(value), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            # Not a timestamp; parse_datetime returns None rather than raising
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        key, tiebreak = (field.lstrip('-') for field in self.ordering)
+        lookup = 'lt' if self.ordering[0].startswith('-') else 'gt'
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position:
+            value, pk = position
+            queryset = queryset.filter(
+                Q(**{f'{key}__{lookup}': value}) | Q(**{key: value, f'{tiebreak}__{lookup}': pk})
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if self.page:
+            last = self.page[-1]
+            self.next_cursor = self.encode_cursor(getattr(last, key), getattr(last, tiebreak))
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class TrashPagination(KeysetPagination):
+    """Most recently deleted first."""
+    ordering = ('-deleted_at', '-id')
@@ -7,7 +7,7 @@ class IsOwner(permissions.BasePermission):
     Custom permission to only allow owners of an object to access it.
     """
     def has_object_permission(self, request, view, obj):
-        return obj.owner == request.user
+        return obj.owner_id == request.user.pk
 
 
 class IsOwnerOrShared(permissions.BasePermission):
@@ -16,7 +16,7 @@ class IsOwnerOrShared(permissions.BasePermission):
     """
     def has_object_permission(self, request, view, obj):
         # Allow access if user is owner
-        if obj.owner == request.user:
+        if obj.owner_id == request.user.pk:
             return True
         # Allow read access if file is shared
         if request.method in permissions.SAFE_METHODS and obj.is_shared:
@@ -0,0 +1,159 @@
+# backend/api/purge.py
+"""
+Permanent deletion of trashed files and folders.
+
+Rows are deleted in batches of ``TRASH_PURGE_BATCH_SIZE``, each in its
+own transaction. The stored bytes a batch leaves unreferenced are
+recorded as ``DeletionIntent`` rows in that same transaction and
+unlinked from a thread pool once it commits, so a crash at any point
+leaves intents for the next run to finish rather than orphaned files.
+
+Trash older than ``TRASH_RETENTION`` is purged by ``manage.py
+purge_trash``; "empty trash" requests are recorded as ``TrashPurge``
+rows and carried out by a background thread (or by purge_trash).
+"""
+import collections
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.utils import timezone
+
+from .models import (
+    Blob, Change, ChangeLog, DeletionIntent, File, Folder, TrashPurge, UploadSession
+)
+
+logger = logging.getLogger(__name__)
+
+
+def trashed_by(cutoff):
+    # Rows trashed before deleted_at was recorded count as old
+    return models.Q(is_deleted=True) & (models.Q(deleted_at__lte=cutoff) | models.Q(deleted_at__isnull=True))
+
+
+def purge_files(files, batch_size, workers):
+    """Permanently delete the trashed ``files``; returns how many were deleted."""
+    files = files.filter(is_deleted=True).order_by('pk')
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            # Locked, so a concurrent restore waits and then finds the row gone
+            batch = list(files.select_for_update().values_list('pk', 'blob_id', 'file', 'owner_id')[:batch_size])
+            if not batch:
+                break
+            File.objects.filter(pk__in=[pk for pk, *_ in batch]).delete()
+            intents = Blob.objects.release([blob_id for _, blob_id, *_ in batch if blob_id])
+            intents += DeletionIntent.objects.bulk_create([
+                DeletionIntent(path=name) for _, blob_id, name, _ in batch if not blob_id and name
+            ])
+            by_owner = collections.defaultdict(list)
+            for pk, *_, owner_id in batch:
+                by_owner[owner_id].append(pk)
+            for owner_id, pks in by_owner.items():
+                ChangeLog.record(owner_id, Change.FILE, pks, Change.DELETE)
+        DeletionIntent.objects.unlink(intents, workers)
+        deleted += len(batch)
+    return deleted
+
+
+def purgeable(folder, cutoff):
+    """Whether a trashed folder can go: its whole subtree trashed by
+    ``cutoff``, no files left in it and no uploads headed into it."""
+    subtree = folder.get_descendants(include_self=True)
+    return not (
+        subtree.exclude(trashed_by(cutoff)).exists()
+        or folder.get_subtree_files().exists()
+        or UploadSession.objects.filter(folder__in=subtree.values('pk')).exists()
+    )
+
+
+def purge_folders(folders, cutoff, batch_size):
+    """Permanently delete trashed ``folders`` that purge_files emptied; returns how many."""
+    ids = list(folders.filter(trashed_by(cutoff)).order_by('depth', 'pk').values_list('pk', flat=True))
+    deleted = 0
+    for start in range(0, len(ids), batch_size):
+        with transaction.atomic():
+            # Parents come first and take their subfolders with them
+            batch = Folder.objects.filter(pk__in=ids[start:start + batch_size]).order_by('depth', 'pk')
+            for folder in batch:
+                if purgeable(folder, cutoff):
+                    subtree = folder.get_descendants(include_self=True).values_list('pk', flat=True)
+                    ChangeLog.record(folder.owner_id, Change.FOLDER, subtree, Change.DELETE)
+                    deleted += folder.delete()[1].get(Folder._meta.label, 0)
+    return deleted
+
+
+def purge(cutoff, owner=None, batch_size=None, workers=None):
+    """Purge everything trashed by ``cutoff``, for one owner or for everyone.
+
+    Returns (files, folders) purged.
+    """
+    batch_size = batch_size or settings.TRASH_PURGE_BATCH_SIZE
+    workers = workers or settings.TRASH_PURGE_WORKERS
+    files = File.objects.filter(trashed_by(cutoff))
+    folders = Folder.objects.all()
+    if owner is not None:
+        files = files.filter(owner=owner)
+        folders = folders.filter(owner=owner)
+    return purge_files(files, batch_size, workers), purge_folders(folders, cutoff, batch_size)
+
+
+def purge_expired(retention=None, batch_size=None, workers=None):
+    """Purge trash older than ``retention`` (TRASH_RETENTION by default)."""
+    cutoff = timezone.now() - (retention if retention is not None else settings.TRASH_RETENTION)
+    return purge(cutoff, batch_size=batch_size, workers=workers)
+
+
+def run_requests(batch_size=None, workers=None):
+    """Carry out pending empty-trash requests; returns (files, folders) purged."""
+    files = folders = 0
+    for request in TrashPurge.objects.select_related('owner'):
+        purged_files, purged_folders = purge(request.cutoff, request.owner, batch_size, workers)
+        files += purged_files
+        folders += purged_folders
+        request.delete()
+    return files, folders
+
+
+def finish_intents(batch_size=None, workers=None):
+    """Unlink files whose intents an interrupted run left behind; returns how many."""
+    batch_size = batch_size or settings.TRASH_PURGE_BATCH_SIZE
+    workers = workers or settings.TRASH_PURGE_WORKERS
+    done, last = 0, 0
+    while batch := list(DeletionIntent.objects.filter(pk__gt=last).order_by('pk')[:batch_size]):
+        done += DeletionIntent.objects.unlink(batch, workers)
+        last = batch[-1].pk
+    return done
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """The web process's single purge thread."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='trash-purge')
+        return _executor
+
+
+def run_in_background():
+    try:
+        run_requests()
+    except Exception:
+        # The TrashPurge rows stay, so purge_trash finishes the job
+        logger.exception('Emptying trash failed')
+    finally:
+        connections.close_all()
+
+
+def empty_trash(user):
+    """Queue everything in the user's trash for purging; returns the TrashPurge."""
+    request = TrashPurge.objects.create(owner=user, cutoff=timezone.now())
+    if settings.TRASH_PURGE_IN_BACKGROUND:
+        transaction.on_commit(lambda: get_executor().submit(run_in_background))
+    return request
@@ -0,0 +1,105 @@
+# backend/api/rebalance.py
+"""
+Moving stored bytes to where ``ShardedStorage`` wants them.
+
+``rebalance()`` walks every volume and moves each blob, with its
+renditions, that is not on its top-ranked volume: after STORAGE_VOLUMES
+gains, loses or re-weights a volume, and for blobs stored in MEDIA_ROOT
+before volumes were configured. It runs online. A file is copied under
+a temporary name and renamed into place before the old copy is
+removed, and ``path()`` finds whichever copy exists, so readers always
+see complete bytes.
+
+``migrate_legacy()`` moves files stored before the blob store
+(``users/<id>/<uuid>.<ext>``) into it, a hard link where the file system
+allows, so that they are sharded, deduplicated and placed like the rest.
+"""
+import collections
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils._os import safe_join
+
+from .blobs import store_copy
+from .models import Change, ChangeLog, DeletionIntent, File
+from .scanner import leaf_directories, list_directory, ordered_map
+
+
+def misplaced(storage=None):
+    """(name, root) of each blob store file that is not on the volume it belongs on."""
+    storage = storage or default_storage
+    for root in storage.roots():
+        for directory in leaf_directories(root):
+            if not directory.startswith('blobs') or directory.startswith(os.path.join('blobs', 'tmp')):
+                continue
+            _, _, entries = list_directory(root, directory)
+            for name, _, _ in sorted(entries):
+                if name.endswith('.partial'):
+                    continue  # Another rebalance is copying it
+                stored = os.path.join(directory, name)
+                if storage.candidates(stored)[0] != root:
+                    yield stored, root
+
+
+def move(name, root, storage=None):
+    """Move ``name`` from the volume at ``root`` to its top-ranked volume; returns its size."""
+    storage = storage or default_storage
+    source = safe_join(root, name)
+    size = os.stat(source).st_size
+    if os.path.exists(storage.locations(name)[0]):
+        # Already there, e.g. uploaded again since volumes changed
+        os.remove(source)
+    else:
+        storage.place(source, name)
+    return size
+
+
+def rebalance(workers=4, dry_run=False, report=None):
+    """Move every misplaced file; returns (files, bytes) moved (or to move)."""
+    def handle(name, root):
+        try:
+            size = os.stat(safe_join(root, name)).st_size if dry_run else move(name, root)
+        except FileNotFoundError:
+            return name, root, None  # Deleted meanwhile
+        return name, root, size
+
+    files = total = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for name, root, size in ordered_map(pool, handle, misplaced(), workers * 2):
+            if size is None:
+                continue
+            if report:
+                report(name, root)
+            files += 1
+            total += size
+    return files, total
+
+
+def migrate_legacy(batch_size=500, workers=4):
+    """Move pre-blob files into the blob store; returns how many were moved."""
+    files = File.objects.filter(blob__isnull=True).exclude(file='').order_by('pk')
+    migrated, last = 0, 0
+    while True:
+        with transaction.atomic():
+            # Locked, so they cannot be purged or copied halfway through
+            batch = list(files.filter(pk__gt=last).select_for_update()[:batch_size])
+            if not batch:
+                break
+            intents, moved = [], collections.defaultdict(list)
+            for file_obj in batch:
+                try:
+                    blob = store_copy(file_obj.file.path)
+                except FileNotFoundError:
+                    continue  # Reported, and fixed, by scan_media
+                File.objects.filter(pk=file_obj.pk).update(blob=blob, file=blob.name)
+                intents.append(DeletionIntent(path=file_obj.file.name))
+                moved[file_obj.owner_id].append(file_obj.pk)
+            intents = DeletionIntent.objects.bulk_create(intents)
+            for owner_id, pks in moved.items():
+                ChangeLog.record(owner_id, Change.FILE, pks, Change.UPDATE)
+        DeletionIntent.objects.unlink(intents, workers)
+        migrated += len(intents)
+        last = batch[-1].pk
+    return migrated
@@ -0,0 +1,334 @@
+# backend/api/scanner.py
+"""
+Integrity scan of the media store against the database.
+
+The scan runs in two halves:
+
+* **Disk to rows.** The leaf directories of MEDIA_ROOT and of each of
+  the STORAGE_VOLUMES (``blobs/ab/cd``, ``blobs/tmp`` and the pre-blob
+  ``users/<id>``) are listed with
+  ``os.scandir`` by a thread pool. Each directory's entries are then
+  looked up in the database in one query per kind. Bytes with no row are
+  *orphans*.
+* **Rows to disk.** Blob, pre-blob File and ready Derivative rows are
+  read in keyset batches and their files stat'ed (and, optionally,
+  re-hashed) by the pool. Rows whose bytes are missing are *dangling*.
+
+At most two directories per worker, or one batch, are in memory at a
+time, so memory does not grow with the size of the store. Progress is checkpointed after
+each directory and batch, so an interrupted scan resumes where it left
+off.
+
+Fixes are opt-in. Orphans are removed through ``DeletionIntent``, which
+re-checks that a blob is still unreferenced before unlinking it. Files
+whose bytes are gone are deleted, with the owner's storage counters
+adjusted. Missing renditions are queued to be rendered again. Size and
+checksum mismatches are only reported.
+"""
+import json
+import os
+import re
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .blobs import hash_file
+from .models import (
+    Blob, Change, ChangeLog, DeletionIntent, Derivative, File, UploadSession, UserStorage, blob_path
+)
+
+PHASES = ['disk', 'blobs', 'files', 'derivatives']
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+ORPHAN_BLOB = 'orphan_blob'
+ORPHAN_DERIVATIVE = 'orphan_derivative'
+ORPHAN_UPLOAD = 'orphan_upload'
+ORPHAN_FILE = 'orphan_file'
+MISSING_BLOB = 'missing_blob'
+MISSING_FILE = 'missing_file'
+MISSING_DERIVATIVE = 'missing_derivative'
+SIZE_MISMATCH = 'size_mismatch'
+CHECKSUM_MISMATCH = 'checksum_mismatch'
+
+
+def leaf_directories(root):
+    """Storage-relative leaf directories under ``root``, in sorted order."""
+    def subdirectories(path):
+        try:
+            with os.scandir(os.path.join(root, path)) as entries:
+                return sorted(entry.name for entry in entries if entry.is_dir(follow_symlinks=False))
+        except FileNotFoundError:
+            return []
+
+    for first in subdirectories('blobs'):
+        if first == 'tmp':
+            yield os.path.join('blobs', 'tmp')
+            continue
+        for second in subdirectories(os.path.join('blobs', first)):
+            yield os.path.join('blobs', first, second)
+    for owner in subdirectories('users'):
+        yield os.path.join('users', owner)
+
+
+def list_directory(root, directory):
+    """``root``, ``directory`` and (name, size, mtime) of its regular files."""
+    entries = []
+    try:
+        with os.scandir(os.path.join(root, directory)) as listing:
+            for entry in listing:
+                if entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    entries.append((entry.name, stat.st_size, stat.st_mtime))
+    except FileNotFoundError:
+        pass
+    return root, directory, entries
+
+
+def ordered_map(pool, func, items, window):
+    """Like ``pool.map``, but with at most ``window`` items in flight."""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(func, *item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def stat_size(path):
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return None
+
+
+class Scanner:
+    """Walks the media store and reports (or fixes) inconsistencies.
+
+    ``report(kind, path, detail)`` is called for every issue found and
+    ``checkpoint`` names a JSON file to save progress to and resume from.
+    """
+
+    def __init__(self, report, fix=False, verify=False, workers=8, batch_size=1000,
+                 min_age=3600, checkpoint=None):
+        self.report_issue = report
+        self.fix = fix
+        self.verify = verify
+        self.workers = workers
+        self.batch_size = batch_size
+        self.min_age = min_age
+        self.checkpoint = checkpoint
+        self.roots = default_storage.roots()
+        self.counts = defaultdict(int)
+        self.state = {'phase': PHASES[0], 'after': None}
+
+    def report(self, kind, path, detail=''):
+        self.counts[kind] += 1
+        self.report_issue(kind, path, detail)
+
+    def load_checkpoint(self):
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return False
+        with open(self.checkpoint) as fh:
+            saved = json.load(fh)
+        self.state = {'phase': saved['phase'], 'after': saved['after']}
+        self.counts.update(saved['counts'])
+        return True
+
+    def save_checkpoint(self, phase, after):
+        self.state = {'phase': phase, 'after': after}
+        if not self.checkpoint:
+            return
+        tmp_path = self.checkpoint + '.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump({**self.state, 'counts': self.counts}, fh)
+        os.replace(tmp_path, self.checkpoint)
+
+    def resume_after(self, phase):
+        """Where ``phase`` resumes: None from the start, False if already done."""
+        current = PHASES.index(self.state['phase'])
+        if PHASES.index(phase) < current:
+            return False
+        return self.state['after'] if PHASES.index(phase) == current else None
+
+    def run(self):
+        """Scan everything; returns {issue kind: count}."""
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            self.pool = pool
+            for phase in PHASES:
+                after = self.resume_after(phase)
+                if after is not False:
+                    getattr(self, f'scan_{phase}')(after)
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        return dict(self.counts)
+
+    # Disk to rows
+
+    def scan_disk(self, after):
+        # Checkpointed as [volume index, *directory parts]
+        directories = (
+            (root, directory) for index, root in enumerate(self.roots) for directory in leaf_directories(root)
+            if after is None or [index, *directory.split(os.sep)] > after
+        )
+        for root, directory, entries in ordered_map(self.pool, list_directory, directories, self.workers * 2):
+            old_enough = time.time() - self.min_age
+            # Young files may belong to an upload that has not committed yet
+            entries = [(name, size) for name, size, mtime in entries if mtime <= old_enough]
+            for start in range(0, len(entries), self.batch_size):
+                batch = entries[start:start + self.batch_size]
+                if directory.startswith(os.path.join('blobs', 'tmp')):
+                    self.check_staged(directory, batch)
+                elif directory.startswith('blobs'):
+                    self.check_blob_directory(directory, batch)
+                else:
+                    self.check_user_directory(directory, batch)
+            self.save_checkpoint('disk', [self.roots.index(root), *directory.split(os.sep)])
+
+    def check_blob_directory(self, directory, entries):
+        digests, renditions, strays = set(), set(), []
+        for name, _ in entries:
+            digest, _, rest = name.partition('.')
+            kind, _, ext = rest.rpartition('.')
+            if blob_path(digest) != os.path.join(directory, digest) or not DIGEST_RE.match(digest):
+                strays.append(name)
+            elif not rest:
+                digests.add(digest)
+            elif kind and ext == 'jpg':
+                renditions.add((digest, kind))
+            else:
+                strays.append(name)
+
+        known = set(Blob.objects.filter(digest__in=digests).values_list('digest', flat=True))
+        rendered = set(Derivative.objects.filter(
+            blob__digest__in={digest for digest, _ in renditions}
+        ).values_list('blob__digest', 'kind'))
+
+        orphans = []
+        for digest in sorted(digests - known):
+            self.report(ORPHAN_BLOB, os.path.join(directory, digest))
+            orphans.append(DeletionIntent(digest=digest))
+        for digest, kind in sorted(renditions - rendered):
+            if digest in digests - known:
+                continue  # Removed together with its orphaned blob
+            path = os.path.join(directory, f'{digest}.{kind}.jpg')
+            self.report(ORPHAN_DERIVATIVE, path)
+            orphans.append(DeletionIntent(path=path))
+        for name in strays:
+            path = os.path.join(directory, name)
+            self.report(ORPHAN_FILE, path)
+            orphans.append(DeletionIntent(path=path))
+        self.remove(orphans)
+
+    def check_staged(self, directory, entries):
+        paths = {os.path.join(directory, name) for name, _ in entries}
+        active = set(UploadSession.objects.filter(
+            path__in=paths, status=UploadSession.STATUS_ACTIVE
+        ).values_list('path', flat=True))
+        orphans = []
+        for path in sorted(paths - active):
+            self.report(ORPHAN_UPLOAD, path)
+            orphans.append(DeletionIntent(path=path))
+        self.remove(orphans)
+
+    def check_user_directory(self, directory, entries):
+        paths = {os.path.join(directory, name) for name, _ in entries}
+        known = set(File.objects.filter(file__in=paths).values_list('file', flat=True))
+        orphans = []
+        for path in sorted(paths - known):
+            self.report(ORPHAN_FILE, path)
+            orphans.append(DeletionIntent(path=path))
+        self.remove(orphans)
+
+    def remove(self, intents):
+        if self.fix and intents:
+            DeletionIntent.objects.unlink(DeletionIntent.objects.bulk_create(intents), self.workers)
+
+    # Rows to disk
+
+    def batches(self, queryset, phase, after, *fields):
+        """Keyset batches of ``fields`` (pk first) from ``queryset``, checkpointed."""
+        last = after or 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last).order_by('pk').values_list('pk', *fields)[:self.batch_size])
+            if not batch:
+                return
+            yield batch
+            last = batch[-1][0]
+            self.save_checkpoint(phase, last)
+
+    def check_blob(self, row):
+        """(issue, detail) for a blob's bytes; issue is None if they are intact."""
+        _, digest, size = row
+        path = default_storage.path(blob_path(digest))
+        actual = stat_size(path)
+        if actual is None:
+            return MISSING_BLOB, ''
+        if actual != size:
+            return SIZE_MISMATCH, f'{actual} bytes on disk, {size} recorded'
+        if self.verify and hash_file(path) != digest:
+            return CHECKSUM_MISMATCH, ''
+        return None, ''
+
+    def scan_blobs(self, after):
+        for batch in self.batches(Blob.objects.all(), 'blobs', after, 'digest', 'size'):
+            missing = []
+            for (pk, digest, _), (issue, detail) in zip(batch, self.pool.map(self.check_blob, batch)):
+                if issue:
+                    self.report(issue, blob_path(digest), detail)
+                if issue == MISSING_BLOB:
+                    missing.append(pk)
+            if self.fix and missing:
+                self.drop_files(File.objects.filter(blob_id__in=missing))
+
+    def scan_files(self, after):
+        legacy = File.objects.filter(blob__isnull=True)
+        for batch in self.batches(legacy, 'files', after, 'file'):
+            paths = [default_storage.path(name) for _, name in batch]
+            missing = [
+                (pk, name) for (pk, name), size in zip(batch, self.pool.map(stat_size, paths))
+                if size is None
+            ]
+            for pk, name in missing:
+                self.report(MISSING_FILE, name, f'file {pk}')
+            if self.fix and missing:
+                self.drop_files(File.objects.filter(pk__in=[pk for pk, _ in missing]))
+
+    def scan_derivatives(self, after):
+        ready = Derivative.objects.filter(status=Derivative.STATUS_READY)
+        for batch in self.batches(ready, 'derivatives', after, 'blob__digest', 'kind'):
+            names = [f'{blob_path(digest)}.{kind}.jpg' for _, digest, kind in batch]
+            sizes = self.pool.map(stat_size, [default_storage.path(name) for name in names])
+            missing = [(row[0], name) for row, name, size in zip(batch, names, sizes) if size is None]
+            for _, name in missing:
+                self.report(MISSING_DERIVATIVE, name)
+            if self.fix and missing:
+                Derivative.objects.filter(pk__in=[pk for pk, _ in missing]).update(
+                    status=Derivative.STATUS_PENDING, attempts=0, updated_at=timezone.now()
+                )
+
+    def drop_files(self, files):
+        """Delete File rows whose bytes are gone, with their storage counters."""
+        with transaction.atomic():
+            rows = list(files.select_for_update().values_list('pk', 'owner_id', 'size', 'is_deleted', 'blob_id'))
+            File.objects.filter(pk__in=[row[0] for row in rows]).delete()
+            intents = Blob.objects.release([blob_id for *_, blob_id in rows if blob_id])
+            live = defaultdict(lambda: [0, 0])
+            for _, owner_id, size, is_deleted, _ in rows:
+                if not is_deleted:
+                    live[owner_id][0] += size
+                    live[owner_id][1] += 1
+            for owner_id, (size, count) in live.items():
+                UserStorage.adjust(User(pk=owner_id), space=-size, files=-count)
+            dropped = defaultdict(list)
+            for pk, owner_id, *_ in rows:
+                dropped[owner_id].append(pk)
+            for owner_id, pks in dropped.items():
+                ChangeLog.record(owner_id, Change.FILE, pks, Change.DELETE)
+        # Renditions stored next to a missing blob
+        DeletionIntent.objects.unlink(intents, self.workers)
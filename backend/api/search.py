@@ -0,0 +1,336 @@
+# backend/api/search.py
+"""
+Indexed file search.
+
+SQLite keeps an FTS5 table in sync with ``api_file`` through triggers,
+PostgreSQL uses pg_trgm and tsvector GIN indexes on the table itself,
+and any other database falls back to an ``icontains`` scan. Results are
+ranked and paginated with an opaque (score, id) cursor; lower scores
+rank first.
+"""
+import base64
+import json
+import logging
+import re
+
+from django.db import connections, DatabaseError
+from django.db.models import F, FloatField, Func, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import File, Folder
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'api_file_search'
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# bm25 weights for the FTS columns: name, path, mime_type, owner
+SQLITE_WEIGHTS = (10.0, 2.0, 1.0, 0.0)
+
+SQLITE_INSTALL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, path, mime_type, owner, tokenize = 'unicode61', prefix = '2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON api_file
+    WHEN new.is_deleted = 0 BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, path, mime_type, owner) VALUES (
+            new.id, new.name,
+            COALESCE((SELECT full_path FROM api_folder WHERE id = new.folder_id), ''),
+            new.mime_type, 'u' || new.owner_id
+        );
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON api_file
+    WHEN old.name IS NOT new.name OR old.folder_id IS NOT new.folder_id
+        OR old.mime_type IS NOT new.mime_type OR old.owner_id IS NOT new.owner_id
+        OR old.is_deleted IS NOT new.is_deleted BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, name, path, mime_type, owner) SELECT
+            new.id, new.name,
+            COALESCE((SELECT full_path FROM api_folder WHERE id = new.folder_id), ''),
+            new.mime_type, 'u' || new.owner_id
+        WHERE new.is_deleted = 0;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON api_file BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_folder_au AFTER UPDATE ON api_folder
+    WHEN old.full_path IS NOT new.full_path BEGIN
+        UPDATE {FTS_TABLE} SET path = new.full_path WHERE rowid IN (
+            SELECT id FROM api_file WHERE folder_id = new.id AND is_deleted = 0
+        );
+    END
+    """,
+]
+
+SQLITE_REBUILD = [
+    f"DELETE FROM {FTS_TABLE}",
+    f"""
+    INSERT INTO {FTS_TABLE}(rowid, name, path, mime_type, owner)
+    SELECT f.id, f.name, COALESCE(d.full_path, ''), f.mime_type, 'u' || f.owner_id
+    FROM api_file f LEFT JOIN api_folder d ON d.id = f.folder_id
+    WHERE f.is_deleted = 0
+    """,
+]
+
+POSTGRES_INSTALL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS api_file_name_trgm ON api_file USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS api_folder_full_path_trgm ON api_folder USING gin (full_path gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS api_file_name_tsv ON api_file USING gin (to_tsvector('simple', name))",
+]
+
+
+def encode_cursor(score, pk):
+    payload = json.dumps([score, pk]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor from a previous page; raises ValueError if invalid."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, pk = json.loads(base64.urlsafe_b64decode(padded))
+        return float(score), int(pk)
+    except (TypeError, ValueError, json.JSONDecodeError):
+        raise ValueError('Invalid cursor.')
+
+
+def parse_terms(text):
+    """Split a query into (folder path, words).
+
+    ``Projects/Drive/spec`` searches for ``spec`` under the folder path
+    ``Projects/Drive``.
+    """
+    path = None
+    if '/' in text:
+        path, _, text = text.rpartition('/')
+        path = path.strip('/ ') or None
+    return path, [word.lower() for word in WORD_RE.findall(text)]
+
+
+def parse_filters(params, user):
+    """Build search filters from query parameters; raises ValueError if invalid."""
+    filters = {}
+    if params.get('type'):
+        filters['type'] = params['type'].strip().lower()
+    if params.get('folder'):
+        try:
+            filters['folder'] = Folder.objects.get(
+                pk=int(params['folder']), owner=user, is_deleted=False
+            )
+        except (ValueError, Folder.DoesNotExist):
+            raise ValueError('Folder not found.')
+    if params.get('path'):
+        filters['path'] = params['path'].strip('/ ')
+    for name in ('created_after', 'created_before'):
+        if params.get(name):
+            value = parse_datetime(params[name]) or parse_date(params[name])
+            if value is None:
+                raise ValueError(f'Invalid {name}; use an ISO 8601 date or datetime.')
+            filters[name] = value
+    for name in ('min_size', 'max_size'):
+        if params.get(name):
+            try:
+                filters[name] = int(params[name])
+            except ValueError:
+                raise ValueError(f'Invalid {name}; use a number of bytes.')
+    return filters
+
+
+def filter_q(filters):
+    """ORM conditions for the non-text filters."""
+    q = Q()
+    mime = filters.get('type')
+    if mime:
+        q &= Q(mime_type=mime) if '/' in mime else Q(mime_type__startswith=f'{mime}/')
+    if 'folder' in filters:
+        q &= Q(folder__in=filters['folder'].get_descendants(include_self=True).values('pk'))
+    if filters.get('path'):
+        path = filters['path']
+        q &= Q(folder__full_path__iexact=path) | Q(folder__full_path__istartswith=f'{path}/')
+    if 'created_after' in filters:
+        q &= Q(created_at__gte=filters['created_after'])
+    if 'created_before' in filters:
+        q &= Q(created_at__lte=filters['created_before'])
+    if 'min_size' in filters:
+        q &= Q(size__gte=filters['min_size'])
+    if 'max_size' in filters:
+        q &= Q(size__lte=filters['max_size'])
+    return q
+
+
+class SearchBackend:
+    """Portable fallback: unranked ``icontains`` matching in id order."""
+
+    def install(self, connection):
+        pass
+
+    def rebuild(self, connection):
+        pass
+
+    def match_q(self, words):
+        q = Q()
+        for word in words:
+            q &= (
+                Q(name__icontains=word)
+                | Q(folder__full_path__icontains=word)
+                | Q(mime_type__icontains=word)
+            )
+        return q
+
+    def score(self, text, words):
+        return Value(0.0, output_field=FloatField())
+
+    def search(self, connection, owner_id, words, filters, after, limit):
+        """Return [(score, id)] for up to ``limit`` matches after ``after``."""
+        queryset = File.objects.using(connection.alias).filter(
+            self.match_q(words),
+            filter_q(filters),
+            owner_id=owner_id,
+            is_deleted=False,
+        ).annotate(score=self.score(' '.join(words), words))
+        if after:
+            score, pk = after
+            queryset = queryset.filter(Q(score__gt=score) | Q(score=score, pk__gt=pk))
+        return list(queryset.order_by('score', 'pk').values_list('score', 'pk')[:limit])
+
+
+class PostgresSearchBackend(SearchBackend):
+    """Trigram-indexed matching ranked by similarity and tsvector prefix rank."""
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            for statement in POSTGRES_INSTALL:
+                cursor.execute(statement)
+
+    def score(self, text, words):
+        tsquery = ' & '.join(f'{word}:*' for word in words) or text
+        similarity = Func(F('name'), Value(text), function='similarity', output_field=FloatField())
+        ts_rank = RawSQL(
+            "ts_rank(to_tsvector('simple', api_file.name), to_tsquery('simple', %s))",
+            [tsquery],
+            output_field=FloatField(),
+        )
+        return -(similarity + ts_rank)
+
+
+class SqliteSearchBackend(SearchBackend):
+    """FTS5 full-text index with bm25 ranking and prefix matching."""
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+            )
+            exists = cursor.fetchone() is not None
+            for statement in SQLITE_INSTALL:
+                cursor.execute(statement)
+        if not exists:
+            self.rebuild(connection)
+
+    def rebuild(self, connection):
+        with connection.cursor() as cursor:
+            for statement in SQLITE_REBUILD:
+                cursor.execute(statement)
+
+    def match_expression(self, owner_id, words):
+        parts = [f'owner : "u{int(owner_id)}"']
+        parts += ['{name path mime_type} : "%s" *' % word.replace('"', '""') for word in words]
+        return ' AND '.join(parts)
+
+    def search(self, connection, owner_id, words, filters, after, limit):
+        # Non-text filters are applied by id against the ORM so their
+        # semantics match the other backends exactly.
+        conditions = filter_q(filters)
+        where, params = '', []
+        if conditions:
+            ids_sql, ids_params = File.objects.filter(conditions).order_by().values('pk').query.sql_with_params()
+            where = f'AND f.id IN ({ids_sql})'
+            params = list(ids_params)
+
+        page, page_params = '', []
+        if after:
+            page = 'WHERE score > %s OR (score = %s AND id > %s)'
+            page_params = [after[0], after[0], after[1]]
+
+        weights = ', '.join(str(w) for w in SQLITE_WEIGHTS)
+        sql = f"""
+            SELECT score, id FROM (
+                SELECT bm25({FTS_TABLE}, {weights}) AS score, f.id AS id
+                FROM {FTS_TABLE} JOIN api_file f ON f.id = {FTS_TABLE}.rowid
+                WHERE {FTS_TABLE} MATCH %s AND f.owner_id = %s AND f.is_deleted = 0 {where}
+            ) {page}
+            ORDER BY score, id
+            LIMIT %s
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql,
+                [self.match_expression(owner_id, words), owner_id] + params + page_params + [limit]
+            )
+            return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': SqliteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(connection):
+    return BACKENDS.get(connection.vendor, SearchBackend)()
+
+
+def install(using='default', **kwargs):
+    """Create search indexes; connected to post_migrate."""
+    connection = connections[using]
+    try:
+        get_backend(connection).install(connection)
+    except DatabaseError:
+        # e.g. no permission to CREATE EXTENSION; searches still work, unindexed
+        logger.exception('Could not install the file search index on %r', using)
+
+
+def rebuild(using='default'):
+    connection = connections[using]
+    get_backend(connection).rebuild(connection)
+
+
+def search(owner_id, text, filters=None, cursor=None, limit=50, using='default'):
+    """Ranked search over a user's files.
+
+    Returns (files, next_cursor); ``next_cursor`` is None on the last page.
+    """
+    filters = dict(filters or {})
+    path, words = parse_terms(text)
+    if path:
+        filters.setdefault('path', path)
+    if not words and not path:
+        return [], None
+
+    connection = connections[using]
+    if not words:
+        # A bare path like "Projects/" lists everything under it
+        backend = SearchBackend()
+    else:
+        backend = get_backend(connection)
+    rows = backend.search(connection, owner_id, words, filters, decode_cursor(cursor), limit + 1)
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    files = File.objects.using(using).for_listing().in_bulk([pk for _, pk in rows])
+    results = [files[pk] for _, pk in rows if pk in files]
+    next_cursor = encode_cursor(*rows[-1]) if has_more else None
+    return results, next_cursor
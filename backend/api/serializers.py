@@ -1,8 +1,20 @@
 # backend/api/serializers.py
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
-from .models import File, Folder, UserStorage
+from .models import File, Folder, UserStorage, UploadSession
+from .blobs import ChecksumMismatch, store_upload
+from . import thumbnails
+
+SHA256_PATTERN = r'^[0-9a-fA-F]{64}$'
+
+
+def sha256_field(**kwargs):
+    return serializers.RegexField(
+        SHA256_PATTERN, max_length=64,
+        error_messages={'invalid': 'Expected a hex-encoded SHA-256 digest.'}, **kwargs
+    )
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -53,8 +65,23 @@ class FolderSerializer(serializers.ModelSerializer):
     def get_path(self, obj):
         return obj.get_path()
 
+    def validate_parent(self, value):
+        """Only allow moving under the user's own folders, and never into itself."""
+        if value is None:
+            return value
+        request = self.context.get('request')
+        if request and value.owner_id != request.user.id:
+            raise serializers.ValidationError("Folder not found.")
+        if self.instance and (value.pk == self.instance.pk or self.instance.is_ancestor_of(value)):
+            raise serializers.ValidationError("A folder cannot be moved into itself.")
+        return value
+
     def get_file_count(self, obj):
-        return obj.files.filter(is_deleted=False).count()
+        # Annotated by FolderQuerySet.for_listing(); fall back for single objects
+        count = getattr(obj, 'active_file_count', None)
+        if count is None:
+            count = obj.files.filter(is_deleted=False).count()
+        return count
 
 
 class FileSerializer(serializers.ModelSerializer):
@@ -63,25 +90,31 @@ class FileSerializer(serializers.ModelSerializer):
     folder_name = serializers.CharField(source='folder.name', read_only=True, allow_null=True)
     file_url = serializers.SerializerMethodField()
     share_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
     size_formatted = serializers.SerializerMethodField()
+    sha256 = serializers.SerializerMethodField()
+    fast_hash = serializers.SerializerMethodField()
 
     class Meta:
         model = File
         fields = [
             'id', 'name', 'file', 'file_url', 'owner', 'owner_username',
             'folder', 'folder_name', 'size', 'size_formatted', 'mime_type',
-            'created_at', 'updated_at', 'is_deleted', 'is_shared',
-            'share_token', 'share_url'
+            'sha256', 'fast_hash', 'created_at', 'updated_at', 'is_deleted',
+            'is_shared', 'share_token', 'share_url', 'thumbnail_url'
         ]
         read_only_fields = [
             'id', 'owner', 'size', 'mime_type', 'created_at', 'updated_at',
             'share_token'
         ]
+        # The upload; its storage URL is not exposed (see get_file_url)
+        extra_kwargs = {'file': {'write_only': True}}
 
     def get_file_url(self, obj):
+        # Through the download view: blob paths are public knowledge to anyone with the hash
         request = self.context.get('request')
         if obj.file and request:
-            return request.build_absolute_uri(obj.file.url)
+            return request.build_absolute_uri(f'/api/files/{obj.pk}/download/')
         return None
 
     def get_share_url(self, obj):
@@ -91,6 +124,19 @@ class FileSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(f'/api/files/shared/{obj.share_token}/')
         return None
 
+    def get_thumbnail_url(self, obj):
+        request = self.context.get('request')
+        if request and obj.blob_id and thumbnails.kinds_for(obj.mime_type):
+            return request.build_absolute_uri(f'/api/files/{obj.pk}/thumbnail/')
+        return None
+
+    def get_sha256(self, obj):
+        # Files stored before the blob store have no checksum
+        return obj.blob.digest if obj.blob_id else None
+
+    def get_fast_hash(self, obj):
+        return (obj.blob.fast_digest or None) if obj.blob_id else None
+
     def get_size_formatted(self, obj):
         """Format file size in human-readable format."""
         size = obj.size
@@ -102,22 +148,95 @@ class FileSerializer(serializers.ModelSerializer):
 
 
 class FileUploadSerializer(serializers.ModelSerializer):
-    """Serializer for file uploads."""
+    """Serializer for file uploads.
+
+    An optional ``sha256`` is checked against the checksum taken while
+    the upload streamed in; a mismatch stores nothing.
+    """
+    sha256 = sha256_field(write_only=True, required=False)
+
     class Meta:
         model = File
-        fields = ['id', 'name', 'file', 'folder']
+        fields = ['id', 'name', 'file', 'folder', 'sha256']
 
     def validate_file(self, value):
-        """Validate file size against user's storage limit."""
+        """Reject uploads that obviously exceed the user's storage limit.
+
+        The authoritative check is the reservation taken in
+        FileViewSet.perform_create.
+        """
         request = self.context.get('request')
         if request and request.user:
             storage, created = UserStorage.objects.get_or_create(user=request.user)
             if not storage.has_space_for(value.size):
                 raise serializers.ValidationError(
-                    f"Not enough storage space. You have {storage.total_space - storage.used_space} bytes available."
+                    f"Not enough storage space. You have {storage.available_space()} bytes available."
                 )
         return value
 
+    def create(self, validated_data):
+        """Store the upload in the blob store and point the new File at it."""
+        upload = validated_data.pop('file')
+        try:
+            blob = store_upload(upload, validated_data.pop('sha256', None))
+        except ChecksumMismatch as exc:
+            raise serializers.ValidationError({'sha256': [str(exc)]})
+        return File.objects.create(file=blob.name, blob=blob, size=blob.size, **validated_data)
+
+
+class FileFromHashSerializer(serializers.ModelSerializer):
+    """Serializer for creating a file from content the server already has."""
+    sha256 = sha256_field()
+    size = serializers.IntegerField(min_value=0)
+
+    class Meta:
+        model = File
+        fields = ['name', 'folder', 'sha256', 'size']
+
+    def validate_folder(self, value):
+        request = self.context.get('request')
+        if value and request and value.owner_id != request.user.id:
+            raise serializers.ValidationError("Folder not found.")
+        return value
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Serializer for resumable upload sessions."""
+    total_chunks = serializers.IntegerField(read_only=True)
+    received_chunks = serializers.SerializerMethodField()
+    sha256 = sha256_field(required=False)
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'name', 'folder', 'size', 'sha256', 'chunk_size', 'total_chunks',
+            'received_chunks', 'status', 'file', 'created_at', 'expires_at'
+        ]
+        read_only_fields = [
+            'id', 'chunk_size', 'status', 'file', 'created_at', 'expires_at'
+        ]
+
+    def get_received_chunks(self, obj):
+        return list(obj.chunks.values_list('index', flat=True))
+
+    def validate_sha256(self, value):
+        return value.lower()
+
+    def validate_size(self, value):
+        if value < 0:
+            raise serializers.ValidationError("Size must not be negative.")
+        if value > settings.MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(
+                f"File too large. Maximum upload size is {settings.MAX_UPLOAD_SIZE} bytes."
+            )
+        return value
+
+    def validate_folder(self, value):
+        request = self.context.get('request')
+        if value and request and value.owner_id != request.user.id:
+            raise serializers.ValidationError("Folder not found.")
+        return value
+
 
 class UserStorageSerializer(serializers.ModelSerializer):
     """Serializer for UserStorage model."""
@@ -125,8 +244,6 @@ class UserStorageSerializer(serializers.ModelSerializer):
     used_formatted = serializers.SerializerMethodField()
     total_formatted = serializers.SerializerMethodField()
     percentage = serializers.SerializerMethodField()
-    file_count = serializers.SerializerMethodField()
-    folder_count = serializers.SerializerMethodField()
 
     class Meta:
         model = UserStorage
@@ -135,7 +252,7 @@ class UserStorageSerializer(serializers.ModelSerializer):
             'total_space', 'total_formatted', 'percentage',
             'file_count', 'folder_count', 'updated_at'
         ]
-        read_only_fields = ['id', 'used_space', 'updated_at']
+        read_only_fields = ['id', 'used_space', 'file_count', 'folder_count', 'updated_at']
 
     def get_used_formatted(self, obj):
         size = obj.used_space
@@ -155,9 +272,3 @@ class UserStorageSerializer(serializers.ModelSerializer):
 
     def get_percentage(self, obj):
         return round(obj.get_usage_percentage(), 1)
-
-    def get_file_count(self, obj):
-        return File.objects.filter(owner=obj.user, is_deleted=False).count()
-
-    def get_folder_count(self, obj):
-        return Folder.objects.filter(owner=obj.user, is_deleted=False).count()
\ No newline at end of file
@@ -0,0 +1,240 @@
+# backend/api/sharecache.py
+"""
+Caches for public share links.
+
+A viral link is requested thousands of times a second for the same few
+files, and each request used to look the token up in the database and
+stat and open the file. Two caches take that off the hot path:
+
+* **Share resolution.** token -> the file's row (with its blob, owner
+  and folder), in an in-process LRU whose entries live for
+  ``SHARE_CACHE_TTL`` seconds, backed by the Django cache named by
+  ``SHARE_CACHE_ALIAS`` when processes should share lookups. Every
+  change to a file (rename, unshare, trash, delete...) is journaled by
+  ``ChangeLog.record``, which drops the file's entries in this process
+  and the shared cache once the change commits. Other processes' LRUs
+  catch up within SHARE_CACHE_TTL, so keep it short.
+* **Hot content.** The bytes of files up to ``SHARE_CONTENT_CACHE_MAX_FILE``
+  are kept in memory, least recently used first out once they exceed
+  ``SHARE_CONTENT_CACHE_BYTES``. Entries are keyed by content (the blob
+  digest, or the stored name of a pre-blob file), which never changes,
+  so they need no invalidation.
+"""
+import collections
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+
+from .metrics import storage_io
+from .models import Blob, Change, File, Folder
+
+SHARED_KEY = 'share:token:{}'
+SHARED_FILE_KEY = 'share:file:{}'
+
+
+class LRUCache:
+    """Thread-safe LRU of at most ``size`` entries, each kept for ``ttl`` seconds."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            item = self.entries.pop(key, None)
+        return item[0] if item else None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class ShareCache:
+    """Resolves share tokens to File rows, caching them (see the module docstring)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.configured = None
+        # Bumped by every invalidation; a lookup that raced one is not cached
+        self.generation = 0
+        self.tokens = LRUCache(1, 0)
+        self.file_tokens = {}
+
+    def local(self):
+        """The in-process LRU, rebuilt when its settings change."""
+        configured = (settings.SHARE_CACHE_SIZE, settings.SHARE_CACHE_TTL)
+        if configured != self.configured:
+            with self.lock:
+                self.tokens = LRUCache(*configured)
+                self.file_tokens = {}
+                self.configured = configured
+        return self.tokens
+
+    def shared(self):
+        return caches[settings.SHARE_CACHE_ALIAS] if settings.SHARE_CACHE_ALIAS else None
+
+    def enabled(self):
+        return settings.SHARE_CACHE_TTL > 0
+
+    def get(self, token):
+        """The shared File for ``token``, or None. Cached rows are snapshots: never save them."""
+        if not self.enabled():
+            return load(token)
+        entry = self.local().get(token)
+        if entry is None:
+            generation = self.generation
+            shared = self.shared()
+            entry = shared.get(SHARED_KEY.format(token)) if shared else None
+            if entry is None:
+                entry = snapshot(load(token))
+                if entry is None:
+                    return None
+                if shared and generation == self.generation:
+                    shared.set_many({
+                        SHARED_KEY.format(token): entry,
+                        SHARED_FILE_KEY.format(entry['fields']['id']): token,
+                    }, settings.SHARE_CACHE_SHARED_TTL)
+            with self.lock:
+                if generation == self.generation:
+                    self.file_tokens[entry['fields']['id']] = token
+                    self.tokens.set(token, entry)
+        return restore(entry)
+
+    async def aget(self, token):
+        """get() for async views; a hit in this process needs no thread."""
+        entry = self.local().get(token) if self.enabled() else None
+        if entry is not None:
+            return restore(entry)
+        return await sync_to_async(self.get)(token)
+
+    def invalidate(self, file_ids):
+        """Forget the share tokens of ``file_ids``."""
+        file_ids = list(file_ids)
+        with self.lock:
+            self.generation += 1
+            tokens = [self.file_tokens.pop(pk, None) for pk in file_ids]
+        for token in tokens:
+            if token:
+                self.tokens.pop(token)
+        shared = self.shared()
+        if shared:
+            keys = [SHARED_FILE_KEY.format(pk) for pk in file_ids]
+            stale = shared.get_many(keys)
+            shared.delete_many(keys + [SHARED_KEY.format(token) for token in stale.values()])
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.file_tokens = {}
+        self.tokens.clear()
+
+    def changed(self, sender=None, kind=None, ids=(), **kwargs):
+        """``changes_recorded`` receiver."""
+        if kind == Change.FILE and self.enabled():
+            self.invalidate(ids)
+
+
+def load(token):
+    return File.objects.select_related('blob', 'owner', 'folder').filter(
+        share_token=token, is_shared=True
+    ).first()
+
+
+def snapshot(file_obj):
+    """A picklable copy of a File row and what serving it needs of its relations."""
+    if file_obj is None:
+        return None
+    fields = {field.attname: field.value_from_object(file_obj) for field in File._meta.concrete_fields}
+    fields['file'] = file_obj.file.name
+    blob = file_obj.blob
+    return {
+        'fields': fields,
+        'blob': (blob.pk, blob.digest, blob.size, blob.fast_digest) if blob else None,
+        'owner': (file_obj.owner.pk, file_obj.owner.username),
+        'folder': (file_obj.folder.pk, file_obj.folder.name) if file_obj.folder else None,
+    }
+
+
+def restore(entry):
+    file_obj = File(**entry['fields'])
+    if entry['blob']:
+        pk, digest, size, fast_digest = entry['blob']
+        file_obj.blob = Blob(pk=pk, digest=digest, size=size, fast_digest=fast_digest)
+    pk, username = entry['owner']
+    file_obj.owner = User(pk=pk, username=username)
+    file_obj.folder = Folder(pk=entry['folder'][0], name=entry['folder'][1]) if entry['folder'] else None
+    return file_obj
+
+
+class ContentCache:
+    """LRU of small files' bytes within a byte budget, keyed by content."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.used = 0
+
+    def key(self, file_obj):
+        return file_obj.blob.digest if file_obj.blob_id else f'{file_obj.file.name}:{file_obj.size}'
+
+    def get(self, file_obj):
+        """The bytes of ``file_obj``, from memory or read from disk; None if too big.
+
+        Raises FileNotFoundError if the file is not cached and not on disk.
+        """
+        budget = settings.SHARE_CONTENT_CACHE_BYTES
+        if file_obj.size > min(settings.SHARE_CONTENT_CACHE_MAX_FILE, budget):
+            return None
+        key = self.key(file_obj)
+        with self.lock:
+            content = self.entries.get(key)
+            if content is not None:
+                self.entries.move_to_end(key)
+                return content
+        with storage_io(), open(file_obj.file.path, 'rb') as fh:
+            content = fh.read()
+        if len(content) != file_obj.size:
+            return content  # Changed on disk; serve it, but do not keep it
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = content
+                self.used += len(content)
+                while self.used > budget:
+                    _, evicted = self.entries.popitem(last=False)
+                    self.used -= len(evicted)
+        return content
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.used = 0
+
+
+# changed() is connected to changes_recorded in ApiConfig.ready()
+shares = ShareCache()
+contents = ContentCache()
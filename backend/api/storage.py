@@ -0,0 +1,131 @@
+# backend/api/storage.py
+"""
+Blob storage spread over several volumes.
+
+Blobs are already sharded by digest prefix (``blobs/ab/cd/<digest>``,
+with thumbnails and previews next to them as ``<digest>.<kind>.jpg``).
+``ShardedStorage`` decides which of the ``STORAGE_VOLUMES`` each shard
+entry lives on by weighted rendezvous hashing of its digest: every
+volume scores the digest, and the highest score wins. Adding a volume
+only moves the share of blobs that the new volume wins, and a volume
+with weight 0 is drained: nothing is placed there, but what is there is
+still found.
+
+``path()`` returns the first volume, in ranking order, that has the
+file, and falls back to MEDIA_ROOT for blobs stored before volumes were
+configured; a new file goes to the top-ranked volume. So
+``File.file.path`` keeps working while ``manage.py rebalance_storage``
+moves blobs to where they now belong. Files on a volume other than
+MEDIA_ROOT are addressed as ``volumes/<n>/<name>``, ``n`` being the
+volume's position in STORAGE_VOLUMES, under MEDIA_URL (``url()``) and
+under the proxy's internal prefix (``served_name()``), so each volume
+needs its own alias. Everything outside the blob shards (``blobs/tmp``
+staging, pre-blob ``users/<id>`` files) stays in MEDIA_ROOT.
+"""
+import errno
+import hashlib
+import math
+import os
+import re
+import shutil
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils._os import safe_join
+
+from .metrics import storage_io
+
+# blobs/ab/cd/<digest>[.<kind>.jpg], keyed by the digest
+SHARD_RE = re.compile(r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/([^/.]+)')
+
+
+def rendezvous_score(root, weight, key):
+    """Weighted rendezvous (highest random weight) score of ``key`` on a volume."""
+    if weight <= 0:
+        return -math.inf
+    digest = hashlib.sha256(f'{root}\0{key}'.encode()).digest()
+    # Uniform in (0, 1); -w / ln(u) picks volumes in proportion to their weights
+    u = (int.from_bytes(digest[:8], 'big') + 1) / (2 ** 64 + 1)
+    return -weight / math.log(u)
+
+
+class ShardedStorage(FileSystemStorage):
+    """FileSystemStorage that places blob shard entries across STORAGE_VOLUMES."""
+
+    def volumes(self):
+        """(root, weight) of each blob volume; MEDIA_ROOT alone if none are set."""
+        volumes = [(os.path.abspath(root), weight) for root, weight in settings.STORAGE_VOLUMES]
+        return volumes or [(os.path.abspath(self.location), 1)]
+
+    def roots(self):
+        """Every directory a stored file may be in: the volumes, then MEDIA_ROOT."""
+        roots = [root for root, _ in self.volumes()]
+        location = os.path.abspath(self.location)
+        return roots if location in roots else roots + [location]
+
+    def candidates(self, name):
+        """Roots that may hold ``name``, the one it belongs on first."""
+        match = SHARD_RE.match(name.replace(os.sep, '/'))
+        if not match:
+            return [os.path.abspath(self.location)]
+        key = match.group(1)
+        ranked = sorted(self.volumes(), key=lambda volume: rendezvous_score(*volume, key), reverse=True)
+        roots = [root for root, weight in ranked]
+        location = os.path.abspath(self.location)
+        return roots if location in roots else roots + [location]
+
+    def locations(self, name):
+        """Absolute paths ``name`` may be stored at, whether or not it exists."""
+        return [safe_join(root, name) for root in self.candidates(name)]
+
+    def path(self, name):
+        locations = self.locations(name)
+        if len(locations) > 1:
+            for location in locations:
+                if os.path.exists(location):
+                    return location
+        return locations[0]
+
+    def served_name(self, name, path=None):
+        """``name`` as the web server sees it: prefixed with its volume unless in MEDIA_ROOT.
+
+        ``path`` is where ``name`` was found, if already resolved.
+        """
+        path = path or self.path(name)
+        location = os.path.abspath(self.location)
+        for index, (root, _) in enumerate(settings.STORAGE_VOLUMES):
+            root = os.path.abspath(root)
+            if root != location and path.startswith(root + os.sep):
+                return f'volumes/{index}/{name}'
+        return name
+
+    def url(self, name):
+        return super().url(self.served_name(name) if name else name)
+
+    def place(self, source, name):
+        """Move the file at ``source`` to where ``name`` belongs; returns the new path.
+
+        Replaces any file already there. Across volumes the bytes are
+        copied to a temporary name first, so readers never see a
+        partially written file.
+        """
+        target = self.locations(name)[0]
+        with storage_io():
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                os.replace(source, target)
+            except OSError as exc:
+                if exc.errno != errno.EXDEV:
+                    raise
+                partial = f'{target}.{uuid.uuid4().hex}.partial'
+                try:
+                    shutil.copyfile(source, partial)
+                    shutil.copystat(source, partial)
+                    os.replace(partial, target)
+                except BaseException:
+                    if os.path.exists(partial):
+                        os.remove(partial)
+                    raise
+                os.remove(source)
+        return target
@@ -0,0 +1,261 @@
+# backend/api/thumbnails.py
+"""
+Thumbnail and preview pipeline.
+
+Renditions are keyed by blob, so identical uploads share them, and are
+written next to the blob (``blobs/ab/cd/<digest>.thumb-128.jpg``). Each
+is a ``Derivative`` row that moves from pending to processing to ready
+or failed; failures are retried with exponential backoff up to
+``THUMBNAIL_MAX_ATTEMPTS``. Rendering itself (:mod:`api.imaging`) never
+touches the database.
+
+``THUMBNAIL_BACKEND`` decides where new uploads are rendered:
+
+* ``process``: a local process pool. At most ``THUMBNAIL_MAX_IN_FLIGHT``
+  blobs are queued in it; beyond that work stays pending in the
+  database, which is the backpressure.
+* ``queue``: nothing runs in the web process; ``manage.py
+  process_thumbnails`` workers claim pending rows.
+* ``inline``: rendered synchronously after the upload commits.
+
+Whatever the backend, a request for a missing rendition renders it on
+demand.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.db import connections, models, transaction
+from django.utils import timezone
+
+from . import imaging
+from .models import Derivative
+
+logger = logging.getLogger(__name__)
+
+
+def thumbnail_kind(size):
+    return f'thumb-{size}'
+
+
+def kinds_for(mime_type):
+    """Derivative kinds produced for a MIME type; empty if unsupported."""
+    thumbnails = [thumbnail_kind(size) for size in settings.THUMBNAIL_SIZES]
+    if mime_type in imaging.IMAGE_TYPES:
+        return thumbnails
+    if mime_type in imaging.PDF_TYPES and imaging.pdf_renderer():
+        return [imaging.PREVIEW] + thumbnails
+    return []
+
+
+def due_q(now):
+    """Derivatives that should be (re)rendered now."""
+    stale = now - settings.THUMBNAIL_CLAIM_TIMEOUT
+    return (
+        models.Q(status=Derivative.STATUS_PENDING)
+        | models.Q(
+            status=Derivative.STATUS_FAILED,
+            attempts__lt=settings.THUMBNAIL_MAX_ATTEMPTS,
+            next_attempt_at__lte=now,
+        )
+        # Claimed by a worker that died before finishing
+        | models.Q(status=Derivative.STATUS_PROCESSING, updated_at__lt=stale)
+    )
+
+
+def claim(blob_id):
+    """Mark a blob's due derivatives as processing; returns those claimed.
+
+    Each row is claimed with a conditional UPDATE, so two workers never
+    render the same derivative.
+    """
+    now = timezone.now()
+    claimed = []
+    for derivative in Derivative.objects.filter(due_q(now), blob_id=blob_id).select_related('blob'):
+        if Derivative.objects.filter(
+            pk=derivative.pk, status=derivative.status, attempts=derivative.attempts
+        ).update(status=Derivative.STATUS_PROCESSING, attempts=models.F('attempts') + 1, updated_at=now):
+            derivative.attempts += 1
+            claimed.append(derivative)
+    return claimed
+
+
+def job_for(derivatives):
+    """Arguments for imaging.render_all covering ``derivatives`` of one blob."""
+    blob = derivatives[0].blob
+    targets = [(d.kind, default_storage.path(d.name)) for d in derivatives]
+    return default_storage.path(blob.name), derivatives[0].mime_type, targets
+
+
+def record(derivatives, results):
+    """Store the outcome of a render job."""
+    now = timezone.now()
+    for derivative in derivatives:
+        outcome = results.get(derivative.kind, 'Not rendered')
+        if isinstance(outcome, int):
+            Derivative.objects.filter(pk=derivative.pk).update(
+                status=Derivative.STATUS_READY, size=outcome, error='', next_attempt_at=None, updated_at=now
+            )
+            continue
+        delay = settings.THUMBNAIL_RETRY_DELAY * 2 ** (derivative.attempts - 1)
+        Derivative.objects.filter(pk=derivative.pk).update(
+            status=Derivative.STATUS_FAILED, error=outcome, next_attempt_at=now + delay, updated_at=now
+        )
+        logger.warning('Rendering %s failed (attempt %d): %s', derivative, derivative.attempts, outcome)
+
+
+def future_results(derivatives, future):
+    """Results of a render job run in a pool; a crashed worker fails every kind."""
+    exc = future.exception()
+    if exc is None:
+        return future.result()
+    return {d.kind: f'{type(exc).__name__}: {exc}' for d in derivatives}
+
+
+def spawn_pool(workers):
+    # spawn: the workers only import api.imaging, never Django
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def process_blob(blob_id):
+    """Claim and render a blob's due derivatives in this process."""
+    derivatives = claim(blob_id)
+    if derivatives:
+        record(derivatives, imaging.render_all(*job_for(derivatives)))
+    return len(derivatives)
+
+
+class InlineBackend:
+    def submit(self, blob_id):
+        process_blob(blob_id)
+
+
+class QueueBackend:
+    def submit(self, blob_id):
+        # Rows are already pending; process_thumbnails workers pick them up
+        pass
+
+
+class ProcessPoolBackend:
+    """Local process pool with a bound on queued jobs."""
+
+    def __init__(self, workers, max_in_flight):
+        self.workers = workers
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = spawn_pool(self.workers)
+            return self.executor
+
+    def submit(self, blob_id):
+        if not self.slots.acquire(blocking=False):
+            # Saturated: leave the work pending rather than queue without bound
+            return
+        try:
+            derivatives = claim(blob_id)
+            if not derivatives:
+                self.slots.release()
+                return
+            future = self.get_executor().submit(imaging.render_all, *job_for(derivatives))
+        except Exception as exc:
+            self.slots.release()
+            if isinstance(exc, BrokenExecutor):
+                # A worker died; start a fresh pool next time
+                with self.lock:
+                    self.executor = None
+            raise
+        future.add_done_callback(lambda done: self.finish(derivatives, done))
+
+    def finish(self, derivatives, future):
+        try:
+            record(derivatives, future_results(derivatives, future))
+        except Exception:
+            logger.exception('Could not record thumbnail results')
+        finally:
+            self.slots.release()
+            # Runs on the executor's thread, which has its own connection
+            connections.close_all()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """The backend selected by THUMBNAIL_BACKEND (one pool per process)."""
+    global _backend
+    name = settings.THUMBNAIL_BACKEND
+    with _backend_lock:
+        if _backend is None or _backend[0] != name:
+            if name == 'process':
+                backend = ProcessPoolBackend(settings.THUMBNAIL_WORKERS, settings.THUMBNAIL_MAX_IN_FLIGHT)
+            elif name == 'queue':
+                backend = QueueBackend()
+            elif name == 'inline':
+                backend = InlineBackend()
+            else:
+                raise ImproperlyConfigured(
+                    f"Unknown THUMBNAIL_BACKEND {name!r}; choose one of process, queue, inline."
+                )
+            _backend = (name, backend)
+        return _backend[1]
+
+
+def ensure_derivatives(file_obj):
+    """Create pending rows for the renditions a file should have."""
+    kinds = kinds_for(file_obj.mime_type)
+    if not file_obj.blob_id or not kinds:
+        return False
+    Derivative.objects.bulk_create(
+        [Derivative(blob_id=file_obj.blob_id, kind=kind, mime_type=file_obj.mime_type) for kind in kinds],
+        ignore_conflicts=True,
+    )
+    return True
+
+
+def schedule(file_obj):
+    """Queue renditions for a newly stored file once the transaction commits."""
+    def submit():
+        try:
+            if ensure_derivatives(file_obj):
+                get_backend().submit(file_obj.blob_id)
+        except Exception:
+            # Never fail an upload over a thumbnail; on-demand rendering covers it
+            logger.exception('Could not schedule thumbnails for file %s', file_obj.pk)
+    transaction.on_commit(submit)
+
+
+def get_rendition(file_obj, kind):
+    """The ready Derivative for ``kind``, rendering it now on a cache miss.
+
+    Returns None if the file has no such rendition (unsupported type or
+    permanently failed) and the Derivative, possibly not yet ready, if
+    another worker is rendering it.
+    """
+    if kind not in kinds_for(file_obj.mime_type) or not file_obj.blob_id:
+        return None
+    lookup = {'blob_id': file_obj.blob_id, 'kind': kind}
+    derivative = Derivative.objects.select_related('blob').filter(**lookup).first()
+    if derivative is None:
+        ensure_derivatives(file_obj)
+    elif derivative.status == Derivative.STATUS_READY:
+        if default_storage.exists(derivative.name):
+            return derivative
+        # The rendered file went missing; render it again
+        Derivative.objects.filter(pk=derivative.pk).update(
+            status=Derivative.STATUS_PENDING, attempts=0, updated_at=timezone.now()
+        )
+
+    process_blob(file_obj.blob_id)
+    derivative = Derivative.objects.select_related('blob').get(**lookup)
+    if derivative.status == Derivative.STATUS_FAILED and derivative.attempts >= settings.THUMBNAIL_MAX_ATTEMPTS:
+        return None
+    return derivative
@@ -0,0 +1,19 @@
+# backend/api/transfer_urls.py
+"""
+URLs for requests served by ``TransferASGIHandler``.
+
+The async transfer views take precedence over the API views at the same
+paths; everything else falls through to ROOT_URLCONF.
+"""
+from django.conf import settings
+from django.urls import include, path
+
+from . import transfers
+
+urlpatterns = [
+    path('api/files/<int:pk>/download/', transfers.download),
+    path('api/files/shared/<str:token>/', transfers.shared_file),
+    path('api/uploads/<uuid:pk>/chunks/<int:index>/', transfers.upload_chunk),
+    path('api/changes/', transfers.changes),
+    path('', include(settings.ROOT_URLCONF)),
+]
@@ -0,0 +1,245 @@
+# backend/api/transfers.py
+"""
+Async file transfers for ASGI deployments.
+
+Under ASGI, Django reads a whole request body into a temporary file
+before calling the view, and sends a response with a blocking iterator
+by first reading all of it into memory. ``TransferASGIHandler`` routes
+downloads, share-link downloads and upload chunks to the async views in
+this module instead, along with long-polls of the change feed, which
+wait without holding a thread:
+
+* file blocks are read in worker threads and each is read only once the
+  previous one has been sent, so a slow client holds neither a thread
+  nor more than a block of memory;
+* chunk bodies are pulled from the connection one message at a time and
+  each is written to disk before the next is received, so the server
+  stops reading from a client that sends faster than the disk writes.
+
+Everything else, and every request under WSGI, is served by the regular
+API views. Authentication runs the API's (synchronous) DRF
+authentication classes in a thread.
+"""
+import io
+
+from asgiref.sync import sync_to_async
+from django.core import signals
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIHandler, get_script_prefix
+from django.http import Http404, JsonResponse
+from django.urls import Resolver404, resolve, set_script_prefix
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods, require_safe
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import changefeed, sharecache, views
+from .downloads import serve_file
+from .metrics import storage_io
+from .models import File, UploadSession
+
+TRANSFER_URLCONF = 'api.transfer_urls'
+
+
+def stream_request_body(view):
+    """Mark a view that receives its request body from the connection itself."""
+    view.stream_request_body = True
+    return view
+
+
+def get_authenticators():
+    return [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+
+
+def authenticate(request):
+    """The user making ``request``, as the API would authenticate them."""
+    user = Request(request, authenticators=get_authenticators()).user
+    if not user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    return user
+
+
+def in_thread(func, *args):
+    """Run blocking file IO in a worker thread."""
+    return sync_to_async(func, thread_sensitive=False)(*args)
+
+
+def write_through(fh, block):
+    with storage_io():
+        fh.write(block)
+        fh.flush()
+
+
+def api_error(request, exc):
+    """Render a DRF exception the way the API's exception handler does."""
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = JsonResponse(data, status=exc.status_code, safe=False)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        response['WWW-Authenticate'] = get_authenticators()[0].authenticate_header(request)
+    return response
+
+
+async def receive_chunk(request, session, index):
+    """Write a chunk of ``session`` from the request body; returns bytes written.
+
+    Bytes beyond the chunk's length are read and ignored, like the
+    synchronous upload view does.
+    """
+    receive = getattr(request, 'receive', None)
+    if receive is None:
+        # Not served by TransferASGIHandler, so the body is already buffered
+        return await sync_to_async(session.write_chunk)(index, request)
+
+    remaining = session.chunk_length(index)
+    written = 0
+    fh = await in_thread(open, default_storage.path(session.path), 'r+b')
+    try:
+        fh.seek(index * session.chunk_size)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            block = message.get('body', b'')[:remaining]
+            if block:
+                await in_thread(write_through, fh, block)
+                written += len(block)
+                remaining -= len(block)
+            if not message.get('more_body', False):
+                break
+    finally:
+        await in_thread(fh.close)
+    return written
+
+
+@csrf_exempt
+@require_safe
+async def download(request, pk):
+    """Download a file (``/api/files/<pk>/download/``)."""
+    try:
+        user = await sync_to_async(authenticate)(request)
+        file_obj = await File.objects.select_related('blob').filter(
+            pk=pk, owner=user, is_deleted=False
+        ).afirst()
+        if file_obj is None:
+            raise exceptions.NotFound()
+        return await sync_to_async(serve_file)(request, file_obj, asynchronous=True)
+    except Http404:
+        return api_error(request, exceptions.NotFound())
+    except exceptions.APIException as exc:
+        return api_error(request, exc)
+
+
+@csrf_exempt
+@require_safe
+async def shared_file(request, token):
+    """Download a shared file; metadata requests go to the API view."""
+    if request.GET.get('download') != 'true':
+        return await sync_to_async(views.shared_file)(request, token)
+    try:
+        file_obj = await sharecache.shares.aget(token)
+        if file_obj is None:
+            raise exceptions.NotFound()
+        return await sync_to_async(serve_file)(request, file_obj, asynchronous=True, cache_content=True)
+    except Http404:
+        return api_error(request, exceptions.NotFound())
+
+
+@stream_request_body
+@csrf_exempt
+@require_http_methods(['PUT'])
+async def upload_chunk(request, pk, index):
+    """Write one chunk of an upload session (``/api/uploads/<pk>/chunks/<index>/``)."""
+    try:
+        user = await sync_to_async(authenticate)(request)
+    except exceptions.APIException as exc:
+        return api_error(request, exc)
+
+    session = await UploadSession.objects.filter(
+        pk=pk, owner=user, status=UploadSession.STATUS_ACTIVE
+    ).afirst()
+    if session is None:
+        return api_error(request, exceptions.NotFound())
+    if session.is_expired():
+        await sync_to_async(session.expire)()
+        return JsonResponse({'error': 'Upload session expired'}, status=410)
+    if index >= session.total_chunks:
+        return JsonResponse(
+            {'error': f"Chunk index out of range (0-{session.total_chunks - 1})."}, status=400
+        )
+
+    expected = session.chunk_length(index)
+    written = await receive_chunk(request, session, index)
+    if written != expected:
+        return JsonResponse(
+            {'error': f"Incomplete chunk: expected {expected} bytes, got {written}."}, status=400
+        )
+
+    await sync_to_async(session.record_chunk)(index, written)
+    return JsonResponse({'index': index, 'size': written})
+
+
+@csrf_exempt
+@require_safe
+async def changes(request):
+    """Changes after ``since`` (``/api/changes/``), waiting up to ``wait`` seconds for some."""
+    try:
+        user = await sync_to_async(authenticate)(request)
+        since, limit, wait = changefeed.parse_params(request.GET)
+    except exceptions.APIException as exc:
+        return api_error(request, exc)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    if since is None:
+        return JsonResponse({'cursor': await sync_to_async(changefeed.current_cursor)(user)})
+
+    if wait:
+        await changefeed.await_changes(user, since, wait)
+    try:
+        data = await sync_to_async(changefeed.get_changes)(request, user, since, limit)
+    except changefeed.CursorExpired as exc:
+        return JsonResponse({'error': str(exc), 'cursor': exc.cursor}, status=410)
+    return JsonResponse(data)
+
+
+class TransferASGIHandler(ASGIHandler):
+    """ASGI handler that serves transfers with the async views above.
+
+    Requests resolve against ``api.transfer_urls``, which falls back to
+    ROOT_URLCONF. A request for a view marked with
+    ``stream_request_body`` is dispatched without reading its body
+    first, and the view gets the ASGI ``receive`` callable as
+    ``request.receive``.
+    """
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = TRANSFER_URLCONF
+        return request, error_response
+
+    def streaming_request(self, scope):
+        """The request, if it is for a view that streams its own body."""
+        if scope['method'] not in ('POST', 'PUT', 'PATCH'):
+            return None
+        request, error_response = self.create_request(scope, io.BytesIO())
+        if request is None:
+            return None
+        try:
+            match = resolve(request.path_info, urlconf=TRANSFER_URLCONF)
+        except Resolver404:
+            return None
+        return request if getattr(match.func, 'stream_request_body', False) else None
+
+    async def handle(self, scope, receive, send):
+        request = self.streaming_request(scope)
+        if request is None:
+            return await super().handle(scope, receive, send)
+
+        # The view owns receive(), so there is no disconnect listener
+        # racing it; a disconnect reaches the view as a message instead.
+        set_script_prefix(get_script_prefix(scope))
+        await signals.request_started.asend(sender=self.__class__, scope=scope)
+        request.receive = receive
+        response = await self.run_get_response(request)
+        await self.send_response(response, send)
@@ -2,11 +2,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenRefreshView
-from . import views
+from . import metrics, views
 
 router = DefaultRouter()
 router.register(r'folders', views.FolderViewSet, basename='folder')
 router.register(r'files', views.FileViewSet, basename='file')
+router.register(r'uploads', views.UploadSessionViewSet, basename='upload')
 
 urlpatterns = [
     # Authentication
@@ -21,6 +22,18 @@ urlpatterns = [
     # Search
     path('search/', views.search_files, name='search_files'),
     
+    # Delta sync
+    path('changes/', views.changes, name='changes'),
+
+    # Batch operations
+    path('bulk/move/', views.bulk_move, name='bulk_move'),
+    path('bulk/delete/', views.bulk_delete, name='bulk_delete'),
+    path('bulk/restore/', views.bulk_restore, name='bulk_restore'),
+    path('bulk/share/', views.bulk_share, name='bulk_share'),
+    
+    # Prometheus metrics (PROFILING_ENABLED)
+    path('metrics/', metrics.metrics_view, name='metrics'),
+
     # Shared files
     path('files/shared/<str:token>/', views.shared_file, name='shared_file'),
     
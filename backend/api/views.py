@@ -1,22 +1,41 @@
 # backend/api/views.py
-from rest_framework import viewsets, status, permissions
+from rest_framework import viewsets, mixins, status, permissions
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
+from django.core.files.storage import default_storage
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from django.http import FileResponse, Http404
 from django.utils import timezone
-from django.db.models import Q
-from .models import File, Folder, UserStorage
+from django.db import transaction
+from django.db.models import Max, Sum
+from .models import Blob, Change, ChangeLog, Derivative, File, Folder, TrashPurge, UserStorage, UploadSession
 from .serializers import (
     UserSerializer, RegisterSerializer, FileSerializer,
-    FileUploadSerializer, FolderSerializer, UserStorageSerializer
+    FileUploadSerializer, FileFromHashSerializer, FolderSerializer,
+    UserStorageSerializer, UploadSessionSerializer, SHA256_PATTERN
 )
+from .authentication import full_user, tokens_for
 from .permissions import IsOwner, IsOwnerOrShared
+from .blobs import ChecksumMismatch, find_blob, store_path
+from . import bulk, changefeed, copies, purge, sharecache, thumbnails
+from .archives import archive_response, file_entries, folder_entries
+from .downloads import serve_derivative, serve_file
+from .pagination import KeysetPagination, TrashPagination
+from . import search
 import os
+import re
+
+RECENT_PAGE_SIZE = 20
+SEARCH_PAGE_SIZE = 50
+SEARCH_MAX_PAGE_SIZE = 200
+ARCHIVE_MAX_FILES = 1000
+BULK_MAX_ITEMS = 10000
 
 
 @api_view(['POST'])
@@ -26,13 +45,9 @@ def register(request):
     serializer = RegisterSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.save()
-        refresh = RefreshToken.for_user(user)
         return Response({
             'user': UserSerializer(user).data,
-            'tokens': {
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-            }
+            'tokens': tokens_for(user),
         }, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -46,13 +61,9 @@ def login(request):
     
     user = authenticate(username=username, password=password)
     if user:
-        refresh = RefreshToken.for_user(user)
         return Response({
             'user': UserSerializer(user).data,
-            'tokens': {
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-            }
+            'tokens': tokens_for(user),
         })
     return Response(
         {'error': 'Invalid credentials'},
@@ -64,10 +75,32 @@ def login(request):
 @permission_classes([IsAuthenticated])
 def current_user(request):
     """Get current user information."""
-    serializer = UserSerializer(request.user)
+    serializer = UserSerializer(full_user(request.user))
     return Response(serializer.data)
 
 
+def copy_destination(request, key, default):
+    """The folder named by ``key`` in the request body (null for the top level), else ``default``."""
+    if key not in request.data:
+        return default
+    destination = request.data[key]
+    if destination is None:
+        return None
+    if not str(destination).isdigit():
+        raise ValidationError({key: ['Expected a folder id or null.']})
+    return get_object_or_404(Folder, pk=destination, owner=request.user, is_deleted=False)
+
+
+def requested_name(request):
+    """The optional ``name`` for a copy; raises ValidationError if malformed."""
+    name = request.data.get('name')
+    if name is None:
+        return None
+    if not isinstance(name, str) or not name.strip() or len(name) > 255:
+        raise ValidationError({'name': ['Expected a name of 1-255 characters.']})
+    return name.strip()
+
+
 class FolderViewSet(viewsets.ModelViewSet):
     """ViewSet for Folder operations."""
     serializer_class = FolderSerializer
@@ -78,29 +111,102 @@ class FolderViewSet(viewsets.ModelViewSet):
         return Folder.objects.filter(
             owner=self.request.user,
             is_deleted=False
-        )
+        ).for_listing()
 
     def perform_create(self, serializer):
-        """Set owner when creating folder."""
-        serializer.save(owner=self.request.user)
+        """Set owner and update folder count when creating folder."""
+        with transaction.atomic():
+            serializer.save(owner=self.request.user)
+            UserStorage.adjust(self.request.user, folders=1)
 
     def perform_destroy(self, instance):
-        """Soft delete folder."""
-        instance.is_deleted = True
-        instance.deleted_at = timezone.now()
-        instance.save()
+        """Soft delete folder with its whole subtree and update storage."""
+        with transaction.atomic():
+            folders, files, size = instance.trash_subtree()
+            UserStorage.adjust(self.request.user, space=-size, files=-files, folders=-folders)
+
+    @action(detail=True, methods=['post'])
+    def restore(self, request, pk=None):
+        """Restore a deleted folder and everything deleted along with it."""
+        folder = get_object_or_404(
+            Folder,
+            pk=pk,
+            owner=request.user,
+            is_deleted=True
+        )
+        folders, files = folder.get_trashed_with()
+        size = files.aggregate(total=Sum('size'))['total'] or 0
+
+        storage, created = UserStorage.objects.get_or_create(user=request.user)
+        if not storage.reserve(size):
+            return Response(
+                {'error': f"Not enough storage space. You have {storage.available_space()} bytes available."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        with transaction.atomic():
+            if folder.parent_id and Folder.objects.filter(pk=folder.parent_id, is_deleted=True).exists():
+                # The parent is still in the trash, so bring the folder back at the top level
+                folder.parent = None
+                folder.save()
+            folder_count, file_count = folder.restore_subtree()
+            UserStorage.adjust(
+                request.user,
+                space=size if file_count else 0,
+                files=file_count,
+                folders=folder_count,
+                reserved=-size
+            )
+
+        return Response(FolderSerializer(folder).data)
+
+    @action(detail=True, methods=['post'])
+    def copy(self, request, pk=None):
+        """Copy the folder and everything in it under ``parent`` (default: beside it).
+
+        The copy is named ``name``, or "<name> (copy)" when not given.
+        """
+        folder = self.get_object()
+        parent = copy_destination(request, 'parent', folder.parent)
+        name = requested_name(request)
+        try:
+            copy = copies.copy_folder(request.user, folder, parent, name)
+        except (bulk.InsufficientStorage, copies.NameTaken) as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(FolderSerializer(Folder.objects.for_listing().get(pk=copy.pk)).data,
+                        status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def tree(self, request, pk=None):
+        """Get every folder below this one, ordered by path."""
+        folder = self.get_object()
+        descendants = folder.get_descendants().filter(is_deleted=False).for_listing().order_by('full_path')
+        return Response(FolderSerializer(descendants, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def archive(self, request, pk=None):
+        """Download the folder and everything in it as a ZIP."""
+        folder = self.get_object()
+        compress = request.query_params.get('compress') != '0'
+        return archive_response(folder_entries(folder, compress), f'{folder.name}.zip')
 
     @action(detail=True, methods=['get'])
     def contents(self, request, pk=None):
-        """Get all files and subfolders in a folder."""
+        """Get the subfolders and a page of files in a folder.
+
+        ``next`` links to the following page of files, if any.
+        """
         folder = self.get_object()
-        files = File.objects.filter(folder=folder, is_deleted=False)
-        subfolders = Folder.objects.filter(parent=folder, is_deleted=False)
+        paginator = KeysetPagination()
+        files = paginator.paginate_queryset(
+            File.objects.filter(folder=folder, is_deleted=False).for_listing(), request, view=self
+        )
+        subfolders = Folder.objects.filter(parent=folder, is_deleted=False).for_listing()
         
         return Response({
             'folder': FolderSerializer(folder).data,
             'files': FileSerializer(files, many=True, context={'request': request}).data,
-            'subfolders': FolderSerializer(subfolders, many=True).data
+            'subfolders': FolderSerializer(subfolders, many=True).data,
+            'next': paginator.get_next_link()
         })
 
 
@@ -113,7 +219,7 @@ class FileViewSet(viewsets.ModelViewSet):
         return File.objects.filter(
             owner=self.request.user,
             is_deleted=False
-        )
+        ).for_listing()
 
     def get_serializer_class(self):
         """Use different serializer for upload."""
@@ -122,37 +228,165 @@ class FileViewSet(viewsets.ModelViewSet):
         return FileSerializer
 
     def perform_create(self, serializer):
-        """Set owner and update storage when creating file."""
-        file_instance = serializer.save(owner=self.request.user)
-        
-        # Update user storage
+        """Reserve quota, store the file, then commit the reservation."""
+        size = serializer.validated_data['file'].size
         storage, created = UserStorage.objects.get_or_create(user=self.request.user)
-        storage.update_usage()
+        if not storage.reserve(size):
+            raise ValidationError({'file': [
+                f"Not enough storage space. You have {storage.available_space()} bytes available."
+            ]})
+        try:
+            with transaction.atomic():
+                file_obj = serializer.save(owner=self.request.user)
+                UserStorage.adjust(self.request.user, space=size, files=1, reserved=-size)
+                thumbnails.schedule(file_obj)
+        except Exception:
+            storage.release(size)
+            raise
 
     def perform_destroy(self, instance):
         """Soft delete file and update storage."""
-        instance.is_deleted = True
-        instance.deleted_at = timezone.now()
-        instance.save()
-        
-        # Update user storage
-        storage, created = UserStorage.objects.get_or_create(user=instance.owner)
-        storage.update_usage()
+        with transaction.atomic():
+            # Conditional update so concurrent deletes only count once
+            deleted = File.objects.filter(pk=instance.pk, is_deleted=False).update(
+                is_deleted=True,
+                deleted_at=timezone.now()
+            )
+            if deleted:
+                UserStorage.adjust(self.request.user, space=-instance.size, files=-1)
+                ChangeLog.record(self.request.user.pk, Change.FILE, [instance.pk], Change.TRASH)
 
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
         """Download a file."""
         file_obj = self.get_object()
-        
-        if not os.path.exists(file_obj.file.path):
-            raise Http404("File not found")
-        
-        response = FileResponse(
-            open(file_obj.file.path, 'rb'),
-            content_type=file_obj.mime_type
-        )
-        response['Content-Disposition'] = f'attachment; filename="{file_obj.name}"'
-        return response
+        return serve_file(request, file_obj)
+
+    @action(detail=True, methods=['post'])
+    def copy(self, request, pk=None):
+        """Copy a file into ``folder`` (default: its own folder), optionally as ``name``.
+
+        The copy shares the original's stored bytes.
+        """
+        file_obj = self.get_object()
+        folder = copy_destination(request, 'folder', file_obj.folder)
+        try:
+            copy = copies.copy_file(request.user, file_obj, folder, requested_name(request))
+        except bulk.InsufficientStorage as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        except File.DoesNotExist:
+            raise Http404('File not found')
+        serializer = FileSerializer(File.objects.for_listing().get(pk=copy.pk), context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'])
+    def precheck(self, request):
+        """Whether content with ``sha256`` and ``size`` is already stored.
+
+        200 means the file can be created with ``from_hash`` instead of
+        being uploaded; 404 means it has to be uploaded. HEAD works too.
+        """
+        sha256 = request.query_params.get('sha256', '')
+        size = request.query_params.get('size', '')
+        if not re.match(SHA256_PATTERN, sha256) or not size.isdigit():
+            return Response(
+                {'error': 'sha256 (hex digest) and size are required.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if find_blob(request.user, sha256, int(size)) is None:
+            return Response({'exists': False}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'exists': True})
+
+    @action(detail=False, methods=['post'])
+    def from_hash(self, request):
+        """Create a file from content already stored, without uploading it."""
+        serializer = FileFromHashSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        blob = find_blob(request.user, data['sha256'], data['size'])
+        if blob is None:
+            return Response(
+                {'error': 'Content not found; upload the file instead.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        storage, created = UserStorage.objects.get_or_create(user=request.user)
+        if not storage.reserve(blob.size):
+            return Response(
+                {'error': f"Not enough storage space. You have {storage.available_space()} bytes available."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            with transaction.atomic():
+                if not Blob.objects.acquire(blob):
+                    storage.release(blob.size)
+                    return Response(
+                        {'error': 'Content not found; upload the file instead.'},
+                        status=status.HTTP_404_NOT_FOUND
+                    )
+                file_obj = File.objects.create(
+                    name=data['name'],
+                    owner=request.user,
+                    folder=data.get('folder'),
+                    file=blob.name,
+                    blob=blob,
+                    size=blob.size
+                )
+                UserStorage.adjust(request.user, space=blob.size, files=1, reserved=-blob.size)
+                thumbnails.schedule(file_obj)
+        except Exception:
+            storage.release(blob.size)
+            raise
+
+        serializer = FileSerializer(file_obj, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get', 'post'])
+    def archive(self, request):
+        """Download selected files as a ZIP.
+
+        Takes ``ids`` as a comma-separated query parameter or, for POST,
+        a list in the body; ``compress=0`` stores every entry so the
+        response has a Content-Length.
+        """
+        ids = request.data.get('ids') if request.method == 'POST' else request.query_params.get('ids')
+        if isinstance(ids, str):
+            ids = ids.split(',')
+        try:
+            ids = {int(pk) for pk in ids or []}
+        except (TypeError, ValueError):
+            return Response({'error': 'ids must be a list of file ids.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not ids or len(ids) > ARCHIVE_MAX_FILES:
+            return Response(
+                {'error': f'Select between 1 and {ARCHIVE_MAX_FILES} files.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        files = self.get_queryset().filter(pk__in=ids)
+        if not files.exists():
+            return Response({'error': 'No files found.'}, status=status.HTTP_404_NOT_FOUND)
+        compress = str(request.query_params.get('compress', request.data.get('compress', ''))) != '0'
+        return archive_response(file_entries(files, compress), 'files.zip')
+
+    @action(detail=True, methods=['get'])
+    def thumbnail(self, request, pk=None):
+        """Get a thumbnail (``size`` in THUMBNAIL_SIZES) or, for PDFs, ``size=preview``."""
+        file_obj = self.get_object()
+        size = request.query_params.get('size', str(settings.THUMBNAIL_SIZES[0]))
+        kind = 'preview' if size == 'preview' else thumbnails.thumbnail_kind(size)
+        if size != 'preview' and size not in {str(s) for s in settings.THUMBNAIL_SIZES}:
+            return Response(
+                {'error': f"size must be one of {', '.join(map(str, settings.THUMBNAIL_SIZES))} or preview."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        derivative = thumbnails.get_rendition(file_obj, kind)
+        if derivative is None or derivative.status == Derivative.STATUS_FAILED:
+            raise Http404('No thumbnail available')
+        if derivative.status != Derivative.STATUS_READY:
+            # Another worker is rendering it right now
+            return Response(status=status.HTTP_202_ACCEPTED, headers={'Retry-After': '2'})
+        return serve_derivative(request, derivative)
 
     @action(detail=True, methods=['post'])
     def share(self, request, pk=None):
@@ -178,20 +412,35 @@ class FileViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def recent(self, request):
-        """Get recently uploaded files."""
-        files = self.get_queryset().order_by('-created_at')[:20]
+        """Get recently uploaded files, newest first."""
+        self.paginator.page_size = RECENT_PAGE_SIZE
+        files = self.paginate_queryset(self.get_queryset())
         serializer = FileSerializer(files, many=True, context={'request': request})
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def trash(self, request):
-        """Get deleted files."""
-        files = File.objects.filter(
-            owner=request.user,
-            is_deleted=True
-        ).order_by('-deleted_at')
+        """Get deleted files, most recently deleted first."""
+        files = File.objects.filter(owner=request.user, is_deleted=True)
+        emptied_at = TrashPurge.objects.filter(owner=request.user).aggregate(cutoff=Max('cutoff'))['cutoff']
+        if emptied_at:
+            # Still being purged in the background
+            files = files.filter(deleted_at__gt=emptied_at)
+        paginator = TrashPagination()
+        files = paginator.paginate_queryset(files.for_listing(), request, view=self)
         serializer = FileSerializer(files, many=True, context={'request': request})
-        return Response(serializer.data)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['post'], url_path='trash/empty')
+    def empty_trash(self, request):
+        """Permanently delete everything in the trash.
+
+        The work is queued; the trash reads as empty straight away.
+        """
+        files = File.objects.filter(owner=request.user, is_deleted=True).count()
+        with transaction.atomic():
+            purge.empty_trash(request.user)
+        return Response({'files': files}, status=status.HTTP_202_ACCEPTED)
 
     @action(detail=True, methods=['post'])
     def restore(self, request, pk=None):
@@ -202,14 +451,28 @@ class FileViewSet(viewsets.ModelViewSet):
             owner=request.user,
             is_deleted=True
         )
-        file_obj.is_deleted = False
-        file_obj.deleted_at = None
-        file_obj.save()
-        
-        # Update user storage
         storage, created = UserStorage.objects.get_or_create(user=request.user)
-        storage.update_usage()
-        
+        if not storage.reserve(file_obj.size):
+            return Response(
+                {'error': f"Not enough storage space. You have {storage.available_space()} bytes available."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        with transaction.atomic():
+            restored = File.objects.filter(pk=file_obj.pk, is_deleted=True).update(
+                is_deleted=False,
+                deleted_at=None,
+                updated_at=timezone.now()
+            )
+            UserStorage.adjust(
+                request.user,
+                space=file_obj.size if restored else 0,
+                files=1 if restored else 0,
+                reserved=-file_obj.size
+            )
+            if restored:
+                ChangeLog.record(request.user.pk, Change.FILE, [file_obj.pk], Change.RESTORE)
+        file_obj.refresh_from_db()
+
         serializer = FileSerializer(file_obj, context={'request': request})
         return Response(serializer.data)
 
@@ -222,31 +485,163 @@ class FileViewSet(viewsets.ModelViewSet):
             owner=request.user,
             is_deleted=True
         )
+        # Trashed files no longer count towards usage, so storage is unchanged
         file_obj.delete()
-        
-        # Update user storage
-        storage, created = UserStorage.objects.get_or_create(user=request.user)
-        storage.update_usage()
-        
+
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class UploadSessionViewSet(mixins.CreateModelMixin,
+                          mixins.RetrieveModelMixin,
+                          mixins.DestroyModelMixin,
+                          viewsets.GenericViewSet):
+    """ViewSet for resumable, chunked uploads."""
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated, IsOwner]
+
+    def get_queryset(self):
+        """Return active upload sessions for current user only."""
+        return UploadSession.objects.filter(
+            owner=self.request.user,
+            status=UploadSession.STATUS_ACTIVE
+        )
+
+    def get_active_session(self):
+        """Fetch the session, expiring it if its TTL has elapsed."""
+        session = self.get_object()
+        if session.is_expired():
+            session.expire()
+            return None
+        return session
+
+    def create(self, request, *args, **kwargs):
+        """Start an upload session and reserve quota for the whole file."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        size = serializer.validated_data['size']
+
+        storage, created = UserStorage.objects.get_or_create(user=request.user)
+        if not storage.reserve(size):
+            return Response(
+                {'error': f"Not enough storage space. You have {storage.available_space()} bytes available."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        session = UploadSession(
+            owner=request.user,
+            chunk_size=settings.UPLOAD_CHUNK_SIZE,
+            expires_at=timezone.now() + settings.UPLOAD_SESSION_TTL,
+            **serializer.validated_data
+        )
+        # Staged next to the blob store so committing is a rename, not a copy
+        session.path = os.path.join('blobs', 'tmp', f'{session.id}.upload')
+        try:
+            session.allocate()
+            session.save()
+        except Exception:
+            session.discard()
+            storage.release(size)
+            raise
+
+        return Response(
+            self.get_serializer(session).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    def perform_destroy(self, instance):
+        """Abort the upload and release its reservation."""
+        instance.expire()
+
+    @action(detail=True, methods=['put'], url_path=r'chunks/(?P<index>\d+)')
+    def chunk(self, request, pk=None, index=None):
+        """Write one chunk of the file; re-sending a chunk is harmless."""
+        session = self.get_active_session()
+        if session is None:
+            return Response(
+                {'error': 'Upload session expired'},
+                status=status.HTTP_410_GONE
+            )
+
+        index = int(index)
+        if index >= session.total_chunks:
+            return Response(
+                {'error': f"Chunk index out of range (0-{session.total_chunks - 1})."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        expected = session.chunk_length(index)
+        written = session.write_chunk(index, request.stream) if request.stream else 0
+        if written != expected:
+            return Response(
+                {'error': f"Incomplete chunk: expected {expected} bytes, got {written}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        session.record_chunk(index, written)
+        return Response({'index': index, 'size': written})
+
+    @action(detail=True, methods=['post'])
+    def commit(self, request, pk=None):
+        """Turn a fully uploaded session into a File."""
+        session = self.get_active_session()
+        if session is None:
+            return Response(
+                {'error': 'Upload session expired'},
+                status=status.HTTP_410_GONE
+            )
+
+        received = set(session.chunks.values_list('index', flat=True))
+        missing = [i for i in range(session.total_chunks) if i not in received]
+        if missing:
+            return Response(
+                {'error': 'Upload incomplete', 'missing_chunks': missing},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            with transaction.atomic():
+                if not session.transition(UploadSession.STATUS_COMPLETE):
+                    return Response(
+                        {'error': 'Upload session already committed'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                # Chunks arrive out of order and possibly at different
+                # processes, so the assembled file is hashed here
+                blob = store_path(default_storage.path(session.path), session.sha256)
+                file_obj = File.objects.create(
+                    name=session.name,
+                    owner=request.user,
+                    folder=session.folder,
+                    file=blob.name,
+                    blob=blob,
+                    size=blob.size
+                )
+                session.file = file_obj
+                session.save(update_fields=['file', 'updated_at'])
+
+                # Convert the reservation into real usage
+                UserStorage.adjust(
+                    request.user, space=blob.size, files=1, reserved=-session.size
+                )
+                thumbnails.schedule(file_obj)
+        except ChecksumMismatch as exc:
+            # The session stays active so the client can re-send chunks
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = FileSerializer(file_obj, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def shared_file(request, token):
     """Access a shared file via token."""
-    file_obj = get_object_or_404(File, share_token=token, is_shared=True)
-    
+    file_obj = sharecache.shares.get(token)
+    if file_obj is None:
+        raise Http404('File not found')
+
     if request.GET.get('download') == 'true':
-        if not os.path.exists(file_obj.file.path):
-            raise Http404("File not found")
-        
-        response = FileResponse(
-            open(file_obj.file.path, 'rb'),
-            content_type=file_obj.mime_type
-        )
-        response['Content-Disposition'] = f'attachment; filename="{file_obj.name}"'
-        return response
+        return serve_file(request, file_obj, cache_content=True)
     
     serializer = FileSerializer(file_obj, context={'request': request})
     return Response(serializer.data)
@@ -255,27 +650,135 @@ def shared_file(request, token):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def search_files(request):
-    """Search files by name."""
-    query = request.GET.get('q', '')
+    """Search files by name, folder path and type.
+
+    Results are ranked and cursor-paginated; ``type``, ``folder``,
+    ``path``, ``created_after``/``created_before`` and
+    ``min_size``/``max_size`` narrow the search.
+    """
+    query = request.GET.get('q', '').strip()
     if not query:
-        return Response([])
-    
-    files = File.objects.filter(
-        Q(name__icontains=query) | Q(mime_type__icontains=query),
-        owner=request.user,
-        is_deleted=False
-    )
-    
+        return Response({'next': None, 'results': []})
+
+    try:
+        filters = search.parse_filters(request.GET, request.user)
+        page_size = min(int(request.GET.get('page_size', SEARCH_PAGE_SIZE)), SEARCH_MAX_PAGE_SIZE)
+        files, cursor = search.search(
+            request.user.id, query, filters, request.GET.get('cursor'), max(page_size, 1)
+        )
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    next_url = None
+    if cursor:
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', cursor)
+
     serializer = FileSerializer(files, many=True, context={'request': request})
-    return Response(serializer.data)
+    return Response({'next': next_url, 'results': serializer.data})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def changes(request):
+    """Changes to the user's files and folders after the ``since`` cursor.
+
+    Without ``since``, returns the current cursor only. ``limit`` caps
+    the batch; ``wait`` (seconds) blocks until there are changes. A 410
+    means the cursor is too old and the client has to list everything
+    again.
+    """
+    try:
+        since, limit, wait = changefeed.parse_params(request.GET)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    if since is None:
+        return Response({'cursor': changefeed.current_cursor(request.user)})
+
+    if wait:
+        changefeed.wait_for_changes(request.user, since, wait)
+    try:
+        return Response(changefeed.get_changes(request, request.user, since, limit))
+    except changefeed.CursorExpired as exc:
+        return Response({'error': str(exc), 'cursor': exc.cursor}, status=status.HTTP_410_GONE)
+
+
+def bulk_ids(request, key):
+    """A list of ids from the request body; raises ValidationError if malformed."""
+    ids = request.data.get(key) or []
+    if not isinstance(ids, list):
+        raise ValidationError({key: ['Expected a list of ids.']})
+    try:
+        return list(dict.fromkeys(int(pk) for pk in ids))
+    except (TypeError, ValueError):
+        raise ValidationError({key: ['Expected a list of ids.']})
+
+
+def bulk_request(request, folders=True):
+    """(file ids, folder ids) for a batch operation."""
+    file_ids = bulk_ids(request, 'files')
+    folder_ids = bulk_ids(request, 'folders') if folders else []
+    if not file_ids and not folder_ids:
+        raise ValidationError({'files': ['Select at least one item.']})
+    if len(file_ids) + len(folder_ids) > BULK_MAX_ITEMS:
+        raise ValidationError({'files': [f'At most {BULK_MAX_ITEMS} items per request.']})
+    return file_ids, folder_ids
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_move(request):
+    """Move files and folders into ``destination`` (null for the top level)."""
+    file_ids, folder_ids = bulk_request(request)
+    destination = request.data.get('destination')
+    if destination is not None:
+        if not str(destination).isdigit():
+            raise ValidationError({'destination': ['Expected a folder id or null.']})
+        destination = get_object_or_404(Folder, pk=destination, owner=request.user, is_deleted=False)
+    result = bulk.move(request.user, file_ids, folder_ids, destination)
+    return Response(result.as_dict())
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_delete(request):
+    """Move files and folders to the trash."""
+    file_ids, folder_ids = bulk_request(request)
+    return Response(bulk.trash(request.user, file_ids, folder_ids).as_dict())
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_restore(request):
+    """Restore files and folders from the trash."""
+    file_ids, folder_ids = bulk_request(request)
+    try:
+        result = bulk.restore(request.user, file_ids, folder_ids)
+    except bulk.InsufficientStorage as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(result.as_dict())
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_share(request):
+    """Enable share links for files, or disable them with ``"share": false``."""
+    file_ids, _ = bulk_request(request, folders=False)
+    result = bulk.share(request.user, file_ids, shared=request.data.get('share', True) is not False)
+    data = result.as_dict()
+    for item in data['files']:
+        if item.get('share_token'):
+            item['share_url'] = request.build_absolute_uri(f"/api/files/shared/{item['share_token']}/")
+    return Response(data)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def storage_info(request):
     """Get storage information for current user."""
-    storage, created = UserStorage.objects.get_or_create(user=request.user)
-    storage.update_usage()
-    
+    storage, created = UserStorage.objects.select_related('user').get_or_create(user=request.user)
+    if created:
+        # Users from before counters existed get theirs built once
+        storage.update_usage()
+
     serializer = UserStorageSerializer(storage)
     return Response(serializer.data)
\ No newline at end of file
@@ -0,0 +1,239 @@
+# backend/api/zipstream.py
+"""
+Streaming ZIP writer.
+
+Archives are produced entry by entry while the response is sent: each
+file is read in blocks, checksummed (and deflated) on the fly and
+followed by a data descriptor, so memory use does not grow with the
+size of the files and nothing is written to disk. When every entry is
+stored rather than deflated its size is known up front and
+``ZipStream.size()`` predicts the exact archive length. ZIP64 records
+are written only where the classic 32-bit fields would overflow.
+"""
+import struct
+import zlib
+
+from .metrics import storage_io
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+READ_BLOCK_SIZE = 64 * 1024
+
+STORED = 0
+DEFLATED = 8
+
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+
+VERSION = 20
+VERSION_ZIP64 = 45
+MADE_BY_UNIX = 3 << 8
+
+FILE_MODE = 0o100644 << 16
+DIR_MODE = (0o40755 << 16) | 0x10
+
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+DATA_DESCRIPTOR = struct.Struct('<IIII')
+DATA_DESCRIPTOR64 = struct.Struct('<IIQQ')
+END_RECORD = struct.Struct('<IHHHHIIH')
+END_RECORD64 = struct.Struct('<IQHHIIQQQQ')
+END_LOCATOR64 = struct.Struct('<IIQI')
+
+# Formats that gain nothing from deflate; everything else is compressed
+COMPRESSED_TYPES = {
+    'application/zip', 'application/gzip', 'application/x-gzip', 'application/x-bzip2',
+    'application/x-xz', 'application/zstd', 'application/x-7z-compressed',
+    'application/vnd.rar', 'application/x-rar-compressed', 'application/pdf',
+    'application/epub+zip', 'application/java-archive',
+}
+UNCOMPRESSED_MEDIA = {
+    'image/bmp', 'image/x-ms-bmp', 'image/svg+xml', 'image/tiff',
+    'audio/wav', 'audio/x-wav', 'audio/aiff', 'audio/x-aiff',
+}
+
+
+def is_compressed(mime_type):
+    """Whether a file of this type is already compressed."""
+    mime_type = (mime_type or '').lower()
+    if mime_type in COMPRESSED_TYPES:
+        return True
+    if mime_type.startswith('application/vnd.openxmlformats-officedocument.'):
+        return True
+    if mime_type.startswith(('image/', 'video/', 'audio/')):
+        return mime_type not in UNCOMPRESSED_MEDIA
+    return False
+
+
+def dos_datetime(value):
+    """(time, date) in MS-DOS format; ZIP cannot represent years before 1980."""
+    if value is None or value.year < 1980:
+        return 0, (1 << 5) | 1
+    return (
+        (value.hour << 11) | (value.minute << 5) | (value.second // 2),
+        ((value.year - 1980) << 9) | (value.month << 5) | value.day,
+    )
+
+
+class ZipEntry:
+    """A file or directory in the archive.
+
+    ``name`` is the archive path (directories end with ``/``), ``path``
+    the file on disk and ``size`` its length, which must not change
+    while the archive is written.
+    """
+
+    def __init__(self, name, path=None, size=0, modified=None, compress=True):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.modified = modified
+        self.method = DEFLATED if compress and size and not self.is_dir else STORED
+        self.crc = 0
+        self.compressed_size = size if self.method == STORED else 0
+
+    @property
+    def is_dir(self):
+        return self.name.endswith('/')
+
+    @property
+    def zip64(self):
+        # Deflate can expand incompressible data slightly, so leave headroom
+        limit = ZIP64_LIMIT if self.method == STORED else ZIP64_LIMIT / 1.05
+        return self.size >= limit
+
+    @property
+    def flags(self):
+        return FLAG_UTF8 | (0 if self.is_dir else FLAG_DATA_DESCRIPTOR)
+
+    def local_header(self):
+        name = self.name.encode('utf-8')
+        extra = b''
+        sizes = 0
+        if self.zip64:
+            # Real sizes follow in the ZIP64 data descriptor
+            extra = struct.pack('<HHQQ', 1, 16, 0, 0)
+            sizes = 0xFFFFFFFF
+        time, date = dos_datetime(self.modified)
+        return LOCAL_HEADER.pack(
+            0x04034B50, VERSION_ZIP64 if self.zip64 else VERSION, self.flags, self.method,
+            time, date, 0, sizes, sizes, len(name), len(extra)
+        ) + name + extra
+
+    def data_descriptor(self):
+        if self.is_dir:
+            return b''
+        if self.zip64:
+            return DATA_DESCRIPTOR64.pack(0x08074B50, self.crc, self.compressed_size, self.size)
+        return DATA_DESCRIPTOR.pack(0x08074B50, self.crc, self.compressed_size, self.size)
+
+    def central_header(self, offset):
+        name = self.name.encode('utf-8')
+        sizes64 = self.zip64 or self.size >= ZIP64_LIMIT or self.compressed_size >= ZIP64_LIMIT
+        fields = []
+        if sizes64:
+            fields += [self.size, self.compressed_size]
+        if offset >= ZIP64_LIMIT:
+            fields.append(offset)
+        extra = b''
+        if fields:
+            extra = struct.pack(f'<HH{len(fields)}Q', 1, 8 * len(fields), *fields)
+        needed = VERSION_ZIP64 if fields else VERSION
+        time, date = dos_datetime(self.modified)
+        return CENTRAL_HEADER.pack(
+            0x02014B50, MADE_BY_UNIX | VERSION_ZIP64, needed, self.flags, self.method,
+            time, date, self.crc,
+            0xFFFFFFFF if sizes64 else self.compressed_size,
+            0xFFFFFFFF if sizes64 else self.size,
+            len(name), len(extra), 0, 0, 0,
+            DIR_MODE if self.is_dir else FILE_MODE,
+            0xFFFFFFFF if offset >= ZIP64_LIMIT else offset,
+        ) + name + extra
+
+    def read(self):
+        """Yield the entry's data as stored in the archive."""
+        crc, read = 0, 0
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15) if self.method == DEFLATED else None
+        written = 0
+        with open(self.path, 'rb') as fh:
+            def read_block():
+                with storage_io():
+                    return fh.read(READ_BLOCK_SIZE)
+
+            for block in iter(read_block, b''):
+                crc = zlib.crc32(block, crc)
+                read += len(block)
+                if compressor:
+                    block = compressor.compress(block)
+                    if not block:
+                        continue
+                written += len(block)
+                yield block
+        if compressor:
+            block = compressor.flush()
+            written += len(block)
+            yield block
+        if read != self.size:
+            # Headers already promised this size; abort rather than send a corrupt archive
+            raise IOError(f'{self.path} changed size while being archived')
+        self.crc = crc
+        self.compressed_size = written
+
+
+def end_records(count, cd_offset, cd_size):
+    """End of central directory, with the ZIP64 variants when needed."""
+    if count < ZIP64_COUNT_LIMIT and cd_offset < ZIP64_LIMIT and cd_size < ZIP64_LIMIT:
+        return END_RECORD.pack(0x06054B50, 0, 0, count, count, cd_size, cd_offset, 0)
+    end64_offset = cd_offset + cd_size
+    return (
+        END_RECORD64.pack(
+            0x06064B50, END_RECORD64.size - 12, MADE_BY_UNIX | VERSION_ZIP64, VERSION_ZIP64,
+            0, 0, count, count, cd_size, cd_offset
+        )
+        + END_LOCATOR64.pack(0x07064B50, 0, end64_offset, 1)
+        + END_RECORD.pack(0x06054B50, 0, 0, 0xFFFF, 0xFFFF, 0xFFFFFFFF, 0xFFFFFFFF, 0)
+    )
+
+
+class ZipStream:
+    """Iterable of the bytes of a ZIP archive of ``entries``."""
+
+    def __init__(self, entries):
+        self.entries = list(entries)
+
+    def size(self):
+        """Exact archive length, or None if any entry is deflated."""
+        if any(entry.method == DEFLATED for entry in self.entries):
+            return None
+        offset, offsets = 0, []
+        for entry in self.entries:
+            offsets.append(offset)
+            offset += len(entry.local_header()) + entry.size + len(entry.data_descriptor())
+        cd_size = sum(
+            len(entry.central_header(entry_offset))
+            for entry, entry_offset in zip(self.entries, offsets)
+        )
+        return offset + cd_size + len(end_records(len(self.entries), offset, cd_size))
+
+    def __iter__(self):
+        offset, offsets = 0, []
+        for entry in self.entries:
+            offsets.append(offset)
+            header = entry.local_header()
+            offset += len(header)
+            yield header
+            if entry.is_dir:
+                continue
+            for block in entry.read():
+                offset += len(block)
+                yield block
+            descriptor = entry.data_descriptor()
+            offset += len(descriptor)
+            yield descriptor
+
+        cd_offset, cd_size = offset, 0
+        for entry, entry_offset in zip(self.entries, offsets):
+            record = entry.central_header(entry_offset)
+            cd_size += len(record)
+            yield record
+        yield end_records(len(self.entries), cd_offset, cd_size)
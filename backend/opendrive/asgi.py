@@ -1,12 +1,18 @@
 # backend/opendrive/asgi.py
 """
 ASGI config for opendrive project.
+
+Downloads and upload chunks are streamed by async views; see
+api.transfers.
 """
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'opendrive.settings')
+django.setup(set_prefix=False)
+
+from api.transfers import TransferASGIHandler  # noqa: E402 (needs the app registry)
 
-application = get_asgi_application()
\ No newline at end of file
+application = TransferASGIHandler()
@@ -0,0 +1 @@
+# backend/opendrive/db/sqlite3/__init__.py
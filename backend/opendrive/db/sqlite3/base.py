@@ -0,0 +1,46 @@
+# backend/opendrive/db/sqlite3/base.py
+"""
+Django's SQLite backend, tuned for a server with concurrent writers.
+
+Two extra OPTIONS:
+
+* ``pragmas``: applied to every new connection, e.g.
+  ``{'journal_mode': 'wal', 'synchronous': 'normal', 'mmap_size': 268435456}``.
+  WAL lets readers carry on while one connection writes.
+* ``transaction_mode``: ``'IMMEDIATE'`` begins atomic blocks with
+  ``BEGIN IMMEDIATE``. A deferred transaction that reads and then
+  writes cannot wait for another writer (SQLite fails it with "database
+  is locked" at once instead of honouring the busy ``timeout``), so
+  taking the write lock up front is what makes the timeout work.
+"""
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+PRAGMA_RE = re.compile(r'^\w+$')
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            if not PRAGMA_RE.match(name) or not PRAGMA_RE.match(str(value)):
+                raise ImproperlyConfigured(f'Invalid SQLite pragma {name}={value!r}.')
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = (self.settings_dict['OPTIONS'].get('transaction_mode') or 'DEFERRED').upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"SQLite transaction_mode must be one of {', '.join(TRANSACTION_MODES)}, not {mode!r}."
+            )
+        self.cursor().execute(f'BEGIN {mode}')
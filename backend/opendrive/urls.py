@@ -4,14 +4,11 @@ URL configuration for opendrive project.
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
 ]
 
-# Serve media files in development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# MEDIA_ROOT is not served, even in development: blobs are named by their
+# SHA-256 and every stored file is reached through the authenticated views
\ No newline at end of file
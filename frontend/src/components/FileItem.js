@@ -1,10 +1,10 @@
 import React, { useState } from 'react';
 import { Link } from 'react-router-dom';
-import { FolderOpen, File, FileText, Image, Video, Music, Archive, MoreVertical, Download, Share2, Trash2, Edit2, RotateCcw, Trash } from 'lucide-react';
+import { FolderOpen, File, FileText, Image, Video, Music, Archive, MoreVertical, Download, Share2, Trash2, Edit2, RotateCcw, Trash, Copy } from 'lucide-react';
 import { formatDate } from '../utils/fileUtils';
 import fileService from '../services/fileService';
 
-function FileItem({ item, isFolder, viewMode, onUpdate, onDelete, onRestore, onPermanentDelete, isTrash }) {
+function FileItem({ item, isFolder, viewMode, onUpdate, onDelete, onCopy, onRestore, onPermanentDelete, isTrash }) {
   const [showMenu, setShowMenu] = useState(false);
   const [showShareModal, setShowShareModal] = useState(false);
   const [shareUrl, setShareUrl] = useState('');
@@ -66,7 +66,7 @@ function FileItem({ item, isFolder, viewMode, onUpdate, onDelete, onRestore, onP
         to={`/dashboard/folder/${item.id}`}
         className={`
           ${viewMode === 'grid' ? 'p-4' : 'p-3 flex items-center space-x-3'}
-          bg-white rounded-lg border border-gray-200 hover:border-primary hover:shadow-md transition-all cursor-pointer
+          bg-white rounded-lg border border-gray-200 hover:border-primary hover:shadow-md transition-all cursor-pointer relative group
         `}
       >
         <FolderOpen className="text-primary" size={viewMode === 'grid' ? 40 : 24} />
@@ -76,6 +76,20 @@ function FileItem({ item, isFolder, viewMode, onUpdate, onDelete, onRestore, onP
             <p className="text-sm text-gray-500">{formatDate(item.created_at)}</p>
           )}
         </div>
+        {onCopy && (
+          <button
+            onClick={(e) => {
+              // Inside the folder's link
+              e.preventDefault();
+              e.stopPropagation();
+              onCopy(item.id);
+            }}
+            title="Make a copy"
+            className="absolute top-2 right-2 p-2 hover:bg-gray-100 rounded-lg opacity-0 group-hover:opacity-100 transition-opacity"
+          >
+            <Copy size={18} />
+          </button>
+        )}
       </Link>
     );
   }
@@ -131,6 +145,16 @@ function FileItem({ item, isFolder, viewMode, onUpdate, onDelete, onRestore, onP
                     <Share2 size={18} />
                     <span>Share</span>
                   </button>
+                  <button
+                    onClick={() => {
+                      onCopy(item.id);
+                      setShowMenu(false);
+                    }}
+                    className="w-full flex items-center space-x-2 px-4 py-2 hover:bg-gray-100 text-left"
+                  >
+                    <Copy size={18} />
+                    <span>Make a Copy</span>
+                  </button>
                   <button
                     onClick={() => {
                       onDelete(item.id);
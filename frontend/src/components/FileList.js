@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useParams } from 'react-router-dom';
-import { Grid, List, MoreVertical, Download, Share2, Trash2, Edit2, RotateCcw } from 'lucide-react';
+import { Grid, List, MoreVertical, Download, Share2, Trash, Trash2, Edit2, RotateCcw } from 'lucide-react';
 import fileService from '../services/fileService';
 import folderService from '../services/folderService';
 import FileItem from './FileItem';
@@ -57,6 +57,24 @@ function FileList({ viewType, refreshTrigger, onUpdate }) {
     }
   };
 
+  const handleCopy = async (fileId) => {
+    try {
+      await fileService.copyFile(fileId);
+      onUpdate();
+    } catch (error) {
+      console.error('Error copying file:', error);
+    }
+  };
+
+  const handleCopyFolder = async (folderId) => {
+    try {
+      await folderService.copyFolder(folderId);
+      onUpdate();
+    } catch (error) {
+      console.error('Error copying folder:', error);
+    }
+  };
+
   const handleRestore = async (fileId) => {
     try {
       await fileService.restoreFile(fileId);
@@ -77,6 +95,17 @@ function FileList({ viewType, refreshTrigger, onUpdate }) {
     }
   };
 
+  const handleEmptyTrash = async () => {
+    if (window.confirm('Permanently delete everything in the trash? This cannot be undone.')) {
+      try {
+        await fileService.emptyTrash();
+        onUpdate();
+      } catch (error) {
+        console.error('Error emptying trash:', error);
+      }
+    }
+  };
+
   const getTitle = () => {
     if (viewType === 'recent') return 'Recent Files';
     if (viewType === 'trash') return 'Trash';
@@ -97,6 +126,15 @@ function FileList({ viewType, refreshTrigger, onUpdate }) {
       <div className="flex items-center justify-between mb-6">
         <h1 className="text-2xl font-bold text-gray-900">{getTitle()}</h1>
         <div className="flex items-center space-x-2">
+          {viewType === 'trash' && files.length > 0 && (
+            <button
+              onClick={handleEmptyTrash}
+              className="flex items-center space-x-2 px-4 py-2 text-red-600 hover:bg-red-50 rounded-lg"
+            >
+              <Trash size={18} />
+              <span>Empty Trash</span>
+            </button>
+          )}
           <button
             onClick={() => setViewMode('grid')}
             className={`p-2 rounded-lg ${viewMode === 'grid' ? 'bg-primary text-white' : 'hover:bg-gray-100'}`}
@@ -130,6 +168,7 @@ function FileList({ viewType, refreshTrigger, onUpdate }) {
                     isFolder={true}
                     viewMode={viewMode}
                     onUpdate={onUpdate}
+                    onCopy={handleCopyFolder}
                   />
                 ))}
               </div>
@@ -148,6 +187,7 @@ function FileList({ viewType, refreshTrigger, onUpdate }) {
                     viewMode={viewMode}
                     onUpdate={onUpdate}
                     onDelete={handleDelete}
+                    onCopy={handleCopy}
                     onRestore={handleRestore}
                     onPermanentDelete={handlePermanentDelete}
                     isTrash={viewType === 'trash'}
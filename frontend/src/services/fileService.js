@@ -3,7 +3,7 @@ import api from './api';
 const fileService = {
   async getFiles() {
     const response = await api.get('/files/');
-    return response.data;
+    return response.data.results;
   },
 
   async getFile(id) {
@@ -56,11 +56,21 @@ const fileService = {
 
   async getRecentFiles() {
     const response = await api.get('/files/recent/');
-    return response.data;
+    return response.data.results;
   },
 
   async getTrash() {
     const response = await api.get('/files/trash/');
+    return response.data.results;
+  },
+
+  async copyFile(id, folderId = undefined, name = undefined) {
+    const response = await api.post(`/files/${id}/copy/`, { folder: folderId, name });
+    return response.data;
+  },
+
+  async emptyTrash() {
+    const response = await api.post('/files/trash/empty/');
     return response.data;
   },
 
@@ -76,7 +86,7 @@ const fileService = {
 
   async searchFiles(query) {
     const response = await api.get(`/search/?q=${encodeURIComponent(query)}`);
-    return response.data;
+    return response.data.results;
   },
 };
 
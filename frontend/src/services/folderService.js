@@ -3,7 +3,7 @@ import api from './api';
 const folderService = {
   async getFolders() {
     const response = await api.get('/folders/');
-    return response.data;
+    return response.data.results;
   },
 
   async getFolder(id) {
@@ -29,6 +29,11 @@ const folderService = {
     return response.data;
   },
 
+  async copyFolder(id, parentId = undefined, name = undefined) {
+    const response = await api.post(`/folders/${id}/copy/`, { parent: parentId, name });
+    return response.data;
+  },
+
   async deleteFolder(id) {
     const response = await api.delete(`/folders/${id}/`);
     return response.data;